@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Teste de carga do dashboard com diferentes números de workers
+
+Para cada quantidade de workers sobe o gunicorn local (gunicorn.conf.py,
+mesmo banco do .env), dispara requisições concorrentes nas rotas e mede
+p50/p99 de latência e vazão. Com --url mede um servidor já em execução.
+
+Uso: python benchmark_carga.py [--workers 1,2,4] [--threads 8] [--concorrencia 16]
+                               [--requisicoes 400] [--rotas /,/api/kpis,/health]
+     python benchmark_carga.py --url https://seu-app.railway.app
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+def porta_livre():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+def iniciar_servidor(workers, threads):
+    """Sobe o gunicorn em uma porta livre e espera o /health responder"""
+    porta = porta_livre()
+    env = dict(os.environ, PORT=str(porta), WEB_CONCURRENCY=str(workers), GUNICORN_THREADS=str(threads))
+    repo = os.path.dirname(os.path.abspath(__file__))
+    processo = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'monitoring:app'],
+        cwd=repo, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f"http://127.0.0.1:{porta}"
+    limite = time.monotonic() + 30
+    while time.monotonic() < limite:
+        try:
+            if requests.get(f"{url}/health", timeout=2).status_code == 200:
+                return processo, url
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    processo.terminate()
+    raise SystemExit(f"gunicorn não respondeu em {url}")
+
+def medir(url, rotas, concorrencia, requisicoes):
+    """Latências (s) por requisição, erros e duração total"""
+    local = threading.local()
+    latencias = []
+    erros = 0
+    lock = threading.Lock()
+
+    def requisitar(i):
+        nonlocal erros
+        sessao = getattr(local, 'sessao', None)
+        if sessao is None:
+            sessao = local.sessao = requests.Session()
+        inicio = time.perf_counter()
+        try:
+            ok = sessao.get(url + rotas[i % len(rotas)], timeout=60).status_code == 200
+        except requests.RequestException:
+            ok = False
+        duracao = time.perf_counter() - inicio
+        with lock:
+            latencias.append(duracao)
+            erros += not ok
+
+    # Aquecimento: carrega snapshot/cache de cada worker antes de medir
+    for rota in rotas:
+        requests.get(url + rota, timeout=60)
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        list(executor.map(requisitar, range(requisicoes)))
+    return latencias, erros, time.perf_counter() - inicio
+
+def main():
+    parser = argparse.ArgumentParser(description='Teste de carga do dashboard (p50/p99 por número de workers)')
+    parser.add_argument('--url', help='servidor já em execução (não sobe o gunicorn)')
+    parser.add_argument('--workers', default='1,2,4', help='quantidades de workers a testar')
+    parser.add_argument('--threads', type=int, default=8, help='threads por worker')
+    parser.add_argument('--concorrencia', type=int, default=16, help='requisições simultâneas')
+    parser.add_argument('--requisicoes', type=int, default=400)
+    parser.add_argument('--rotas', default='/,/api/kpis,/api/vendas-mensais,/health')
+    args = parser.parse_args()
+
+    rotas = [r.strip() for r in args.rotas.split(',') if r.strip()]
+    cenarios = [None] if args.url else [int(w) for w in args.workers.split(',')]
+
+    print("=== TESTE DE CARGA DO DASHBOARD ===")
+    print(f"{'workers':>8} {'threads':>8} {'req/s':>8} {'p50':>9} {'p99':>9} {'erros':>6}")
+    for workers in cenarios:
+        processo = None
+        if workers is None:
+            url = args.url.rstrip('/')
+        else:
+            processo, url = iniciar_servidor(workers, args.threads)
+        try:
+            latencias, erros, duracao = medir(url, rotas, args.concorrencia, args.requisicoes)
+        finally:
+            if processo is not None:
+                processo.terminate()
+                processo.wait()
+
+        print(f"{workers if workers else '-':>8} {args.threads if workers else '-':>8} "
+              f"{len(latencias) / duracao:>8.1f} {percentil(latencias, 50) * 1000:>7.1f}ms "
+              f"{percentil(latencias, 99) * 1000:>7.1f}ms {erros:>6}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark de inicialização dos processos (tempo de import e memória)
+
+Importa cada ponto de entrada (monitoring.py do processo web, main.py do
+worker) num interpretador novo e mede o tempo do import e o RSS máximo do
+processo. Também confere que as dependências pesadas, carregadas sob demanda,
+não entraram no import. Sai com código 1 se algum orçamento for estourado,
+para ser usado como verificação antes do deploy.
+
+Uso: python benchmark_startup.py [--repeticoes 5] [--folga 1.0]
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+import tempfile
+
+# Orçamento por ponto de entrada: tempo do import (ms), RSS máximo (MB) e
+# módulos que só podem ser importados sob demanda
+BUDGETS = {
+    'monitoring': {
+        'ms': 400,
+        'mb': 60,
+        'lazy': ['numpy', 'pandas', 'plotly', 'apscheduler', 'main']
+    },
+    'main': {
+        'ms': 400,
+        'mb': 60,
+        'lazy': ['numpy', 'pandas', 'plotly', 'apscheduler', 'smtplib', 'monitoring']
+    }
+}
+
+MEASURE = """
+import sys, time, json, resource
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    'ms': elapsed * 1000,
+    'mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'loaded': sorted({{name.split('.')[0] for name in sys.modules}})
+}}))
+"""
+
+def medir(modulo, repeticoes):
+    """Melhor tempo e maior RSS entre as repetições, e os módulos carregados
+    
+    Se o import falhar, devolve {'erro': última linha do stderr}.
+    """
+    repo = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=repo, PYTHONDONTWRITEBYTECODE='1')
+    resultados = []
+    # Diretório temporário: o import do main.py cria o cvcrm_etl.log no cwd
+    with tempfile.TemporaryDirectory() as cwd:
+        for _ in range(repeticoes):
+            saida = subprocess.run(
+                [sys.executable, '-c', MEASURE.format(module=modulo)],
+                cwd=cwd, env=env, capture_output=True, text=True
+            )
+            if saida.returncode != 0:
+                erro = (saida.stderr.strip().splitlines() or ['sem saída'])[-1]
+                return {'erro': erro}
+            resultados.append(json.loads(saida.stdout.strip().splitlines()[-1]))
+    return {
+        'ms': min(r['ms'] for r in resultados),
+        'mb': max(r['mb'] for r in resultados),
+        'loaded': set(resultados[0]['loaded'])
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de inicialização (import e memória)')
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--folga', type=float, default=1.0,
+                        help='multiplicador dos orçamentos (ex: 1.5 em máquinas lentas)')
+    args = parser.parse_args()
+
+    falhas = []
+    print("=== BENCHMARK DE INICIALIZAÇÃO ===")
+    print(f"{'processo':>12} {'import':>10} {'orçamento':>10} {'RSS':>8} {'orçamento':>10}  sob demanda")
+    for modulo, budget in BUDGETS.items():
+        resultado = medir(modulo, args.repeticoes)
+        if 'erro' in resultado:
+            print(f"{modulo:>12} {'falhou':>10}  {resultado['erro']}")
+            falhas.append(f"{modulo}: import falhou ({resultado['erro']})")
+            continue
+        limite_ms = budget['ms'] * args.folga
+        limite_mb = budget['mb'] * args.folga
+        carregados = [nome for nome in budget['lazy'] if nome in resultado['loaded']]
+
+        print(f"{modulo:>12} {resultado['ms']:>8.0f}ms {limite_ms:>8.0f}ms "
+              f"{resultado['mb']:>6.1f}MB {limite_mb:>8.0f}MB  "
+              f"{'ok' if not carregados else 'importados: ' + ', '.join(carregados)}")
+
+        if resultado['ms'] > limite_ms:
+            falhas.append(f"{modulo}: import em {resultado['ms']:.0f}ms (orçamento {limite_ms:.0f}ms)")
+        if resultado['mb'] > limite_mb:
+            falhas.append(f"{modulo}: RSS de {resultado['mb']:.1f}MB (orçamento {limite_mb:.0f}MB)")
+        if carregados:
+            falhas.append(f"{modulo}: importou no boot {', '.join(carregados)}")
+
+    if falhas:
+        print("\n❌ Orçamento de inicialização estourado:")
+        for falha in falhas:
+            print(f"   - {falha}")
+        raise SystemExit(1)
+    print("\n✅ Inicialização dentro do orçamento")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark da etapa de transformação de páginas
+
+Compara o PageTransformer (pandas, vetorizado) com uma transformação
+equivalente registro a registro (dicts), nas mesmas páginas sintéticas de
+/reservas -> vendas, e confere se as duas produzem os mesmos registros.
+
+Uso: python benchmark_transform.py [--tamanhos 50,500,5000,50000] [--repeticoes 5]
+"""
+import random
+import argparse
+import logging
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from main import PageTransformer, RECORD_SCHEMAS
+
+def gerar_pagina(tamanho, seed=42):
+    """Página sintética de /reservas com ~2% de valores inválidos"""
+    rnd = random.Random(seed)
+    inicio = date(2023, 1, 1)
+    pagina = []
+    for i in range(tamanho):
+        data_venda = inicio + timedelta(days=rnd.randint(0, 900))
+        valor = round(rnd.uniform(150000, 900000), 2)
+        registro = {
+            'id': i + 1,
+            'reserva_id': i + 1,
+            'empreendimento': f"Empreendimento {rnd.randint(1, 20)}",
+            'unidade_id': rnd.randint(1, 5000),
+            'corretor': f"Corretor {rnd.randint(1, 80)}",
+            'time_corretor': f"Time {rnd.randint(1, 6)}",
+            'cliente': f"Cliente {i}",
+            'valor': f"{valor:.2f}" if rnd.random() < 0.5 else valor,
+            'data_venda': (data_venda.isoformat() if rnd.random() < 0.6 else f"{data_venda:%d/%m/%Y}")
+                          if rnd.random() < 0.7 else None,
+            'ativo': rnd.choice(['S', 'S', 'S', 'N', 's']),
+            'created_at': f"{data_venda.isoformat()} 10:{rnd.randint(10, 59)}:00",
+            'campo_extra': 'ignorado'
+        }
+        if rnd.random() < 0.02:
+            registro['valor'] = 'n/d'
+        if rnd.random() < 0.01:
+            registro['data_venda'] = '2024-02-31'
+        pagina.append(registro)
+    return pagina
+
+def _numero(valor, inteiro=False):
+    if valor is None or (isinstance(valor, str) and not valor.strip()):
+        return None
+    texto = str(valor).strip()
+    if ',' in texto:
+        texto = texto.replace('.', '').replace(',', '.')
+    try:
+        numero = Decimal(texto)
+    except InvalidOperation:
+        return None
+    if not numero.is_finite():
+        return None
+    if inteiro:
+        return int(numero) if numero == numero.to_integral_value() else None
+    return numero
+
+def _data(valor, so_data):
+    if valor is None or (isinstance(valor, str) and not valor.strip()):
+        return None
+    texto = str(valor).strip()
+    for formato in (None,) + PageTransformer.DATE_FORMATS:
+        try:
+            convertido = datetime.fromisoformat(texto) if formato is None else datetime.strptime(texto, formato)
+            break
+        except ValueError:
+            continue
+    else:
+        return None
+    return convertido.date() if so_data else convertido
+
+def transformar_por_registro(tabela, pagina):
+    """Transformação de referência, um dict por vez (mesmas regras do PageTransformer)"""
+    esquema = RECORD_SCHEMAS[tabela]
+    resultado = []
+    for registro in pagina:
+        linha = {}
+        for coluna, tipo in esquema.items():
+            valor = registro.get(coluna)
+            if tipo == 'str':
+                linha[coluna] = None if valor is None else str(valor)
+            elif tipo == 'flag':
+                linha[coluna] = None if valor is None else PageTransformer.FLAG_VALUES.get(str(valor).strip().upper())
+            elif tipo in ('date', 'timestamp'):
+                linha[coluna] = _data(valor, tipo == 'date')
+            else:
+                linha[coluna] = _numero(valor, tipo == 'int')
+        if 'id' in esquema and linha['id'] is None:
+            continue
+        if tabela == 'vendas' and not (linha['ativo'] == 'S' and linha['data_venda']):
+            continue
+        resultado.append(linha)
+    return resultado
+
+def medir(funcao, repeticoes):
+    """Menor tempo (s) entre as repetições"""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark: transformação vetorizada x por registro')
+    parser.add_argument('--tamanhos', default='50,500,5000,50000', help='tamanhos de página (registros)')
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    # Avisos de valores inválidos são esperados aqui (dados sintéticos)
+    logging.getLogger().setLevel(logging.ERROR)
+    transformer = PageTransformer()
+
+    print("=== BENCHMARK DA TRANSFORMAÇÃO (reservas -> vendas) ===")
+    print(f"{'registros':>10} {'por registro':>14} {'pandas':>10} {'razão':>8}  resultado")
+    for tamanho in [int(t) for t in args.tamanhos.split(',')]:
+        pagina = gerar_pagina(tamanho)
+
+        vetorizado = transformer.records('vendas', pagina)
+        referencia = transformar_por_registro('vendas', pagina)
+        iguais = vetorizado == referencia
+
+        t_dict = medir(lambda: transformar_por_registro('vendas', pagina), args.repeticoes)
+        t_pandas = medir(lambda: transformer.records('vendas', pagina), args.repeticoes)
+        print(f"{tamanho:>10} {t_dict * 1000:>12.2f}ms {t_pandas * 1000:>8.2f}ms "
+              f"{t_dict / t_pandas:>7.2f}x  {'iguais' if iguais else 'DIFERENTES'} ({len(vetorizado)} vendas)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Snapshot colunar (NumPy) das vendas para o dashboard
+
+Separado do monitoring.py para que o NumPy só seja importado quando o
+primeiro snapshot é carregado, e não no boot do processo web.
+"""
+import logging
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+def _months_ago(day, months):
+    """`day` menos `months` meses (dia limitado ao fim do mês, como no Postgres)"""
+    index = day.year * 12 + day.month - 1 - months
+    year, month = index // 12, index % 12 + 1
+    last_day = (date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)).day
+    return date(year, month, min(day.day, last_day))
+
+def _encode(values):
+    """Codificação em dicionário: (códigos int32, valores distintos); None vira -1"""
+    dictionary = {}
+    codes = np.fromiter(
+        (-1 if v is None else dictionary.setdefault(v, len(dictionary)) for v in values),
+        dtype=np.int32, count=len(values)
+    )
+    return codes, list(dictionary)
+
+class ColumnarSnapshot:
+    """Cópia colunar em memória (NumPy) de vendas e prosoluto para o dashboard
+    
+    Uma linha por venda ativa com data; registros marcados como excluídos
+    pela conciliação (excluido_em) ficam de fora, como nas views. Datas viram datetime64[D], valores
+    float64 (NaN = NULL) e os textos (empreendimento, corretor, time, status)
+    são codificados em dicionário: um array de códigos por linha mais a lista
+    de valores distintos. KPIs, séries mensais, VSO e rankings são group-bys
+    vetorizados (np.bincount) sobre esses arrays, com as mesmas regras das
+    queries/views do Postgres. A cópia pertence a uma geração do ETL
+    (etl_sync_runs) e é descartada quando uma nova sincronização termina.
+    """
+    
+    def __init__(self, generation, vendas, prosoluto, empreendimentos):
+        self.generation = generation
+        self.loaded_at = datetime.now()
+        self.size = len(vendas)
+        
+        columns = list(zip(*vendas)) or [()] * 8
+        self.dia = np.array(columns[0], dtype=np.int64).astype('datetime64[D]')
+        self.mes = self.dia.astype('datetime64[M]')
+        self.valor = np.array(columns[1], dtype=np.float64)
+        self.comissao = np.array(columns[2], dtype=np.float64)
+        self.vgv = np.array(columns[3], dtype=np.float64)
+        self.status, self.status_dict = _encode(columns[4])
+        self.empreendimento, self.empreendimento_dict = _encode(columns[5])
+        self.corretor, self.corretor_dict = _encode(columns[6])
+        self.time, self.time_dict = _encode(columns[7])
+        
+        columns = list(zip(*prosoluto)) or [()] * 3
+        # Dias desde 1970 em float64: data_calculo NULL vira NaN e sai de qualquer filtro
+        self.prosoluto_dia = np.array(columns[0], dtype=np.float64)
+        self.prosoluto_valor = np.array(columns[1], dtype=np.float64)
+        self.prosoluto_status, self.prosoluto_status_dict = _encode(columns[2])
+        
+        self.empreendimentos = empreendimentos
+    
+    @classmethod
+    def load(cls, conn, generation):
+        """Lê vendas/prosoluto/empreendimentos do Postgres (uma vez por geração)"""
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT data_venda - DATE '1970-01-01', valor::float8, comissao_valor::float8, vgv::float8,
+                       status, empreendimento, corretor, time_corretor
+                FROM vendas
+                WHERE ativo = 'S' AND data_venda IS NOT NULL AND excluido_em IS NULL
+            """)
+            vendas = cursor.fetchall()
+            cursor.execute("""
+                SELECT data_calculo - DATE '1970-01-01', valor_prosoluto::float8, status
+                FROM prosoluto
+                WHERE excluido_em IS NULL
+            """)
+            prosoluto = cursor.fetchall()
+            cursor.execute("SELECT cvcrm_id, nome FROM empreendimentos WHERE excluido_em IS NULL ORDER BY id")
+            empreendimentos = cursor.fetchall()
+        
+        snapshot = cls(generation, vendas, prosoluto, empreendimentos)
+        logging.info(f"Snapshot colunar carregado: geração {generation}, {snapshot.size} vendas")
+        return snapshot
+    
+    # Máscaras de período e filtros
+    
+    def _since(self, day):
+        return self.dia >= np.datetime64(day, 'D')
+    
+    def _since_month(self, day):
+        """Janela alinhada ao mês (como as views sobre o vendas_cubo)"""
+        return self.mes >= np.datetime64(day, 'M')
+    
+    def _not_status(self, codes, dictionary, excluded):
+        """Equivalente a `status NOT IN (...)` (NULL também fica de fora)"""
+        allowed = np.array([v not in excluded for v in dictionary] + [False])
+        return allowed[codes]
+    
+    # Agregações vetorizadas
+    
+    @staticmethod
+    def _group(codes, mask, size, *weights):
+        """Group-by por código: (contagem, [(soma, quantidade não nula) por peso])"""
+        keys = codes[mask]
+        counts = np.bincount(keys, minlength=size)
+        totals = []
+        for values in weights:
+            values = values[mask]
+            present = ~np.isnan(values)
+            totals.append((
+                np.bincount(keys[present], weights=values[present], minlength=size),
+                np.bincount(keys[present], minlength=size)
+            ))
+        return counts, totals
+    
+    @staticmethod
+    def _distinct_per_group(group_codes, value_codes, mask, size):
+        """COUNT(DISTINCT valor) por grupo (valores NULL não contam)"""
+        mask = mask & (value_codes >= 0)
+        pairs = np.unique(np.stack([group_codes[mask], value_codes[mask]]), axis=1)
+        return np.bincount(pairs[0], minlength=size) if pairs.size else np.zeros(size, dtype=np.int64)
+    
+    @staticmethod
+    def _mean(total, count):
+        return float(total / count) if count else None
+    
+    @staticmethod
+    def _total(total, count):
+        """SUM do SQL: NULL quando não há nenhum valor não nulo"""
+        return float(total) if count else None
+    
+    def _summary(self, mask):
+        """Quantidade, soma/média de valor e de comissão das linhas da máscara"""
+        valor = self.valor[mask]
+        comissao = self.comissao[mask]
+        valor_count = int(np.count_nonzero(~np.isnan(valor)))
+        comissao_count = int(np.count_nonzero(~np.isnan(comissao)))
+        return {
+            'quantidade': int(mask.sum()),
+            'valor_total': float(np.nansum(valor)),
+            'valor_medio': float(np.nansum(valor) / valor_count) if valor_count else None,
+            'comissao_total': float(np.nansum(comissao)),
+            'comissao_media': float(np.nansum(comissao) / comissao_count) if comissao_count else None
+        }
+    
+    def _monthly(self, mask):
+        """Séries por mês: (meses, contagem, soma valor, soma comissão, qtd comissões)"""
+        months, codes = np.unique(self.mes[mask], return_inverse=True)
+        counts = np.bincount(codes, minlength=len(months))
+        valor = self.valor[mask]
+        comissao = self.comissao[mask]
+        valor_sum = np.bincount(codes, weights=np.nan_to_num(valor), minlength=len(months))
+        comissao_sum = np.bincount(codes, weights=np.nan_to_num(comissao), minlength=len(months))
+        comissao_count = np.bincount(codes, weights=~np.isnan(comissao), minlength=len(months))
+        return months, counts, valor_sum, comissao_sum, comissao_count
+    
+    # Resultados do dashboard (mesmo formato dos métodos do DashboardData)
+    
+    def kpis(self, today=None):
+        today = today or date.today()
+        month_start = today.replace(day=1)
+        last_12 = self._since(_months_ago(today, 12))
+        
+        gerais = self._summary(last_12)
+        mes = self._summary(self._since(month_start) & (self.dia < np.datetime64(_months_ago(month_start, -1), 'D')))
+        
+        # Comparação anual (vw_vendas_ano_atual_vs_passado)
+        comparacao_anual = []
+        for periodo, year in (('Ano Atual', today.year), ('Ano Passado', today.year - 1)):
+            in_year = self._since(date(year, 1, 1)) & (self.dia < np.datetime64(date(year + 1, 1, 1), 'D'))
+            if not in_year.any():
+                continue
+            resumo = self._summary(in_year)
+            comparacao_anual.append({
+                'periodo': periodo,
+                'ano': year,
+                'quantidade_vendas': resumo['quantidade'],
+                'valor_total': resumo['valor_total'],
+                'ticket_medio': resumo['valor_total'] / resumo['quantidade'],
+                'total_comissoes': resumo['comissao_total'] if resumo['comissao_media'] is not None else None,
+                'media_comissoes': resumo['comissao_media']
+            })
+        
+        # VSO do último mês (vw_vso_mensal)
+        months, counts, valor_sum, _, _ = self._monthly(self._since_month(_months_ago(today, 12)))
+        vso_valor = float(valor_sum[-1]) if len(months) else 0
+        vso_ticket = float(valor_sum[-1] / counts[-1]) if len(months) else 0
+        
+        # Estrutura: empreendimentos (por nome), corretores e times com venda em 12 meses
+        sold = last_12 & self._not_status(self.status, self.status_dict, ('cancelado', 'distratado'))
+        known_names = {nome for _, nome in self.empreendimentos}
+        known = np.array([nome in known_names for nome in self.empreendimento_dict] + [False])[self.empreendimento]
+        sold_names = {self.empreendimento_dict[c] for c in np.unique(self.empreendimento[sold & known])}
+        
+        # Prosoluto (12 meses, status diferente de cancelado)
+        prosoluto_mask = (
+            (self.prosoluto_dia >= (_months_ago(today, 12) - date(1970, 1, 1)).days)
+            & self._not_status(self.prosoluto_status, self.prosoluto_status_dict, ('cancelado',))
+        )
+        prosoluto = self.prosoluto_valor[prosoluto_mask]
+        prosoluto_count = int(np.count_nonzero(~np.isnan(prosoluto)))
+        
+        # Crescimento: último mês com venda vs anterior (janela de 2 meses)
+        recent = self._since(_months_ago(today, 2)) & self._not_status(self.status, self.status_dict, ('cancelado', 'distratado'))
+        _, _, recent_sum, _, _ = self._monthly(recent)
+        crescimento = 0
+        if len(recent_sum) >= 2 and recent_sum[-2] > 0:
+            crescimento = round(float((recent_sum[-1] - recent_sum[-2]) / recent_sum[-2] * 100), 2)
+        
+        return {
+            'total_vendas': gerais['quantidade'],
+            'valor_total_vendas': gerais['valor_total'],
+            'ticket_medio_geral': gerais['valor_medio'] or 0,
+            'total_comissoes': gerais['comissao_total'],
+            'media_comissoes': gerais['comissao_media'] or 0,
+            'vendas_mes_atual': mes['quantidade'],
+            'valor_mes_atual': mes['valor_total'],
+            'ticket_medio_mes': mes['valor_medio'] or 0,
+            'vso_valor': vso_valor,
+            'vso_ticket_medio': vso_ticket,
+            'total_empreendimentos': sum(1 for _, nome in self.empreendimentos if nome in sold_names),
+            'total_corretores': len(np.unique(self.corretor[sold & known & (self.corretor >= 0)])),
+            'total_times': len(np.unique(self.time[sold & known & (self.time >= 0)])),
+            'total_prosoluto': float(np.nansum(prosoluto)),
+            'media_prosoluto': float(np.nansum(prosoluto) / prosoluto_count) if prosoluto_count else 0,
+            'ano_atual': comparacao_anual[0] if comparacao_anual else None,
+            'ano_passado': comparacao_anual[1] if len(comparacao_anual) > 1 else None,
+            'crescimento_mensal': crescimento
+        }
+    
+    def vendas_mensais(self, today=None):
+        today = today or date.today()
+        months, counts, valor_sum, comissao_sum, _ = self._monthly(self._since_month(_months_ago(today, 24)))
+        return {
+            'meses': [str(m) for m in months],
+            'valores': valor_sum.tolist(),
+            'quantidades': counts.tolist(),
+            'tickets_medios': (valor_sum / counts).tolist(),
+            'vgv': valor_sum.tolist(),
+            'comissoes': comissao_sum.tolist()
+        }
+    
+    def vso(self, today=None):
+        today = today or date.today()
+        months, counts, valor_sum, _, _ = self._monthly(self._since_month(_months_ago(today, 12)))
+        return {
+            'meses': [str(m) for m in months],
+            'vso_valores': valor_sum.tolist(),
+            'vso_tickets': (valor_sum / counts).tolist(),
+            'quantidades': counts.tolist()
+        }
+    
+    def _ranking(self, group_codes, mask, size, row, order_limit=None):
+        """Linhas agregadas por grupo (ordem: valor total desc) no formato das views"""
+        counts, [(valor_sum, valor_count), (vgv_sum, vgv_count), (comissao_sum, comissao_count)] = self._group(
+            group_codes, mask, size, self.valor, self.vgv, self.comissao)
+        corretores = self._distinct_per_group(group_codes, self.corretor, mask, size)
+        empreendimentos = self._distinct_per_group(group_codes, self.empreendimento, mask, size)
+        
+        result = []
+        for code in np.argsort(-valor_sum, kind='stable'):
+            if counts[code] == 0:
+                continue
+            result.append(row(code, {
+                'quantidade_vendas': int(counts[code]),
+                'valor_total_vendas': self._total(valor_sum[code], valor_count[code]),
+                'ticket_medio': float(valor_sum[code] / counts[code]),
+                'vgv_total': self._total(vgv_sum[code], vgv_count[code]),
+                'total_comissoes': self._total(comissao_sum[code], comissao_count[code]),
+                'media_comissoes': self._mean(comissao_sum[code], comissao_count[code]),
+                'total_corretores': int(corretores[code]),
+                'empreendimentos_vendidos': int(empreendimentos[code])
+            }))
+            if order_limit and len(result) >= order_limit:
+                break
+        return result
+    
+    def top_empreendimentos(self, limit=10, today=None):
+        today = today or date.today()
+        ids = {nome: cvcrm_id for cvcrm_id, nome in self.empreendimentos}
+        mask = self._since_month(_months_ago(today, 12)) & (self.empreendimento >= 0)
+        mask &= np.array([nome in ids for nome in self.empreendimento_dict] + [False])[self.empreendimento]
+        
+        def row(code, values):
+            nome = self.empreendimento_dict[code]
+            return {'cvcrm_id': ids[nome], 'empreendimento': nome, **{
+                k: values[k] for k in ('quantidade_vendas', 'valor_total_vendas', 'ticket_medio', 'vgv_total',
+                                       'total_comissoes', 'media_comissoes', 'total_corretores')}}
+        
+        return self._ranking(self.empreendimento, mask, len(self.empreendimento_dict), row, limit)
+    
+    def top_corretores(self, limit=15, today=None):
+        today = today or date.today()
+        mask = self._since_month(_months_ago(today, 12)) & (self.corretor >= 0)
+        # Grupo = par (corretor, time); time NULL vira o código 0
+        pairs = self.corretor.astype(np.int64) * (len(self.time_dict) + 1) + (self.time + 1)
+        
+        def row(code, values):
+            corretor, time_code = divmod(int(code), len(self.time_dict) + 1)
+            return {
+                'corretor': self.corretor_dict[corretor],
+                'time_corretor': self.time_dict[time_code - 1] if time_code else None,
+                **{k: values[k] for k in ('quantidade_vendas', 'valor_total_vendas', 'ticket_medio',
+                                          'total_comissoes', 'media_comissoes', 'empreendimentos_vendidos')}
+            }
+        
+        size = len(self.corretor_dict) * (len(self.time_dict) + 1)
+        return self._ranking(pairs, mask, size, row, limit)
+    
+    def vendas_por_time(self, today=None):
+        today = today or date.today()
+        mask = self._since_month(_months_ago(today, 12))
+        # Time NULL agrupa como 'Sem Time' (código 0)
+        codes = self.time + 1
+        
+        def row(code, values):
+            return {
+                'time_corretor': self.time_dict[code - 1] if code else 'Sem Time',
+                **{k: values[k] for k in ('quantidade_vendas', 'valor_total_vendas', 'ticket_medio', 'total_comissoes',
+                                          'media_comissoes', 'total_corretores', 'empreendimentos_vendidos')}
+            }
+        
+        return self._ranking(codes, mask, len(self.time_dict) + 1, row)
@@ -0,0 +1,23 @@
+"""
+Configuração do gunicorn para o dashboard (processo web)
+
+Vários workers com threads (gthread): uma consulta lenta não bloqueia os
+demais visitantes nem o /health. O app é carregado uma vez no master
+(preload_app) e cada worker recria o pool de conexões após o fork.
+
+Variáveis: PORT, WEB_CONCURRENCY (workers), GUNICORN_THREADS (threads por worker)
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+worker_class = 'gthread'
+# Threads a mais que o pool de conexões: parte delas fica em conexões SSE
+# (/api/eventos), que dormem entre uma verificação de geração e outra
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+timeout = 120
+preload_app = True
+
+def post_fork(server, worker):
+    import monitoring
+    monitoring.reset_after_fork()
@@ -18,19 +18,30 @@ LGPD: Compliant - dados corporativos sem PII
 """
 
 import os
+import re
+import sys
+import gzip
+import json
+import math
+import hashlib
 import time
+import queue
+import random
+import socket
+import argparse
+import atexit
 import logging
+import threading
+import uuid
 import requests
 import psycopg2
-import pandas as pd
-from datetime import datetime, timedelta
-from psycopg2.extras import RealDictCursor
-from apscheduler.schedulers.blocking import BlockingScheduler
-from apscheduler.triggers.cron import CronTrigger
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from psycopg2.extras import RealDictCursor, execute_batch, execute_values
 from dotenv import load_dotenv
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 
 load_dotenv()
 
@@ -44,35 +55,417 @@ logging.basicConfig(
     ]
 )
 
+# Tenant da thread atual (definido pelo TenantScheduler)
+_log_context = threading.local()
+
+class TenantLogFilter(logging.Filter):
+    """Prefixa as mensagens com o tenant da thread quando há vários tenants"""
+    
+    def filter(self, record):
+        tenant = getattr(_log_context, 'tenant', None)
+        if tenant:
+            record.msg = f"[{tenant}] {record.getMessage()}"
+            record.args = None
+        return True
+
+logging.getLogger().addFilter(TenantLogFilter())
+
+class RateLimiter:
+    """Intervalo mínimo entre requisições à API, compartilhado entre threads
+    
+    Cada chamada reserva o próximo horário livre; com várias threads (backfill)
+    o orçamento continua sendo uma requisição a cada `min_interval` segundos.
+    """
+    
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+        # Requisições feitas (inclui novas tentativas): base do orçamento diário
+        self.requests = 0
+    
+    def wait(self):
+        with self._lock:
+            self.requests += 1
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.min_interval
+        
+        delay = slot - now
+        if delay > 0:
+            print(f"   Aguardando {delay:.0f}s (rate limit obrigatorio)...")
+            time.sleep(delay)
+
+class SharedRateLimiter(RateLimiter):
+    """RateLimiter cujo próximo horário livre fica no Postgres (etl_rate_limit)
+    
+    Usado no modo fila: vários processos (réplicas do worker) dividem o mesmo
+    intervalo mínimo entre requisições do tenant, então somar réplicas nunca
+    passa do limite da API.
+    """
+    
+    def __init__(self, db, min_interval, key='api'):
+        super().__init__(min_interval)
+        self.db = db
+        self.key = key
+    
+    def wait(self):
+        with self._lock:
+            self.requests += 1
+        
+        delay = self.db.reserve_request_slot(self.key, self.min_interval)
+        if delay > 0:
+            print(f"   Aguardando {delay:.0f}s (rate limit obrigatorio, compartilhado)...")
+            time.sleep(delay)
+
+class CircuitOpenError(Exception):
+    """Requisição recusada pelo disjuntor (API considerada fora do ar)"""
+    
+    def __init__(self, name, retry_in):
+        super().__init__(f"circuito {name} aberto: API indisponível, nova tentativa em {retry_in:.0f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+class CircuitBreaker:
+    """Disjuntor: abre após `failure_threshold` falhas seguidas e recusa requisições
+    
+    Depois de `reset_seconds` aberto passa a meio-aberto e deixa passar uma
+    única requisição de teste: sucesso fecha o circuito, falha abre de novo.
+    """
+    
+    CLOSED, OPEN, HALF_OPEN = 'fechado', 'aberto', 'meio_aberto'
+    
+    def __init__(self, name, failure_threshold, reset_seconds):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+    
+    def retry_in(self):
+        """Segundos até a próxima requisição de teste (0 se não está aberto)"""
+        if self.state != self.OPEN:
+            return 0
+        return max(0.0, self.opened_at + self.reset_seconds - time.monotonic())
+    
+    def is_open(self):
+        return self.state == self.OPEN and self.retry_in() > 0 or (self.state == self.HALF_OPEN and self._probing)
+    
+    def allow(self):
+        """Reserva a passagem de uma requisição; retorna (permitida, mudou de estado)"""
+        changed = False
+        if self.state == self.OPEN and self.retry_in() == 0:
+            self.state = self.HALF_OPEN
+            self._probing = False
+            changed = True
+        if self.state == self.OPEN or (self.state == self.HALF_OPEN and self._probing):
+            return False, changed
+        if self.state == self.HALF_OPEN:
+            self._probing = True
+        return True, changed
+    
+    def release(self):
+        """Devolve a requisição de teste reservada e não usada"""
+        self._probing = False
+    
+    def success(self):
+        changed = self.state != self.CLOSED
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+        return changed
+    
+    def failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            return True
+        return False
+    
+    def snapshot(self):
+        return {'estado': self.state, 'falhas': self.failures, 'nova_tentativa_em': round(self.retry_in())}
+
+class ApiCircuit:
+    """Disjuntores do cliente CVDW: um por endpoint e um global
+    
+    Timeouts, erros de conexão e 5xx contam como falha do endpoint e do
+    global (falhas seguidas em qualquer endpoint); 4xx e 429 não, porque não
+    indicam API fora do ar. Com o global aberto nenhuma requisição sai: o
+    resto do sync falha na hora em vez de esperar retries de cada página.
+    `on_change(snapshot)` é chamado a cada mudança de estado (persistência
+    para o /health).
+    """
+    
+    def __init__(self, failure_threshold=None, global_threshold=None, reset_seconds=None, on_change=None):
+        self.failure_threshold = failure_threshold or int(os.getenv('CVCRM_CIRCUITO_FALHAS', '3'))
+        self.reset_seconds = reset_seconds or float(os.getenv('CVCRM_CIRCUITO_ESPERA_SEGUNDOS', '300'))
+        self.global_breaker = CircuitBreaker(
+            'global', global_threshold or int(os.getenv('CVCRM_CIRCUITO_FALHAS_GLOBAL', '5')), self.reset_seconds
+        )
+        self.on_change = on_change
+        # Falhas e recusas acumuladas: tarefas comparam antes/depois para saber se rodaram completas
+        self.errors = 0
+        self._breakers = {}
+        self._lock = threading.Lock()
+    
+    def _breaker(self, endpoint):
+        if endpoint not in self._breakers:
+            self._breakers[endpoint] = CircuitBreaker(endpoint, self.failure_threshold, self.reset_seconds)
+        return self._breakers[endpoint]
+    
+    def check(self, endpoint):
+        """Levanta CircuitOpenError se o global ou o do endpoint recusar a requisição"""
+        with self._lock:
+            breaker = self._breaker(endpoint)
+            allowed, changed = self.global_breaker.allow()
+            if allowed:
+                allowed, endpoint_changed = breaker.allow()
+                changed = changed or endpoint_changed
+                if not allowed:
+                    self.global_breaker.release()
+                    refused = breaker
+            else:
+                refused = self.global_breaker
+            if not allowed:
+                self.errors += 1
+        if changed:
+            self._notify()
+        if not allowed:
+            raise CircuitOpenError(refused.name, refused.retry_in())
+    
+    def is_open(self, endpoint=None):
+        """Recusaria agora (sem reservar requisição de teste)"""
+        with self._lock:
+            return self.global_breaker.is_open() or (endpoint is not None and self._breaker(endpoint).is_open())
+    
+    def success(self, endpoint):
+        with self._lock:
+            changed = self._breaker(endpoint).success()
+            changed = self.global_breaker.success() or changed
+        if changed:
+            logging.info(f"Circuito {endpoint}: fechado (API respondendo)")
+            self._notify()
+    
+    def failure(self, endpoint):
+        with self._lock:
+            self.errors += 1
+            opened = [b.name for b in (self._breaker(endpoint), self.global_breaker) if b.failure()]
+        if opened:
+            logging.warning(f"Circuito aberto: {', '.join(opened)} "
+                            f"(nova tentativa em {self.reset_seconds:.0f}s)")
+            self._notify()
+    
+    def snapshot(self):
+        with self._lock:
+            return {
+                'global': self.global_breaker.snapshot(),
+                'endpoints': {name: breaker.snapshot() for name, breaker in sorted(self._breakers.items())}
+            }
+    
+    def _notify(self):
+        if self.on_change is not None:
+            try:
+                self.on_change(self.snapshot())
+            except Exception as e:
+                logging.warning(f"Não foi possível registrar o estado do circuito: {e}")
+
+class PageSizeController:
+    """Escolhe registros_por_pagina por endpoint de forma adaptativa
+    
+    Cada requisição custa um slot fixo de rate limit, então páginas maiores
+    reduzem o tempo total do sync. O tamanho dobra enquanto as páginas
+    voltam cheias, rápidas e dentro do limite de bytes; cai pela metade em
+    timeouts, erros 5xx ou respostas lentas/grandes demais. `confirmed` é o
+    maior tamanho já atendido com página cheia; um limite do servidor
+    detectado (`clamp`) passa a limitar o crescimento nesta execução.
+    """
+    
+    def __init__(self, initial=50, min_size=10, max_size=None, target_seconds=None, max_bytes=None):
+        self.initial = initial
+        self.min_size = min_size
+        self.max_size = max_size or int(os.getenv('CVCRM_MAX_PAGE_SIZE', '500'))
+        self.target_seconds = target_seconds or float(os.getenv('CVCRM_PAGE_TARGET_SECONDS', '15'))
+        self.max_bytes = max_bytes or int(os.getenv('CVCRM_PAGE_MAX_BYTES', str(8 * 1024 * 1024)))
+        self._state = {}
+        self._lock = threading.Lock()
+    
+    def _endpoint(self, endpoint):
+        return self._state.setdefault(endpoint, {
+            'size': self.initial, 'confirmed': 0, 'limit': None, 'requests': 0, 'records': 0
+        })
+    
+    def size(self, endpoint):
+        with self._lock:
+            return self._endpoint(endpoint)['size']
+    
+    def confirmed(self, endpoint):
+        with self._lock:
+            return self._endpoint(endpoint)['confirmed']
+    
+    def observe(self, endpoint, requested, seconds, nbytes, records):
+        """Registra uma resposta bem-sucedida e ajusta o tamanho preferido"""
+        with self._lock:
+            state = self._endpoint(endpoint)
+            state['requests'] += 1
+            state['records'] += records
+            if not requested:
+                return
+            
+            if records >= requested:
+                state['confirmed'] = max(state['confirmed'], requested)
+            
+            if seconds > self.target_seconds or nbytes > self.max_bytes:
+                state['size'] = max(self.min_size, requested // 2)
+            elif (records >= requested and requested >= state['size']
+                  and seconds < self.target_seconds / 2 and nbytes < self.max_bytes / 2):
+                state['size'] = min(state['limit'] or self.max_size, self.max_size, requested * 2)
+    
+    def clamp(self, endpoint, size):
+        """Servidor devolveu páginas menores que o pedido: esse é o limite dele"""
+        with self._lock:
+            state = self._endpoint(endpoint)
+            state['size'] = max(self.min_size, size)
+            state['confirmed'] = size
+            state['limit'] = size
+    
+    def failure(self, endpoint, requested):
+        """Timeout ou 5xx: reduz o tamanho pela metade"""
+        with self._lock:
+            state = self._endpoint(endpoint)
+            if requested:
+                state['size'] = max(self.min_size, min(state['size'], requested // 2))
+                state['confirmed'] = min(state['confirmed'], state['size'])
+    
+    def load(self, sizes):
+        """Restaura tamanhos salvos: {endpoint: (tamanho, confirmado)}"""
+        with self._lock:
+            for endpoint, (size, confirmed) in sizes.items():
+                state = self._endpoint(endpoint)
+                state['size'] = max(self.min_size, min(self.max_size, size))
+                state['confirmed'] = min(confirmed or 0, self.max_size)
+    
+    def snapshot(self):
+        """Estado para persistir: {endpoint: (tamanho, confirmado)}"""
+        with self._lock:
+            return {endpoint: (state['size'], state['confirmed']) for endpoint, state in self._state.items()}
+    
+    def report(self):
+        """Registros por requisição de cada endpoint nesta execução"""
+        with self._lock:
+            lines = []
+            for endpoint, state in sorted(self._state.items()):
+                if state['requests']:
+                    lines.append(f"{endpoint}: {state['records'] / state['requests']:.1f} registros/req "
+                                 f"({state['requests']} req, página atual {state['size']})")
+            return lines
+
+class Tenant:
+    """Instância do CVCRM sincronizada pelo worker
+    
+    Sem CVCRM_TENANTS há um único tenant padrão, com as variáveis CVCRM_* de
+    sempre, gravando no schema padrão do banco. Com CVCRM_TENANTS=bp,outra cada
+    tenant lê CVCRM_<NOME>_API_TOKEN, CVCRM_<NOME>_API_EMAIL e
+    CVCRM_<NOME>_SUBDOMINIO (opcionais: CVCRM_<NOME>_MIN_REQUEST_INTERVAL e
+    CVCRM_<NOME>_DAILY_REQUEST_BUDGET, padrão os valores globais) e grava no
+    schema `cvcrm_<nome>`, com agenda, checkpoints e gerações próprios.
+    """
+    
+    DEFAULT_SUBDOMAIN = 'bpincorporadora'
+    
+    def __init__(self, name=None, email=None, token=None, subdomain=None, min_interval=None, daily_budget=None):
+        if name is not None and not re.fullmatch(r'[a-z][a-z0-9_]*', name):
+            raise ValueError(f"Nome de tenant inválido: {name!r} (use letras minúsculas, números e _)")
+        self.name = name
+        self.email = email or os.getenv('CVCRM_API_EMAIL')
+        self.token = token or os.getenv('CVCRM_API_TOKEN')
+        self.subdomain = subdomain or os.getenv('CVCRM_SUBDOMINIO', self.DEFAULT_SUBDOMAIN)
+        self.min_interval = min_interval or float(os.getenv('CVCRM_MIN_REQUEST_INTERVAL', '10'))
+        self.daily_budget = daily_budget or int(os.getenv('CVCRM_DAILY_REQUEST_BUDGET', '2000'))
+        # Tenant padrão: schema padrão do banco (implantações de um tenant só não mudam)
+        self.schema = f"cvcrm_{name}" if name else None
+    
+    @classmethod
+    def from_env(cls):
+        names = [n.strip().lower() for n in os.getenv('CVCRM_TENANTS', '').split(',') if n.strip()]
+        if not names:
+            return [cls()]
+        
+        tenants = []
+        for name in names:
+            prefix = f"CVCRM_{name.upper()}_"
+            interval = os.getenv(prefix + 'MIN_REQUEST_INTERVAL')
+            budget = os.getenv(prefix + 'DAILY_REQUEST_BUDGET')
+            tenants.append(cls(
+                name,
+                email=os.getenv(prefix + 'API_EMAIL'),
+                token=os.getenv(prefix + 'API_TOKEN'),
+                subdomain=os.getenv(prefix + 'SUBDOMINIO') or name,
+                min_interval=float(interval) if interval else None,
+                daily_budget=int(budget) if budget else None
+            ))
+        return tenants
+    
+    @property
+    def base_url(self):
+        return f'https://{self.subdomain}.cvcrm.com.br/api/v1/cvdw'
+    
+    @property
+    def label(self):
+        return self.name or 'padrão'
+    
+    def archive_dir(self, directory):
+        """Diretório do PageArchive do tenant (subdiretório quando há vários)"""
+        if directory and self.name:
+            return os.path.join(directory, self.name)
+        return directory
+
 class CVCRMAPIClient:
     """Cliente para API do CVCRM focado nas tabelas de vendas"""
     
-    def __init__(self):
-        self.api_token = os.getenv('CVCRM_API_TOKEN')
-        self.base_url = 'https://bpincorporadora.cvcrm.com.br/api/v1/cvdw'
+    def __init__(self, archive=None, tenant=None):
+        tenant = tenant or Tenant()
+        self.archive = archive
+        # Rate limiting OBRIGATÓRIO - mínimo 10 segundos entre requisições (por tenant)
+        self.rate_limiter = RateLimiter(tenant.min_interval)
+        self.page_sizes = PageSizeController()
+        self.circuit = ApiCircuit()
+        self.api_token = tenant.token
+        self.base_url = tenant.base_url
         self.headers = {
-            'email': os.getenv('CVCRM_API_EMAIL'),
-            'token': os.getenv('CVCRM_API_TOKEN'),
+            'email': tenant.email,
+            'token': tenant.token,
             'Content-Type': 'application/json'
         }
         
         if not self.api_token:
-            raise ValueError("CVCRM_API_TOKEN não encontrado nas variáveis de ambiente")
+            raise ValueError(f"Token da API não encontrado para o tenant {tenant.label} "
+                             f"(CVCRM_API_TOKEN ou CVCRM_<NOME>_API_TOKEN)")
     
-    def make_request(self, endpoint, params=None):
-        """Faz requisição para API com retry automático"""
+    def make_request(self, endpoint, params=None, probe=False):
+        """Faz requisição para API com retry automático
+        
+        `probe`: consulta que não é leitura de página (ex: `count`), fora do
+        ajuste do tamanho de página.
+        """
         max_retries = 3
         delay = 10  # Aumentado para 10 segundos
+        requested = (params or {}).get('registros_por_pagina')
         
         for attempt in range(max_retries):
+            # Circuito aberto: falha na hora, sem esperar rate limit nem retries
+            self.circuit.check(endpoint)
             try:
                 url = f"{self.base_url}/{endpoint}"
                 
-                # Rate limiting OBRIGATÓRIO - mínimo 10 segundos
-                print(f"   Aguardando 10s (rate limit obrigatorio)...")
-                time.sleep(10)
+                self.rate_limiter.wait()
                 
+                started = time.monotonic()
                 response = requests.get(url, headers=self.headers, params=params, timeout=30)
+                elapsed = time.monotonic() - started
                 
                 if response.status_code == 429:  # Rate limit
                     wait_time = 60  # Aguardar 1 minuto completo
@@ -80,22 +473,150 @@ class CVCRMAPIClient:
                     time.sleep(wait_time)
                     continue
                 
-                if response.status_code == 200:
-                    try:
-                        return response.json()
-                    except:
-                        logging.error(f"Resposta não é JSON válido: {response.text[:200]}")
-                        return None
-                
                 response.raise_for_status()
-                return response.json()
+                try:
+                    data = response.json()
+                except ValueError:
+                    logging.error(f"Resposta não é JSON válido: {response.text[:200]}")
+                    return None
+                
+                records = data.get('data') if isinstance(data, dict) else None
+                if not probe:
+                    self.page_sizes.observe(endpoint, requested, elapsed, len(response.content), len(records or []))
+                self.circuit.success(endpoint)
+                return data
                 
             except requests.exceptions.RequestException as e:
                 logging.error(f"Erro na requisição (tentativa {attempt + 1}): {e}")
-                if attempt == max_retries - 1:
+                status = getattr(getattr(e, 'response', None), 'status_code', None)
+                if isinstance(e, requests.exceptions.Timeout) or (status is not None and status >= 500):
+                    self.page_sizes.failure(endpoint, requested)
+                if status is None or status >= 500:
+                    self.circuit.failure(endpoint)
+                if attempt == max_retries - 1 or self.circuit.is_open(endpoint):
                     raise
                 time.sleep(delay * (2 ** attempt))
     
+    def iter_pages(self, endpoint, date_from=None):
+        """Itera as páginas (não vazias) de um endpoint com tamanho adaptativo
+        
+        Cada página entregue é gravada no PageArchive (quando habilitado) como
+        parte desta passada; a passada só é marcada como completa quando a
+        paginação chega ao fim (não quando o consumidor para no meio).
+        """
+        archive_pass = uuid.uuid4().hex
+        for params, data in self._iter_payloads(endpoint, date_from):
+            self._archived(endpoint, params, data, archive_pass)
+            yield data['data']
+        self._archived_pass(endpoint, date_from, archive_pass)
+    
+    def _iter_payloads(self, endpoint, date_from=None):
+        """Páginas do iter_pages como (parâmetros, resposta)
+        
+        A API pagina por `pagina` x `registros_por_pagina`, então o tamanho só
+        muda quando o deslocamento atual é múltiplo do novo tamanho (sem pular
+        nem repetir registros); o tamanho dobra a cada página cheia e rápida.
+        Uma página incompleta num tamanho ainda não confirmado pode ser a última
+        ou um limite silencioso do servidor, que desalinha o deslocamento: antes
+        de entregá-la, o mesmo deslocamento é relido no tamanho confirmado.
+        """
+        offset = 0
+        size = self.page_sizes.size(endpoint)
+        clamped = False
+        # Maior página cheia desta paginação (o controlador pode não ter confirmado nenhuma)
+        accepted = 0
+        
+        def fetch(size):
+            params = {'pagina': offset // size + 1, 'registros_por_pagina': size}
+            if date_from:
+                params['a_partir_data_referencia'] = date_from
+            data = self.make_request(endpoint, params) or {}
+            data['data'] = data.get('data') or []
+            return params, data
+        
+        while True:
+            try:
+                params, data = fetch(size)
+            except requests.exceptions.RequestException:
+                # Timeout/5xx já reduziram o tamanho preferido: tenta de novo menor
+                preferred = self.page_sizes.size(endpoint)
+                if preferred >= size or offset % preferred != 0:
+                    raise
+                logging.warning(f"{endpoint}: reduzindo página de {size} para {preferred} registros")
+                size = preferred
+                continue
+            
+            records = data['data']
+            if not records:
+                return
+            
+            confirmed = self.page_sizes.confirmed(endpoint) or accepted
+            if offset and len(records) < size and size > confirmed and not clamped:
+                check_size = math.gcd(offset, confirmed)
+                check_params, check_data = fetch(check_size)
+                check = check_data['data']
+                if check != records[:len(check)]:
+                    logging.warning(f"{endpoint}: servidor limitou a página abaixo de {size}, "
+                                    f"voltando para {check_size} registros")
+                    self.page_sizes.clamp(endpoint, check_size)
+                    params, data, records, size = check_params, check_data, check, check_size
+                    if not records:
+                        return
+            
+            yield params, data
+            offset += len(records)
+            
+            if clamped:
+                # A segunda página veio: a primeira foi limitada pelo servidor
+                self.page_sizes.clamp(endpoint, size)
+                clamped = False
+            
+            if len(records) >= size:
+                accepted = max(accepted, size)
+            elif offset != len(records):
+                return  # página incompleta no meio da paginação: última página
+            else:
+                # Primeira página incompleta: última página ou limite do servidor.
+                # Seguir com o tamanho recebido funciona nos dois casos.
+                size = len(records)
+                clamped = True
+                continue
+            
+            preferred = self.page_sizes.size(endpoint)
+            if preferred != size and offset % preferred == 0:
+                size = preferred
+    
+    def count(self, endpoint, date_from=None):
+        """Total de registros do endpoint (`total_de_registros`) numa requisição de 1 registro
+        
+        Com `date_from`, só os registros com data de referência a partir dela.
+        Retorna None se a resposta não trouxer o total.
+        """
+        params = {'pagina': 1, 'registros_por_pagina': 1}
+        if date_from:
+            params['a_partir_data_referencia'] = date_from
+        data = self.make_request(endpoint, params, probe=True)
+        try:
+            return int(data['total_de_registros'])
+        except (TypeError, KeyError, ValueError):
+            return None
+    
+    def _archived(self, endpoint, params, data, archive_pass):
+        """Grava a página no arquivo local (quando habilitado)"""
+        if self.archive is not None:
+            try:
+                self.archive.append(endpoint, params, data, archive_pass)
+            except OSError as e:
+                logging.warning(f"Falha ao arquivar página de {endpoint}: {e}")
+    
+    def _archived_pass(self, endpoint, date_from, archive_pass):
+        """Marca no arquivo local que a passada leu o endpoint até o fim"""
+        if self.archive is not None:
+            try:
+                self.archive.finish(endpoint, date_from, archive_pass)
+            except OSError as e:
+                logging.warning(f"Falha ao arquivar fim da leitura de {endpoint}: {e}")
+    
     def get_empreendimentos(self, page=1, per_page=500):
         """Busca empreendimentos - CORRIGIDO conforme Power BI"""
         params = {'pagina': page, 'registros_por_pagina': per_page}
@@ -113,13 +634,6 @@ class CVCRMAPIClient:
         params = {'pagina': page, 'registros_por_pagina': per_page}
         return self.make_request('unidades', params)
     
-    def get_vendas_reais(self, page=1, per_page=500, date_from=None):
-        """Busca vendas reais via endpoint reservas - CORRIGIDO CVDW"""
-        params = {'pagina': page, 'registros_por_pagina': per_page}
-        if date_from:
-            params['a_partir_data_referencia'] = date_from
-        return self.make_request('reservas', params)
-    
     def get_comissoes(self, page=1, per_page=500, date_from=None):
         """Busca comissões - ENDPOINT CORRETO CVDW"""
         params = {'pagina': page, 'registros_por_pagina': per_page}
@@ -167,17 +681,608 @@ class CVCRMAPIClient:
             params['a_partir_data_referencia'] = date_from
         return self.make_request('valores_reservas', params)
 
+class PageArchive:
+    """Arquivo local append-only das páginas brutas do CVDW
+    
+    Cada página vira uma linha NDJSON comprimida como um membro gzip
+    independente, anexada ao segmento corrente (`segmento-00001.ndjson.gz`).
+    O `indice.ndjson` guarda endpoint/página/data de referência, a passada
+    (uma leitura do endpoint pelo iter_pages) e a posição de cada membro,
+    permitindo reler páginas sem descomprimir o segmento todo. Uma linha
+    `completa` no índice marca a passada que leu o endpoint até o fim.
+    
+    Habilitado pela variável CVDW_ARCHIVE_DIR.
+    """
+    
+    SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+    INDEX_FILE = 'indice.ndjson'
+    
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._segment = self._last_segment()
+    
+    @classmethod
+    def from_env(cls, tenant=None):
+        directory = os.getenv('CVDW_ARCHIVE_DIR')
+        if tenant is not None:
+            directory = tenant.archive_dir(directory)
+        return cls(directory) if directory else None
+    
+    def _segment_path(self, number):
+        return os.path.join(self.directory, f'segmento-{number:05d}.ndjson.gz')
+    
+    def _last_segment(self):
+        numbers = [int(name[9:14]) for name in os.listdir(self.directory)
+                   if name.startswith('segmento-') and name.endswith('.ndjson.gz')]
+        return max(numbers, default=1)
+    
+    def append(self, endpoint, params, data, archive_pass=None):
+        """Anexa uma página da passada `archive_pass` ao arquivo e registra no índice"""
+        params = params or {}
+        fetched_at = datetime.now().isoformat()
+        line = json.dumps({'endpoint': endpoint, 'params': params, 'buscado_em': fetched_at,
+                           'payload': data}, ensure_ascii=False, default=str)
+        member = gzip.compress((line + '\n').encode('utf-8'))
+        
+        with self._lock:
+            path = self._segment_path(self._segment)
+            if os.path.exists(path) and os.path.getsize(path) >= self.SEGMENT_MAX_BYTES:
+                self._segment += 1
+                path = self._segment_path(self._segment)
+            
+            with open(path, 'ab') as f:
+                offset = f.tell()
+                f.write(member)
+            
+            entry = {
+                'endpoint': endpoint,
+                'pagina': params.get('pagina'),
+                'registros_por_pagina': params.get('registros_por_pagina'),
+                'a_partir_data_referencia': params.get('a_partir_data_referencia'),
+                'passada': archive_pass,
+                'buscado_em': fetched_at,
+                'segmento': os.path.basename(path),
+                'offset': offset,
+                'tamanho': len(member),
+                'registros': len(data.get('data') or []) if isinstance(data, dict) else 0
+            }
+            self._index(entry)
+    
+    def finish(self, endpoint, date_from, archive_pass):
+        """Registra no índice que a passada leu o endpoint até o fim"""
+        with self._lock:
+            self._index({'endpoint': endpoint, 'a_partir_data_referencia': date_from, 'passada': archive_pass,
+                         'completa': True, 'buscado_em': datetime.now().isoformat()})
+    
+    def _index(self, entry):
+        with open(os.path.join(self.directory, self.INDEX_FILE), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + '\n')
+    
+    def entries(self, endpoint=None):
+        """Entradas do índice (opcionalmente de um endpoint), em ordem de gravação"""
+        path = os.path.join(self.directory, self.INDEX_FILE)
+        if not os.path.exists(path):
+            return []
+        
+        with open(path, encoding='utf-8') as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        return [e for e in entries if endpoint is None or e['endpoint'] == endpoint]
+    
+    def latest_pages(self, endpoint):
+        """Páginas a reler do endpoint, da passada mais antiga para a mais recente
+        
+        As páginas são agrupadas por passada, não por página/tamanho: com o
+        tamanho adaptativo, execuções diferentes gravam os mesmos registros em
+        páginas diferentes. Vale a última passada completa de cada endpoint;
+        uma passada mais antiga só entra se a sua data de referência
+        (`a_partir_data_referencia`) começa antes da de toda passada completa
+        posterior (ex: incompleta ou com filtro de data, seguida de uma mais
+        recente com data mais à frente). Páginas vazias não entram.
+        A ordem cronológica faz a versão mais recente de um registro
+        prevalecer no upsert.
+        """
+        passes = {}
+        dates = {}
+        complete = set()
+        unknown = 0
+        for entry in self.entries(endpoint):
+            if entry.get('passada') is None:
+                unknown += 1
+                continue
+            pages = passes.setdefault(entry['passada'], [])
+            if entry.get('completa'):
+                complete.add(entry['passada'])
+            else:
+                pages.append(entry)
+            dates[entry['passada']] = entry['a_partir_data_referencia'] or ''
+        if unknown:
+            logging.warning(f"{endpoint}: {unknown} páginas arquivadas sem passada (formato antigo) ignoradas")
+        
+        selected = []
+        covered = None  # menor data de referência das passadas completas mais recentes
+        for archive_pass, pages in reversed(list(passes.items())):
+            date_from = dates[archive_pass]
+            if covered is not None and covered <= date_from:
+                continue
+            selected.append(pages)
+            if archive_pass in complete:
+                covered = date_from if covered is None else min(covered, date_from)
+        return [entry for pages in reversed(selected) for entry in pages if entry['registros']]
+    
+    def read(self, entry):
+        """Lê o payload de uma página a partir da sua entrada no índice"""
+        with open(os.path.join(self.directory, entry['segmento']), 'rb') as f:
+            f.seek(entry['offset'])
+            member = f.read(entry['tamanho'])
+        return json.loads(gzip.decompress(member))['payload']
+
+class ArchiveReplayClient(CVCRMAPIClient):
+    """Cliente que responde a partir do PageArchive, sem chamar a API
+    
+    A página N de um endpoint é a N-ésima página a reler (ver
+    PageArchive.latest_pages), independente do tamanho de página pedido.
+    """
+    
+    def __init__(self, archive):
+        self.archive = archive
+        self.api_token = None
+        self.base_url = None
+        self.headers = {}
+        # Sem espera: só conta as páginas lidas
+        self.rate_limiter = RateLimiter(0)
+        self.page_sizes = PageSizeController()
+        self.circuit = ApiCircuit()
+        self._pages = {}
+    
+    def make_request(self, endpoint, params=None, probe=False):
+        self.rate_limiter.wait()
+        pages = self._latest_pages(endpoint)
+        index = (params or {}).get('pagina', 1) - 1
+        if index >= len(pages):
+            return {'data': []}
+        return self.archive.read(pages[index])
+    
+    def _latest_pages(self, endpoint):
+        if endpoint not in self._pages:
+            self._pages[endpoint] = self.archive.latest_pages(endpoint)
+        return self._pages[endpoint]
+    
+    def iter_pages(self, endpoint, date_from=None):
+        """Todas as páginas a reler, na ordem, sem recalcular deslocamentos"""
+        for page in range(1, len(self._latest_pages(endpoint)) + 1):
+            records = self.make_request(endpoint, {'pagina': page}).get('data') or []
+            if records:
+                yield records
+
+class MockSourceClient(CVCRMAPIClient):
+    """Cliente com páginas sintéticas, sem API nem arquivo (modo bench)
+    
+    Cada endpoint tem `records` registros com as colunas dos esquemas dos seus
+    destinos (ENDPOINT_TABLES), gerados de forma determinística pelo índice.
+    A paginação segue pagina x registros_por_pagina como na API, então o
+    tamanho adaptativo de página também é exercitado.
+    """
+    
+    def __init__(self, records=5000, seed=42):
+        self.archive = None
+        self.api_token = None
+        self.base_url = None
+        self.headers = {}
+        self.rate_limiter = RateLimiter(0)
+        self.page_sizes = PageSizeController()
+        self.circuit = ApiCircuit()
+        self.records = records
+        self.seed = seed
+    
+    # Colunas com formato próprio no banco (tamanho ou faixa de valores)
+    FORMATTED_VALUES = {
+        'estado': lambda rnd: rnd.choice(['SP', 'RJ', 'MG', 'PR', 'SC']),
+        'cep': lambda rnd: f"{rnd.randint(10000, 99999)}-{rnd.randint(0, 999):03d}",
+        'andar': lambda rnd: rnd.randint(0, 30)
+    }
+    
+    def make_request(self, endpoint, params=None, probe=False):
+        params = params or {}
+        size = params.get('registros_por_pagina', 500)
+        start = (params.get('pagina', 1) - 1) * size
+        self.rate_limiter.wait()
+        data = [self._record(endpoint, index) for index in range(start, min(start + size, self.records))]
+        if not probe:
+            self.page_sizes.observe(endpoint, size, 0, 0, len(data))
+        return {'data': data}
+    
+    def _record(self, endpoint, index):
+        rnd = random.Random(f"{self.seed}:{endpoint}:{index}")
+        day = date(2023, 1, 1) + timedelta(days=rnd.randint(0, 900))
+        record = {'referencia_data': day.isoformat()}
+        for table in ENDPOINT_TABLES[endpoint]:
+            for column, kind in RECORD_SCHEMAS[table].items():
+                if column in record:
+                    continue
+                if column == 'id':
+                    value = index + 1
+                elif column in self.FORMATTED_VALUES:
+                    value = self.FORMATTED_VALUES[column](rnd)
+                elif kind == 'int':
+                    # Chaves estrangeiras dentro dos ids gerados nos outros endpoints
+                    upper = 50 if column == 'empreendimento_id' else self.records
+                    value = rnd.randint(1, max(1, min(upper, self.records)))
+                elif kind == 'decimal':
+                    value = round(rnd.uniform(0, 10) if column.startswith('percentual')
+                                  else rnd.uniform(150000, 900000), 2)
+                elif kind == 'date':
+                    value = (day + timedelta(days=rnd.randint(0, 60))).isoformat()
+                elif kind == 'timestamp':
+                    value = f"{day.isoformat()} {rnd.randint(8, 18):02d}:{rnd.randint(0, 59):02d}:00"
+                elif kind == 'flag':
+                    value = rnd.choice(['S', 'S', 'S', 'N'])
+                else:
+                    value = f"{column} {rnd.randint(1, 80)}"
+                record[column] = value
+        return record
+
+class AlertDispatcher:
+    """Fila de alertas por email entregue em background
+    
+    O caminho do sync só enfileira a mensagem (nunca espera o SMTP). Uma thread
+    de entrega reaproveita a conexão SMTP entre mensagens, faz retry limitado
+    com backoff e agrupa erros repetidos dentro de uma janela de tempo. As
+    ocorrências suprimidas de um erro que não se repetiu viram um alerta de
+    resumo quando a janela fecha (ou no close).
+    
+    Servidor configurável via ALERT_SMTP_HOST / ALERT_SMTP_PORT /
+    ALERT_SMTP_STARTTLS, o que permite testar contra um SMTP local.
+    """
+    
+    def __init__(self, max_retries=3, retry_delay=5, coalesce_window=900, idle_timeout=300):
+        self.smtp_host = os.getenv('ALERT_SMTP_HOST', 'smtp.gmail.com')
+        self.smtp_port = int(os.getenv('ALERT_SMTP_PORT', '587'))
+        self.use_starttls = os.getenv('ALERT_SMTP_STARTTLS', 'true').lower() in ('1', 'true', 'sim')
+        self.smtp_timeout = int(os.getenv('ALERT_SMTP_TIMEOUT', '30'))
+        self.email_user = os.getenv('ALERT_EMAIL_USER')
+        self.email_password = os.getenv('ALERT_EMAIL_PASSWORD')
+        self.email_to = os.getenv('ALERT_EMAIL_TO', self.email_user)
+        
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.coalesce_window = coalesce_window
+        self.idle_timeout = idle_timeout
+        
+        self.queue = queue.Queue(maxsize=100)
+        self._server = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._recent = {}  # chave de agrupamento -> [enviado_em, suprimidos, assunto]
+        atexit.register(self.close, 5)
+    
+    @property
+    def enabled(self):
+        """Alertas ativos com credenciais ou com um SMTP próprio configurado"""
+        if not self.email_user:
+            return False
+        return bool(self.email_password) or bool(os.getenv('ALERT_SMTP_HOST'))
+    
+    def submit(self, subject, message, coalesce_key=None):
+        """Enfileira um alerta sem bloquear; retorna False se descartado/agrupado"""
+        if not self.enabled:
+            return False
+        
+        if coalesce_key is not None:
+            with self._lock:
+                now = time.monotonic()
+                recent = self._recent.get(coalesce_key)
+                if recent and now - recent[0] < self.coalesce_window:
+                    recent[1] += 1
+                    return False
+                suppressed = recent[1] if recent else 0
+                self._recent[coalesce_key] = [now, 0, subject]
+            if suppressed:
+                message += f"\n\n({suppressed} ocorrências repetidas suprimidas desde o último alerta)"
+        
+        self._ensure_worker()
+        try:
+            self.queue.put_nowait((subject, message))
+            return True
+        except queue.Full:
+            logging.warning(f"Fila de alertas cheia, alerta descartado: {subject}")
+            return False
+    
+    def flush(self, timeout=10):
+        """Aguarda a fila esvaziar (até `timeout` segundos)"""
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return self.queue.unfinished_tasks == 0
+    
+    def close(self, timeout=10):
+        """Entrega o que estiver na fila (e os resumos pendentes) e encerra a thread
+        
+        Nunca bloqueia além de `timeout`: com a fila cheia ou a thread parada o
+        que faltou entregar é descartado com aviso no log.
+        """
+        thread = self._thread
+        if thread is None:
+            return
+        self._thread = None
+        summaries = self._summaries(expired_only=False)
+        if not thread.is_alive():
+            pending = self.queue.qsize() + len(summaries)
+            if pending:
+                logging.warning(f"Thread de alertas parada: {pending} alertas não entregues")
+            return
+        
+        deadline = time.monotonic() + timeout
+        for subject, message in summaries:
+            try:
+                self.queue.put_nowait((subject, message))
+            except queue.Full:
+                logging.warning(f"Fila de alertas cheia, resumo descartado: {subject}")
+        self.flush(timeout)
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            logging.warning("Fila de alertas cheia ao encerrar; thread de entrega abandonada")
+        thread.join(max(0, deadline - time.monotonic()))
+    
+    def _summaries(self, expired_only=True):
+        """Resumos (assunto, mensagem) dos erros com ocorrências suprimidas
+        
+        `expired_only`: só as chaves cuja janela de agrupamento já fechou. A
+        chave resumida sai do agrupamento (a próxima ocorrência é enviada na hora).
+        """
+        now = time.monotonic()
+        summaries = []
+        with self._lock:
+            for key, (sent_at, suppressed, subject) in list(self._recent.items()):
+                if expired_only and now - sent_at < self.coalesce_window:
+                    continue
+                del self._recent[key]
+                if suppressed:
+                    minutes = max(1, round((now - sent_at) / 60))
+                    summaries.append((f"{subject} (resumo)",
+                                      f"{suppressed} ocorrências repetidas suprimidas "
+                                      f"nos últimos {minutes} minutos após o último alerta."))
+        return summaries
+    
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='alert-dispatcher', daemon=True)
+                self._thread.start()
+    
+    def _run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=min(self.idle_timeout, self.coalesce_window))
+            except queue.Empty:
+                # Janelas de agrupamento fechadas: resumo das ocorrências suprimidas
+                for subject, message in self._summaries():
+                    self._deliver(subject, message)
+                self._disconnect()  # conexão ociosa, libera o servidor
+                continue
+            
+            try:
+                if item is None:
+                    self._disconnect()
+                    return
+                self._deliver(*item)
+            finally:
+                self.queue.task_done()
+    
+    def _deliver(self, subject, message):
+        import smtplib
+        from email.mime.text import MIMEText
+        from email.mime.multipart import MIMEMultipart
+        
+        msg = MIMEMultipart()
+        msg['From'] = self.email_user
+        msg['To'] = self.email_to
+        msg['Subject'] = subject
+        msg.attach(MIMEText(message, 'plain'))
+        
+        for attempt in range(self.max_retries):
+            try:
+                self._connection().sendmail(self.email_user, [self.email_to], msg.as_string())
+                return True
+            except (smtplib.SMTPException, OSError) as e:
+                logging.warning(f"Falha ao enviar alerta (tentativa {attempt + 1}): {e}")
+                self._disconnect()
+                if attempt < self.max_retries - 1:
+                    time.sleep(self.retry_delay * (2 ** attempt))
+        
+        logging.error(f"Alerta descartado após {self.max_retries} tentativas: {subject}")
+        return False
+    
+    def _connection(self):
+        """Reaproveita a conexão SMTP aberta ou abre uma nova"""
+        import smtplib
+        
+        if self._server is not None:
+            try:
+                if self._server.noop()[0] == 250:
+                    return self._server
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._disconnect()
+        
+        server = smtplib.SMTP(self.smtp_host, self.smtp_port, timeout=self.smtp_timeout)
+        if self.use_starttls:
+            server.starttls()
+        if self.email_password:
+            server.login(self.email_user, self.email_password)
+        self._server = server
+        return server
+    
+    def _disconnect(self):
+        if self._server is None:
+            return
+        import smtplib
+        try:
+            self._server.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        self._server = None
+
+def _add_months(month, months):
+    """Primeiro dia do mês `months` meses depois de `month`"""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def _month_of(value):
+    """Primeiro dia do mês de uma data/timestamp (date, texto ISO ou dd/mm/aaaa), ou None"""
+    if not value:
+        return None
+    text = str(value)
+    try:
+        if text[2:3] == '/':
+            return date(int(text[6:10]), int(text[3:5]), 1)
+        return date(int(text[:4]), int(text[5:7]), 1)
+    except ValueError:
+        return None
+
+class PartitionTrackingConnection(psycopg2.extensions.connection):
+    """Conexão que só publica no cache as partições de transações confirmadas
+    
+    ensure_partition anota em `partitions` as partições criadas (ou vistas)
+    na transação; no commit, as que ainda existem (um ROLLBACK TO SAVEPOINT
+    pode ter desfeito a criação) entram em `known_partitions`. Um rollback
+    descarta as anotações.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.partitions = set()
+        self.known_partitions = None
+    
+    def commit(self):
+        names, self.partitions = self.partitions, set()
+        if names and self.known_partitions is not None:
+            try:
+                with self.cursor() as cursor:
+                    cursor.execute("SELECT nome FROM unnest(%s::text[]) AS nome WHERE to_regclass(nome) IS NOT NULL",
+                                   (sorted(names),))
+                    names = {row[0] for row in cursor.fetchall()}
+            except psycopg2.Error:
+                names = set()  # transação abortada: o commit vira rollback
+        super().commit()
+        if self.known_partitions is not None:
+            self.known_partitions.update(names)
+    
+    def rollback(self):
+        self.partitions = set()
+        super().rollback()
+
 class CloudDatabaseManager:
     """Gerenciador do banco PostgreSQL na cloud"""
     
-    def __init__(self):
+    # Tabelas particionadas por mês (RANGE na coluna de data). A unicidade
+    # precisa incluir a chave de partição: (cvcrm_id, data) com NULLS NOT
+    # DISTINCT (PostgreSQL 15+); datas nulas ficam na partição DEFAULT.
+    PARTITIONED_TABLES = {
+        'atendimentos': {
+            'key': 'data_atendimento',
+            'type': 'timestamp',
+            'ddl': """
+                CREATE TABLE IF NOT EXISTS {name} (
+                    id SERIAL,
+                    cvcrm_id INTEGER NOT NULL,
+                    corretor_id INTEGER,
+                    corretor_nome VARCHAR(255),
+                    grupo_corretor VARCHAR(100),
+                    time_corretor VARCHAR(100),
+                    cliente_nome VARCHAR(255),
+                    cliente_email VARCHAR(255),
+                    cliente_telefone VARCHAR(50),
+                    empreendimento_id INTEGER,
+                    data_atendimento TIMESTAMP,
+                    tipo_atendimento VARCHAR(100),
+                    status VARCHAR(50),
+                    created_at TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    CONSTRAINT atendimentos_cvcrm_id_particao_key UNIQUE NULLS NOT DISTINCT (cvcrm_id, data_atendimento)
+                ) PARTITION BY RANGE (data_atendimento);
+            """
+        },
+        # Vendas (baseado em reservas CVDW) - tabela principal para análises
+        'vendas': {
+            'key': 'data_venda',
+            'type': 'date',
+            'ddl': """
+                CREATE TABLE IF NOT EXISTS {name} (
+                    id SERIAL,
+                    cvcrm_id INTEGER NOT NULL,
+                    reserva_id INTEGER,
+                    empreendimento VARCHAR(255),
+                    unidade_id INTEGER,
+                    corretor VARCHAR(255),
+                    time_corretor VARCHAR(100),
+                    cliente VARCHAR(255),
+                    valor DECIMAL(15,2),
+                    data_venda DATE,
+                    ativo VARCHAR(1),
+                    status VARCHAR(50),
+                    -- Campos de comissão (vem do endpoint /comissoes)
+                    comissao_valor DECIMAL(15,2),
+                    comissao_percentual DECIMAL(5,2),
+                    -- Campos financeiros (vem do endpoint /reservas/condicoes)  
+                    valor_financiamento DECIMAL(15,2),
+                    valor_entrada DECIMAL(15,2),
+                    numero_parcelas INTEGER,
+                    -- Campos calculados
+                    vgv DECIMAL(15,2),
+                    created_at TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    CONSTRAINT vendas_cvcrm_id_particao_key UNIQUE NULLS NOT DISTINCT (cvcrm_id, data_venda)
+                ) PARTITION BY RANGE (data_venda);
+            """
+        },
+        'reservas': {
+            'key': 'data_reserva',
+            'type': 'date',
+            'ddl': """
+                CREATE TABLE IF NOT EXISTS {name} (
+                    id SERIAL,
+                    cvcrm_id INTEGER NOT NULL,
+                    empreendimento_id INTEGER,
+                    unidade_id INTEGER,
+                    corretor_id INTEGER,
+                    corretor_nome VARCHAR(255),
+                    cliente_nome VARCHAR(255),
+                    data_reserva DATE,
+                    data_vencimento DATE,
+                    status VARCHAR(50),
+                    created_at TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    CONSTRAINT reservas_cvcrm_id_particao_key UNIQUE NULLS NOT DISTINCT (cvcrm_id, data_reserva),
+                    FOREIGN KEY (empreendimento_id) REFERENCES empreendimentos(cvcrm_id),
+                    FOREIGN KEY (unidade_id) REFERENCES unidades(cvcrm_id)
+                ) PARTITION BY RANGE (data_reserva);
+            """
+        }
+    }
+    
+    # Partições futuras criadas a cada execução
+    PARTITION_MONTHS_AHEAD = 3
+    
+    def __init__(self, schema=None):
+        """`schema`: schema do tenant (search_path das conexões); None = schema padrão"""
         self.database_url = os.getenv('DATABASE_URL')
         if not self.database_url:
             raise ValueError("DATABASE_URL não encontrada")
+        self.schema = schema
+        self._known_partitions = set()
     
     def get_connection(self):
-        """Cria conexão com o banco"""
-        return psycopg2.connect(self.database_url)
+        """Cria conexão com o banco (no schema do tenant, se houver)"""
+        conn = psycopg2.connect(self.database_url, connection_factory=PartitionTrackingConnection)
+        conn.known_partitions = self._known_partitions
+        if self.schema:
+            with conn.cursor() as cursor:
+                cursor.execute("SET search_path TO %s", (self.schema,))
+            conn.commit()
+        return conn
     
     def create_tables(self):
         """Cria estrutura do banco focada em análises de vendas"""
@@ -199,26 +1304,6 @@ class CloudDatabaseManager:
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             );
             """,
-            # Corretores e atendimentos
-            """
-            CREATE TABLE IF NOT EXISTS atendimentos (
-                id SERIAL PRIMARY KEY,
-                cvcrm_id INTEGER UNIQUE NOT NULL,
-                corretor_id INTEGER,
-                corretor_nome VARCHAR(255),
-                grupo_corretor VARCHAR(100),
-                time_corretor VARCHAR(100),
-                cliente_nome VARCHAR(255),
-                cliente_email VARCHAR(255),
-                cliente_telefone VARCHAR(50),
-                empreendimento_id INTEGER,
-                data_atendimento TIMESTAMP,
-                tipo_atendimento VARCHAR(100),
-                status VARCHAR(50),
-                created_at TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-            """,
             # Unidades
             """
             CREATE TABLE IF NOT EXISTS unidades (
@@ -255,34 +1340,6 @@ class CloudDatabaseManager:
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             );
             """,
-            # Vendas (baseado em reservas CVDW) - tabela principal para análises
-            """
-            CREATE TABLE IF NOT EXISTS vendas (
-                id SERIAL PRIMARY KEY,
-                cvcrm_id INTEGER UNIQUE NOT NULL,
-                reserva_id INTEGER,
-                empreendimento VARCHAR(255),
-                unidade_id INTEGER,
-                corretor VARCHAR(255),
-                time_corretor VARCHAR(100),
-                cliente VARCHAR(255),
-                valor DECIMAL(15,2),
-                data_venda DATE,
-                ativo VARCHAR(1),
-                status VARCHAR(50),
-                -- Campos de comissão (vem do endpoint /comissoes)
-                comissao_valor DECIMAL(15,2),
-                comissao_percentual DECIMAL(5,2),
-                -- Campos financeiros (vem do endpoint /reservas/condicoes)  
-                valor_financiamento DECIMAL(15,2),
-                valor_entrada DECIMAL(15,2),
-                numero_parcelas INTEGER,
-                -- Campos calculados
-                vgv DECIMAL(15,2),
-                created_at TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-            """,
             # Repasses
             """
             CREATE TABLE IF NOT EXISTS repasses (
@@ -298,8 +1355,7 @@ class CloudDatabaseManager:
                 status VARCHAR(50),
                 observacoes TEXT,
                 created_at TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (venda_id) REFERENCES vendas(cvcrm_id)
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             );
             """,
             # Prosoluto
@@ -317,29 +1373,9 @@ class CloudDatabaseManager:
                 status VARCHAR(50),
                 created_at TIMESTAMP,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (venda_id) REFERENCES vendas(cvcrm_id),
                 FOREIGN KEY (empreendimento_id) REFERENCES empreendimentos(cvcrm_id)
             );
             """,
-            # Reservas
-            """
-            CREATE TABLE IF NOT EXISTS reservas (
-                id SERIAL PRIMARY KEY,
-                cvcrm_id INTEGER UNIQUE NOT NULL,
-                empreendimento_id INTEGER,
-                unidade_id INTEGER,
-                corretor_id INTEGER,
-                corretor_nome VARCHAR(255),
-                cliente_nome VARCHAR(255),
-                data_reserva DATE,
-                data_vencimento DATE,
-                status VARCHAR(50),
-                created_at TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (empreendimento_id) REFERENCES empreendimentos(cvcrm_id),
-                FOREIGN KEY (unidade_id) REFERENCES unidades(cvcrm_id)
-            );
-            """,
             # Valores das reservas
             """
             CREATE TABLE IF NOT EXISTS valores_reservas (
@@ -352,77 +1388,230 @@ class CloudDatabaseManager:
                 numero_parcelas INTEGER,
                 valor_parcela DECIMAL(15,2),
                 created_at TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (reserva_id) REFERENCES reservas(cvcrm_id)
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             );
             """,
-            # Views para análises de vendas - CORRIGIDAS
+            # Checkpoints do backfill histórico (uma linha por endpoint x janela)
             """
-            CREATE OR REPLACE VIEW vw_vendas_ano_atual_vs_passado AS
-            SELECT
-                'Ano Atual' as periodo,
-                EXTRACT(YEAR FROM data_venda) as ano,
-                COUNT(*) as quantidade_vendas,
-                SUM(valor) as valor_total,
-                AVG(valor) as ticket_medio,
-                SUM(comissao_valor) as total_comissoes,
-                AVG(comissao_valor) as media_comissoes
-            FROM vendas
-            WHERE EXTRACT(YEAR FROM data_venda) = EXTRACT(YEAR FROM CURRENT_DATE)
-            AND ativo = 'S'
-            AND data_venda IS NOT NULL
-            GROUP BY EXTRACT(YEAR FROM data_venda)
-            UNION ALL
-            SELECT
-                'Ano Passado' as periodo,
-                EXTRACT(YEAR FROM data_venda) as ano,
-                COUNT(*) as quantidade_vendas,
-                SUM(valor) as valor_total,
-                AVG(valor) as ticket_medio,
-                SUM(comissao_valor) as total_comissoes,
-                AVG(comissao_valor) as media_comissoes
-            FROM vendas
-            WHERE EXTRACT(YEAR FROM data_venda) = EXTRACT(YEAR FROM CURRENT_DATE) - 1
-            AND ativo = 'S'
-            AND data_venda IS NOT NULL
-            GROUP BY EXTRACT(YEAR FROM data_venda);
+            CREATE TABLE IF NOT EXISTS etl_backfill_janelas (
+                endpoint VARCHAR(50) NOT NULL,
+                janela_inicio DATE NOT NULL,
+                janela_fim DATE NOT NULL,
+                ultima_pagina INTEGER NOT NULL DEFAULT 0,
+                registros_por_pagina INTEGER NOT NULL,
+                registros INTEGER NOT NULL DEFAULT 0,
+                status VARCHAR(20) NOT NULL,
+                atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (endpoint, janela_inicio, janela_fim)
+            );
             """,
+            # Tamanhos de página escolhidos pelo PageSizeController (lembrados entre execuções)
             """
-            CREATE OR REPLACE VIEW vw_vendas_mensais AS
-            SELECT 
-                DATE_TRUNC('month', data_venda) as mes,
-                EXTRACT(YEAR FROM data_venda) as ano,
-                EXTRACT(MONTH FROM data_venda) as mes_numero,
-                COUNT(*) as quantidade_vendas,
-                SUM(valor) as valor_total_vendas,
-                AVG(valor) as ticket_medio,
-                SUM(valor) as vgv_total,
-                SUM(comissao_valor) as total_comissoes,
-                AVG(comissao_valor) as media_comissoes
-            FROM vendas 
-            WHERE data_venda >= CURRENT_DATE - INTERVAL '24 months'
-            AND ativo = 'S'
-            AND data_venda IS NOT NULL
-            GROUP BY DATE_TRUNC('month', data_venda), EXTRACT(YEAR FROM data_venda), EXTRACT(MONTH FROM data_venda)
-            ORDER BY mes;
+            CREATE TABLE IF NOT EXISTS etl_page_sizes (
+                endpoint VARCHAR(50) PRIMARY KEY,
+                registros_por_pagina INTEGER NOT NULL,
+                maior_confirmado INTEGER NOT NULL DEFAULT 0,
+                atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
             """,
+            # Agenda adaptativa: cadência aprendida de cada tarefa do sync e
+            # requisições à API consumidas por dia (orçamento diário)
             """
-            CREATE OR REPLACE VIEW vw_vendas_por_empreendimento AS
-            SELECT 
+            CREATE TABLE IF NOT EXISTS etl_agenda (
+                tarefa VARCHAR(50) PRIMARY KEY,
+                intervalo_minutos INTEGER NOT NULL,
+                taxa_mudanca REAL NOT NULL,
+                custo_requisicoes REAL,
+                digest VARCHAR(40),
+                execucoes INTEGER NOT NULL DEFAULT 0,
+                mudancas INTEGER NOT NULL DEFAULT 0,
+                ultima_execucao TIMESTAMP,
+                ultima_mudanca TIMESTAMP,
+                atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS etl_agenda_consumo (
+                dia DATE PRIMARY KEY,
+                requisicoes INTEGER NOT NULL DEFAULT 0
+            );
+            """,
+            # Fila de trabalho (modo fila): tarefas da agenda e janelas do backfill,
+            # reivindicadas por qualquer réplica do worker com FOR UPDATE SKIP LOCKED.
+            # `lote` é a execução em etl_sync_runs; `etapa` ordena dependências.
+            """
+            CREATE TABLE IF NOT EXISTS etl_tarefas (
+                id SERIAL PRIMARY KEY,
+                lote INTEGER NOT NULL,
+                tipo VARCHAR(20) NOT NULL,
+                tarefa VARCHAR(50) NOT NULL,
+                janela_inicio DATE,
+                janela_fim DATE,
+                etapa INTEGER NOT NULL DEFAULT 0,
+                status VARCHAR(20) NOT NULL DEFAULT 'pendente',
+                tentativas INTEGER NOT NULL DEFAULT 0,
+                max_tentativas INTEGER NOT NULL DEFAULT 3,
+                disponivel_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                worker VARCHAR(100),
+                lease_ate TIMESTAMP,
+                heartbeat_em TIMESTAMP,
+                iniciado_em TIMESTAMP,
+                concluido_em TIMESTAMP,
+                registros JSONB,
+                mudou BOOLEAN,
+                requisicoes INTEGER,
+                erro TEXT,
+                criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+            """,
+            # Uma tarefa ativa por unidade de trabalho: réplicas que enfileiram o
+            # mesmo tick não duplicam tarefas
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS etl_tarefas_ativas
+            ON etl_tarefas (tipo, tarefa, janela_inicio, janela_fim) NULLS NOT DISTINCT
+            WHERE status IN ('pendente', 'executando');
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS etl_tarefas_fila ON etl_tarefas (status, etapa, id);
+            """,
+            # Próximo horário livre de requisição à API, compartilhado entre réplicas
+            """
+            CREATE TABLE IF NOT EXISTS etl_rate_limit (
+                chave VARCHAR(50) PRIMARY KEY,
+                proximo_slot TIMESTAMP NOT NULL
+            );
+            """,
+            # Registro das execuções do ETL; o maior id com status 'sucesso' é a
+            # geração dos dados (o dashboard recarrega seus caches quando ela muda)
+            """
+            CREATE TABLE IF NOT EXISTS etl_sync_runs (
+                id SERIAL PRIMARY KEY,
+                modo VARCHAR(20) NOT NULL,
+                status VARCHAR(20) NOT NULL DEFAULT 'executando',
+                iniciado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                finalizado_em TIMESTAMP,
+                registros JSONB,
+                erro TEXT,
+                circuito JSONB
+            );
+            """,
+            # Estado dos disjuntores da API ao fim da execução (bancos anteriores)
+            """
+            ALTER TABLE etl_sync_runs ADD COLUMN IF NOT EXISTS circuito JSONB;
+            """,
+            # Estado atual dos disjuntores do cliente CVDW, lido pelo /health
+            """
+            CREATE TABLE IF NOT EXISTS etl_circuito (
+                worker VARCHAR(100) PRIMARY KEY,
+                estado JSONB NOT NULL,
+                atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+            """,
+            # Registros rejeitados na carga (RowQuarantine): payload original e
+            # motivo; tentados de novo nas próximas execuções. chave = cvcrm_id,
+            # ou hash do payload quando não há id válido
+            """
+            CREATE TABLE IF NOT EXISTS etl_quarentena (
+                tabela VARCHAR(50) NOT NULL,
+                chave VARCHAR(64) NOT NULL,
+                cvcrm_id INTEGER,
+                registro JSONB NOT NULL,
+                motivo TEXT NOT NULL,
+                tentativas INTEGER NOT NULL DEFAULT 1,
+                criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (tabela, chave)
+            );
+            """,
+            # Dashboard pré-renderizado (HTML e JSON em gzip), publicado ao fim de
+            # cada sincronização e servido pelo monitoring.py enquanto a geração valer
+            """
+            CREATE TABLE IF NOT EXISTS dashboard_snapshots (
+                nome VARCHAR(100) PRIMARY KEY,
+                geracao INTEGER NOT NULL,
+                content_type VARCHAR(100) NOT NULL,
+                corpo_gzip BYTEA NOT NULL,
+                publicado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+            """,
+            # Cubo de vendas: agregados por mês x empreendimento x time x corretor
+            # (apenas vendas ativas com data), mantido incrementalmente pelo ETL
+            """
+            CREATE TABLE IF NOT EXISTS vendas_cubo (
+                mes DATE NOT NULL,
+                empreendimento VARCHAR(255),
+                time_corretor VARCHAR(100),
+                corretor VARCHAR(255),
+                quantidade_vendas INTEGER NOT NULL,
+                valor_total DECIMAL(17,2),
+                vgv_total DECIMAL(17,2),
+                comissao_total DECIMAL(17,2),
+                quantidade_comissoes INTEGER NOT NULL,
+                atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                CONSTRAINT vendas_cubo_celula_key UNIQUE NULLS NOT DISTINCT (mes, empreendimento, time_corretor, corretor)
+            );
+            """,
+        ]
+        
+        # Índices e views (depois das tabelas particionadas)
+        view_commands = [
+            # Índice para o join das comissões (vendas.reserva_id)
+            """
+            CREATE INDEX IF NOT EXISTS idx_vendas_reserva_id ON vendas (reserva_id);
+            """,
+            # Views para análises de vendas - CORRIGIDAS
+            # As views agregadas re-agregam o vendas_cubo (janelas alinhadas ao mês);
+            # as que leem vendas filtram por intervalo de datas (partition pruning)
+            """
+            CREATE OR REPLACE VIEW vw_vendas_ano_atual_vs_passado AS
+            SELECT
+                CASE WHEN mes >= DATE_TRUNC('year', CURRENT_DATE)::date
+                     THEN 'Ano Atual' ELSE 'Ano Passado' END as periodo,
+                EXTRACT(YEAR FROM mes) as ano,
+                SUM(quantidade_vendas) as quantidade_vendas,
+                SUM(valor_total) as valor_total,
+                SUM(valor_total) / NULLIF(SUM(quantidade_vendas), 0) as ticket_medio,
+                SUM(comissao_total) as total_comissoes,
+                SUM(comissao_total) / NULLIF(SUM(quantidade_comissoes), 0) as media_comissoes
+            FROM vendas_cubo
+            WHERE mes >= (DATE_TRUNC('year', CURRENT_DATE) - INTERVAL '1 year')::date
+            AND mes < (DATE_TRUNC('year', CURRENT_DATE) + INTERVAL '1 year')::date
+            GROUP BY EXTRACT(YEAR FROM mes), mes >= DATE_TRUNC('year', CURRENT_DATE)::date
+            ORDER BY ano DESC;
+            """,
+            """
+            CREATE OR REPLACE VIEW vw_vendas_mensais AS
+            SELECT 
+                mes,
+                EXTRACT(YEAR FROM mes) as ano,
+                EXTRACT(MONTH FROM mes) as mes_numero,
+                SUM(quantidade_vendas) as quantidade_vendas,
+                SUM(valor_total) as valor_total_vendas,
+                SUM(valor_total) / NULLIF(SUM(quantidade_vendas), 0) as ticket_medio,
+                SUM(valor_total) as vgv_total,
+                SUM(comissao_total) as total_comissoes,
+                SUM(comissao_total) / NULLIF(SUM(quantidade_comissoes), 0) as media_comissoes
+            FROM vendas_cubo
+            WHERE mes >= DATE_TRUNC('month', CURRENT_DATE - INTERVAL '24 months')::date
+            GROUP BY mes
+            ORDER BY mes;
+            """,
+            """
+            CREATE OR REPLACE VIEW vw_vendas_por_empreendimento AS
+            SELECT 
                 e.cvcrm_id,
                 e.nome as empreendimento,
-                COUNT(v.id) as quantidade_vendas,
-                SUM(v.valor) as valor_total_vendas,
-                AVG(v.valor) as ticket_medio,
-                SUM(v.vgv) as vgv_total,
-                SUM(v.comissao_valor) as total_comissoes,
-                AVG(v.comissao_valor) as media_comissoes,
-                COUNT(DISTINCT v.corretor) as total_corretores
+                COALESCE(SUM(c.quantidade_vendas), 0) as quantidade_vendas,
+                SUM(c.valor_total) as valor_total_vendas,
+                SUM(c.valor_total) / NULLIF(SUM(c.quantidade_vendas), 0) as ticket_medio,
+                SUM(c.vgv_total) as vgv_total,
+                SUM(c.comissao_total) as total_comissoes,
+                SUM(c.comissao_total) / NULLIF(SUM(c.quantidade_comissoes), 0) as media_comissoes,
+                COUNT(DISTINCT c.corretor) as total_corretores
             FROM empreendimentos e
-            LEFT JOIN vendas v ON e.nome = v.empreendimento 
-                AND v.ativo = 'S'
-                AND v.data_venda IS NOT NULL
-                AND v.data_venda >= CURRENT_DATE - INTERVAL '12 months'
+            LEFT JOIN vendas_cubo c ON e.nome = c.empreendimento
+                AND c.mes >= DATE_TRUNC('month', CURRENT_DATE - INTERVAL '12 months')::date
+            WHERE e.excluido_em IS NULL
             GROUP BY e.cvcrm_id, e.nome
             ORDER BY valor_total_vendas DESC NULLS LAST;
             """,
@@ -431,16 +1620,14 @@ class CloudDatabaseManager:
             SELECT 
                 corretor,
                 time_corretor,
-                COUNT(*) as quantidade_vendas,
-                SUM(valor) as valor_total_vendas,
-                AVG(valor) as ticket_medio,
-                SUM(comissao_valor) as total_comissoes,
-                AVG(comissao_valor) as media_comissoes,
+                SUM(quantidade_vendas) as quantidade_vendas,
+                SUM(valor_total) as valor_total_vendas,
+                SUM(valor_total) / NULLIF(SUM(quantidade_vendas), 0) as ticket_medio,
+                SUM(comissao_total) as total_comissoes,
+                SUM(comissao_total) / NULLIF(SUM(quantidade_comissoes), 0) as media_comissoes,
                 COUNT(DISTINCT empreendimento) as empreendimentos_vendidos
-            FROM vendas 
-            WHERE data_venda >= CURRENT_DATE - INTERVAL '12 months'
-            AND ativo = 'S'
-            AND data_venda IS NOT NULL
+            FROM vendas_cubo
+            WHERE mes >= DATE_TRUNC('month', CURRENT_DATE - INTERVAL '12 months')::date
             AND corretor IS NOT NULL
             GROUP BY corretor, time_corretor
             ORDER BY valor_total_vendas DESC;
@@ -449,33 +1636,29 @@ class CloudDatabaseManager:
             CREATE OR REPLACE VIEW vw_vendas_por_time AS
             SELECT 
                 COALESCE(time_corretor, 'Sem Time') as time_corretor,
-                COUNT(*) as quantidade_vendas,
-                SUM(valor) as valor_total_vendas,
-                AVG(valor) as ticket_medio,
-                SUM(comissao_valor) as total_comissoes,
-                AVG(comissao_valor) as media_comissoes,
+                SUM(quantidade_vendas) as quantidade_vendas,
+                SUM(valor_total) as valor_total_vendas,
+                SUM(valor_total) / NULLIF(SUM(quantidade_vendas), 0) as ticket_medio,
+                SUM(comissao_total) as total_comissoes,
+                SUM(comissao_total) / NULLIF(SUM(quantidade_comissoes), 0) as media_comissoes,
                 COUNT(DISTINCT corretor) as total_corretores,
                 COUNT(DISTINCT empreendimento) as empreendimentos_vendidos
-            FROM vendas 
-            WHERE data_venda >= CURRENT_DATE - INTERVAL '12 months'
-            AND ativo = 'S'
-            AND data_venda IS NOT NULL
+            FROM vendas_cubo
+            WHERE mes >= DATE_TRUNC('month', CURRENT_DATE - INTERVAL '12 months')::date
             GROUP BY time_corretor
             ORDER BY valor_total_vendas DESC;
             """,
             """
             CREATE OR REPLACE VIEW vw_vso_mensal AS
             SELECT 
-                DATE_TRUNC('month', data_venda) as mes,
-                COUNT(*) as quantidade_vendas,
-                SUM(valor) as vso_valor,
-                AVG(valor) as vso_ticket_medio,
-                SUM(valor) / NULLIF(COUNT(DISTINCT empreendimento), 0) as vso_por_empreendimento
-            FROM vendas 
-            WHERE data_venda >= CURRENT_DATE - INTERVAL '12 months'
-            AND ativo = 'S'
-            AND data_venda IS NOT NULL
-            GROUP BY DATE_TRUNC('month', data_venda)
+                mes,
+                SUM(quantidade_vendas) as quantidade_vendas,
+                SUM(valor_total) as vso_valor,
+                SUM(valor_total) / NULLIF(SUM(quantidade_vendas), 0) as vso_ticket_medio,
+                SUM(valor_total) / NULLIF(COUNT(DISTINCT empreendimento), 0) as vso_por_empreendimento
+            FROM vendas_cubo
+            WHERE mes >= DATE_TRUNC('month', CURRENT_DATE - INTERVAL '12 months')::date
+            GROUP BY mes
             ORDER BY mes;
             """,
             """
@@ -490,6 +1673,7 @@ class CloudDatabaseManager:
             LEFT JOIN vendas v ON p.venda_id = v.cvcrm_id
             WHERE p.data_calculo >= CURRENT_DATE - INTERVAL '12 months'
             AND p.status NOT IN ('cancelado')
+            AND p.excluido_em IS NULL
             GROUP BY DATE_TRUNC('month', p.data_calculo)
             ORDER BY mes;
             """,
@@ -523,14 +1707,539 @@ class CloudDatabaseManager:
         try:
             with self.get_connection() as conn:
                 with conn.cursor() as cursor:
+                    if self.schema:
+                        # Nome validado em Tenant (letras minúsculas, números e _)
+                        cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {self.schema}")
                     for sql in sql_commands:
                         cursor.execute(sql)
+                    for table in self.PARTITIONED_TABLES:
+                        self._setup_partitioned_table(cursor, table)
+                    # Marca de registro excluído/cancelado no CVCRM (conciliação por ids)
+                    for table in TOMBSTONE_TABLES:
+                        cursor.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS excluido_em TIMESTAMP")
+                    for sql in view_commands:
+                        cursor.execute(sql)
+                    cursor.execute("SELECT NOT EXISTS (SELECT 1 FROM vendas_cubo) AND EXISTS (SELECT 1 FROM vendas)")
+                    if cursor.fetchone()[0]:
+                        self.rebuild_cube(cursor)
                 conn.commit()
             logging.info("Estrutura do banco criada com sucesso")
         except Exception as e:
             logging.error(f"Erro ao criar estrutura do banco: {e}")
             raise
 
+    def _setup_partitioned_table(self, cursor, table):
+        """Cria a tabela particionada (ou migra a versão antiga, não particionada)"""
+        spec = self.PARTITIONED_TABLES[table]
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+        row = cursor.fetchone()
+        
+        if row is None:
+            cursor.execute(spec['ddl'].format(name=table))
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT")
+        elif row[0] == 'r':
+            self._migrate_to_partitioned(cursor, table)
+        
+        today = date.today().replace(day=1)
+        for offset in range(self.PARTITION_MONTHS_AHEAD + 1):
+            self.ensure_partition(cursor, table, _add_months(today, offset))
+    
+    def _migrate_to_partitioned(self, cursor, table):
+        """Copia uma tabela antiga (não particionada) para a estrutura particionada
+        
+        As FKs que apontavam para a tabela antiga (repasses/prosoluto -> vendas,
+        valores_reservas -> reservas) são removidas junto com ela: tabelas
+        particionadas não têm unicidade só em cvcrm_id para serem referenciadas.
+        """
+        spec = self.PARTITIONED_TABLES[table]
+        key = spec['key']
+        staging = f"{table}_particionada"
+        logging.info(f"Migrando {table} para particionamento mensal por {key}...")
+        
+        cursor.execute(spec['ddl'].format(name=staging))
+        cursor.execute(f"CREATE TABLE {table}_default PARTITION OF {staging} DEFAULT")
+        cursor.execute(f"SELECT DISTINCT DATE_TRUNC('month', {key})::date FROM {table} WHERE {key} IS NOT NULL")
+        for (month,) in cursor.fetchall():
+            self.ensure_partition(cursor, table, month, parent=staging)
+        
+        cursor.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = %s
+            INTERSECT
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = %s
+        """, (table, staging))
+        columns = ', '.join(row[0] for row in cursor.fetchall())
+        cursor.execute(f"INSERT INTO {staging} ({columns}) SELECT {columns} FROM {table}")
+        
+        cursor.execute(f"DROP TABLE {table} CASCADE")
+        cursor.execute(f"ALTER TABLE {staging} RENAME TO {table}")
+        cursor.execute(f"ALTER SEQUENCE {staging}_id_seq RENAME TO {table}_id_seq")
+        cursor.execute(f"SELECT setval('{table}_id_seq', COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)")
+    
+    def ensure_partition(self, cursor, table, month, parent=None):
+        """Garante a partição mensal de `month`, movendo linhas que estejam na DEFAULT
+        
+        O nome só entra no cache (sem ir ao banco nas próximas páginas) depois
+        do commit da transação de `cursor` (PartitionTrackingConnection).
+        """
+        name = f"{table}_p{month:%Y_%m}"
+        if name in self._known_partitions:
+            return
+        
+        parent = parent or table
+        key = self.PARTITIONED_TABLES[table]['key']
+        upper = _add_months(month, 1)
+        
+        # Serializa a criação entre processos/threads que carregam o mesmo mês
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (name,))
+        cursor.execute("SELECT to_regclass(%s)", (name,))
+        if cursor.fetchone()[0] is None:
+            cursor.execute(f"CREATE TABLE {name} (LIKE {parent} INCLUDING DEFAULTS)")
+            cursor.execute(f"""
+                WITH movidas AS (
+                    DELETE FROM {table}_default WHERE {key} >= %s AND {key} < %s RETURNING *
+                )
+                INSERT INTO {name} SELECT * FROM movidas
+            """, (month, upper))
+            cursor.execute(f"ALTER TABLE {parent} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)",
+                           (month, upper))
+        
+        partitions = getattr(cursor.connection, 'partitions', None)
+        if partitions is not None:
+            partitions.add(name)
+    
+    def ensure_partitions(self, table, months):
+        """Cria as partições mensais de `months` numa transação própria, já confirmada
+        
+        Usado antes da transação de carga nas cargas paralelas: a DDL não fica
+        dentro de uma transação que também grava na tabela (ATTACH e a DEFAULT
+        disputando locks entre threads geram deadlocks).
+        """
+        missing = sorted(month for month in months if f"{table}_p{month:%Y_%m}" not in self._known_partitions)
+        if not missing:
+            return
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                # Uma transação de DDL por tabela de cada vez: duas intercaladas
+                # (ATTACH de um mês, lock do mês seguinte) travam uma à outra
+                cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f"particoes:{table}",))
+                for month in missing:
+                    self.ensure_partition(cursor, table, month)
+            conn.commit()
+    
+    def partition_months(self, table, records):
+        """Meses (chave de partição) presentes nos registros; vazio se `table` não é particionada"""
+        spec = self.PARTITIONED_TABLES.get(table)
+        if spec is None:
+            return set()
+        return {_month_of(r.get(spec['key'])) for r in records} - {None}
+    
+    def _columns(self, cursor, table):
+        """Colunas de `table`, na ordem da tabela"""
+        cursor.execute("""
+            SELECT attname FROM pg_attribute
+            WHERE attrelid = to_regclass(%s) AND attnum > 0 AND NOT attisdropped
+            ORDER BY attnum
+        """, (table,))
+        return [row[0] for row in cursor.fetchall()]
+    
+    def prepare_partitioned_load(self, cursor, table, records):
+        """Prepara a carga de uma página em tabela particionada
+        
+        Cria as partições dos meses presentes na página e move para a data
+        nova as versões de registros cuja data (chave de partição) mudou: o
+        upsert por (cvcrm_id, data) não as encontraria e o registro ficaria
+        duplicado. A linha movida leva todas as colunas (comissão, excluido_em,
+        ...), então o upsert só troca o que a página traz.
+        
+        Retorna as linhas movidas, {cvcrm_id: (data antiga, data nova)}, para
+        `undo_partition_moves` se o registro novo não gravar.
+        """
+        spec = self.PARTITIONED_TABLES.get(table)
+        if spec is None or not records:
+            return {}
+        
+        key = spec['key']
+        for month in self.partition_months(table, records):
+            self.ensure_partition(cursor, table, month)
+        
+        columns = self._columns(cursor, table)
+        moved = ', '.join(f"n.chave::{spec['type']}" if c == key else f"m.{c}" for c in columns)
+        rows = execute_values(cursor, f"""
+            WITH n(cvcrm_id, chave) AS (VALUES %s),
+            m AS (
+                DELETE FROM {table} t
+                USING n
+                WHERE t.cvcrm_id = n.cvcrm_id
+                AND t.{key} IS DISTINCT FROM n.chave::{spec['type']}
+                RETURNING t.*
+            ),
+            i AS (
+                INSERT INTO {table} ({', '.join(columns)})
+                SELECT DISTINCT ON (m.cvcrm_id) {moved}
+                FROM m JOIN n ON n.cvcrm_id = m.cvcrm_id
+                ORDER BY m.cvcrm_id, m.updated_at DESC NULLS LAST
+                ON CONFLICT (cvcrm_id, {key}) DO NOTHING
+                RETURNING cvcrm_id, {key}
+            )
+            SELECT DISTINCT ON (m.cvcrm_id) m.cvcrm_id, m.{key}, i.{key}
+            FROM m JOIN i ON i.cvcrm_id = m.cvcrm_id
+            ORDER BY m.cvcrm_id, m.updated_at DESC NULLS LAST
+        """, [(r.get('id'), r.get(key) or None) for r in records], fetch=True)
+        return {cvcrm_id: (old, new) for cvcrm_id, old, new in rows}
+    
+    def undo_partition_moves(self, cursor, table, moves, ids):
+        """Devolve à data antiga as linhas movidas cujo registro novo não gravou
+        
+        Um registro da página que foi para a quarentena deixaria a versão
+        anterior com a data nova e o conteúdo antigo; ela volta a ser a linha
+        de antes da página. `moves`: retorno de prepare_partitioned_load.
+        """
+        back = [(cvcrm_id, *moves[cvcrm_id]) for cvcrm_id in ids if cvcrm_id in moves]
+        if not back:
+            return
+        spec = self.PARTITIONED_TABLES[table]
+        key = spec['key']
+        execute_values(cursor, f"""
+            UPDATE {table} t SET {key} = v.antiga::{spec['type']}
+            FROM (VALUES %s) v(cvcrm_id, antiga, nova)
+            WHERE t.cvcrm_id = v.cvcrm_id
+            AND t.{key} IS NOT DISTINCT FROM v.nova::{spec['type']}
+        """, back)
+        logging.info(f"{table}: {len(back)} registros em quarentena mantidos na data anterior")
+    
+    def detach_old_partitions(self, months_to_keep):
+        """Desanexa partições mais antigas que `months_to_keep` meses (arquivamento)
+        
+        As partições desanexadas continuam no banco como tabelas comuns, prontas
+        para pg_dump/DROP, e deixam de ser lidas pelas views e pelo dashboard.
+        """
+        cutoff = _add_months(date.today().replace(day=1), -months_to_keep)
+        detached = []
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                for table in self.PARTITIONED_TABLES:
+                    cursor.execute("""
+                        SELECT c.relname FROM pg_inherits i
+                        JOIN pg_class c ON c.oid = i.inhrelid
+                        WHERE i.inhparent = to_regclass(%s)
+                        ORDER BY c.relname
+                    """, (table,))
+                    for (name,) in cursor.fetchall():
+                        month = _month_of(name[len(table) + 2:].replace('_', '-'))
+                        if name.startswith(f"{table}_p") and month and month < cutoff:
+                            cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+                            if table == 'vendas':
+                                cursor.execute("DELETE FROM vendas_cubo WHERE mes = %s", (month,))
+                            self._known_partitions.discard(name)
+                            detached.append(name)
+            conn.commit()
+        
+        logging.info(f"Partições desanexadas: {', '.join(detached) or 'nenhuma'}")
+        return detached
+
+    # Chave de célula do cubo a partir de uma linha de vendas
+    CUBE_KEY_COLUMNS = "DATE_TRUNC('month', data_venda)::date, empreendimento, time_corretor, corretor"
+    
+    def _cube_staging(self, cursor):
+        """Tabela temporária (por transação) com as células do cubo a recalcular"""
+        cursor.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS tmp_cubo_chaves (
+                mes DATE,
+                empreendimento VARCHAR(255),
+                time_corretor VARCHAR(100),
+                corretor VARCHAR(255)
+            ) ON COMMIT DELETE ROWS
+        """)
+    
+    def mark_cube_dirty(self, cursor, cvcrm_ids):
+        """Marca as células do cubo onde as vendas `cvcrm_ids` estão hoje
+        
+        Chamado antes da carga (células das versões antigas) e depois dela
+        (células das versões novas); refresh_cube recalcula as marcadas.
+        """
+        self._cube_staging(cursor)
+        cursor.execute(f"""
+            INSERT INTO tmp_cubo_chaves
+            SELECT DISTINCT {self.CUBE_KEY_COLUMNS}
+            FROM vendas
+            WHERE cvcrm_id = ANY(%s) AND ativo = 'S' AND data_venda IS NOT NULL
+        """, (list(cvcrm_ids),))
+    
+    def refresh_cube(self, cursor):
+        """Recalcula a partir de vendas apenas as células marcadas como alteradas
+        
+        Um lock por mês (em ordem) serializa recálculos concorrentes (backfill
+        paralelo): quem recalcula depois já enxerga as vendas de quem commitou antes.
+        """
+        self._cube_staging(cursor)
+        cursor.execute("""
+            SELECT pg_advisory_xact_lock(hashtext('vendas_cubo:' || mes))
+            FROM (SELECT DISTINCT mes FROM tmp_cubo_chaves ORDER BY mes) m
+        """)
+        cursor.execute("""
+            DELETE FROM vendas_cubo c
+            USING (SELECT DISTINCT * FROM tmp_cubo_chaves) k
+            WHERE c.mes = k.mes
+            AND c.empreendimento IS NOT DISTINCT FROM k.empreendimento
+            AND c.time_corretor IS NOT DISTINCT FROM k.time_corretor
+            AND c.corretor IS NOT DISTINCT FROM k.corretor
+        """)
+        cursor.execute("""
+            INSERT INTO vendas_cubo (mes, empreendimento, time_corretor, corretor, quantidade_vendas,
+                                     valor_total, vgv_total, comissao_total, quantidade_comissoes)
+            SELECT k.mes, k.empreendimento, k.time_corretor, k.corretor, COUNT(*),
+                   SUM(v.valor), SUM(v.vgv), SUM(v.comissao_valor), COUNT(v.comissao_valor)
+            FROM (SELECT DISTINCT * FROM tmp_cubo_chaves) k
+            JOIN vendas v
+                ON v.data_venda >= k.mes AND v.data_venda < (k.mes + INTERVAL '1 month')::date
+                AND v.empreendimento IS NOT DISTINCT FROM k.empreendimento
+                AND v.time_corretor IS NOT DISTINCT FROM k.time_corretor
+                AND v.corretor IS NOT DISTINCT FROM k.corretor
+            WHERE v.ativo = 'S'
+            GROUP BY k.mes, k.empreendimento, k.time_corretor, k.corretor
+        """)
+        cells = cursor.rowcount
+        cursor.execute("DELETE FROM tmp_cubo_chaves")
+        return cells
+    
+    def rebuild_cube(self, cursor):
+        """Reconstrói o cubo inteiro a partir de vendas (carga inicial / cargas fora do ETL)"""
+        cursor.execute("DELETE FROM vendas_cubo")
+        cursor.execute(f"""
+            INSERT INTO vendas_cubo (mes, empreendimento, time_corretor, corretor, quantidade_vendas,
+                                     valor_total, vgv_total, comissao_total, quantidade_comissoes)
+            SELECT {self.CUBE_KEY_COLUMNS}, COUNT(*),
+                   SUM(valor), SUM(vgv), SUM(comissao_valor), COUNT(comissao_valor)
+            FROM vendas
+            WHERE ativo = 'S' AND data_venda IS NOT NULL
+            GROUP BY {self.CUBE_KEY_COLUMNS}
+        """)
+        logging.info(f"Cubo de vendas reconstruído: {cursor.rowcount} células")
+        return cursor.rowcount
+
+    def start_sync_run(self, mode):
+        """Registra o início de uma execução no etl_sync_runs e retorna seu id"""
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("INSERT INTO etl_sync_runs (modo) VALUES (%s) RETURNING id", (mode,))
+                run_id = cursor.fetchone()[0]
+            conn.commit()
+        return run_id
+    
+    def finish_sync_run(self, run_id, status, records=None, error=None, circuit=None):
+        """Fecha uma execução; com status 'sucesso' ela passa a ser a geração atual
+        
+        `circuit`: estado dos disjuntores da API ao fim da execução.
+        """
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    UPDATE etl_sync_runs
+                    SET status = %s, finalizado_em = CURRENT_TIMESTAMP, registros = %s, erro = %s, circuito = %s
+                    WHERE id = %s
+                """, (status, json.dumps(records) if records is not None else None, error,
+                      json.dumps(circuit) if circuit is not None else None, run_id))
+            conn.commit()
+    
+    def save_circuit_state(self, worker, state):
+        """Grava o estado dos disjuntores deste processo (exibido no /health)"""
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO etl_circuito (worker, estado, atualizado_em)
+                    VALUES (%s, %s, CURRENT_TIMESTAMP)
+                    ON CONFLICT (worker) DO UPDATE SET estado = EXCLUDED.estado, atualizado_em = CURRENT_TIMESTAMP
+                """, (worker, json.dumps(state)))
+            conn.commit()
+    
+    def iter_ids(self, table, batch_size=50000):
+        """Lotes de (cvcrm_id, já marcado como excluído) da tabela, lidos com cursor no servidor"""
+        with self.get_connection() as conn:
+            with conn.cursor(name=f'ids_{table}') as cursor:
+                cursor.itersize = batch_size
+                cursor.execute(f"SELECT cvcrm_id, excluido_em IS NOT NULL FROM {table}")
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        return
+                    yield rows
+    
+    def apply_tombstones(self, table, deleted, restored, batch_size=10000):
+        """Marca `deleted` como excluídos e desfaz a marca de `restored`, em lotes
+        
+        `deleted` e `restored` são arrays NumPy de ids: só o lote em gravação
+        vira lista Python. Em `vendas` a marca também muda ativo (sai das views
+        e do cubo).
+        """
+        sales = table == 'vendas'
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                for start in range(0, len(deleted), batch_size):
+                    ids = deleted[start:start + batch_size].tolist()
+                    if sales:
+                        self.mark_cube_dirty(cursor, ids)
+                    cursor.execute(f"""
+                        UPDATE {table}
+                        SET excluido_em = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                            {", ativo = 'N'" if sales else ''}
+                        WHERE cvcrm_id = ANY(%s) AND excluido_em IS NULL
+                    """, (ids,))
+                for start in range(0, len(restored), batch_size):
+                    ids = restored[start:start + batch_size].tolist()
+                    cursor.execute(f"""
+                        UPDATE {table}
+                        SET excluido_em = NULL, updated_at = CURRENT_TIMESTAMP
+                            {", ativo = 'S'" if sales else ''}
+                        WHERE cvcrm_id = ANY(%s)
+                    """, (ids,))
+                    if sales:
+                        self.mark_cube_dirty(cursor, ids)
+                if sales:
+                    self.refresh_cube(cursor)
+            conn.commit()
+    
+    def quarantine_keys(self, cursor, table):
+        """Chaves dos registros de `table` em quarentena"""
+        cursor.execute("SELECT chave FROM etl_quarentena WHERE tabela = %s", (table,))
+        return {row[0] for row in cursor.fetchall()}
+    
+    def quarantine_records(self, cursor, table, entries, attempt=False):
+        """Grava ou atualiza registros em quarentena: {chave: (cvcrm_id, registro, motivo)}
+        
+        `attempt`: falha de uma nova tentativa (soma em `tentativas`); a mesma
+        chave rejeitada de novo numa página só atualiza o payload e o motivo.
+        """
+        execute_values(cursor, f"""
+            INSERT INTO etl_quarentena (tabela, chave, cvcrm_id, registro, motivo)
+            VALUES %s
+            ON CONFLICT (tabela, chave) DO UPDATE SET
+                cvcrm_id = EXCLUDED.cvcrm_id,
+                registro = EXCLUDED.registro,
+                motivo = EXCLUDED.motivo,
+                tentativas = etl_quarentena.tentativas + {1 if attempt else 0},
+                atualizado_em = CURRENT_TIMESTAMP
+        """, [(table, key, cvcrm_id, json.dumps(record, default=str), reason)
+              for key, (cvcrm_id, record, reason) in entries.items()])
+    
+    def release_quarantine(self, cursor, table, keys):
+        cursor.execute("DELETE FROM etl_quarentena WHERE tabela = %s AND chave = ANY(%s)", (table, list(keys)))
+    
+    def load_quarantine(self, table, max_attempts, limit=1000):
+        """Registros originais em quarentena com menos de `max_attempts` tentativas, mais antigos primeiro"""
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT registro FROM etl_quarentena
+                    WHERE tabela = %s AND tentativas < %s
+                    ORDER BY atualizado_em
+                    LIMIT %s
+                """, (table, max_attempts, limit))
+                return [row[0] for row in cursor.fetchall()]
+    
+    def load_backfill_checkpoints(self):
+        """Checkpoints do backfill indexados por (endpoint, janela_inicio, janela_fim)"""
+        with self.get_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute("SELECT * FROM etl_backfill_janelas")
+                return {(row['endpoint'], row['janela_inicio'], row['janela_fim']): row
+                        for row in cursor.fetchall()}
+    
+    def save_backfill_checkpoint(self, cursor, endpoint, window_start, window_end, page, per_page, records, status):
+        """Grava o checkpoint da janela na transação corrente (junto com os dados)"""
+        cursor.execute("""
+            INSERT INTO etl_backfill_janelas (endpoint, janela_inicio, janela_fim, ultima_pagina,
+                                              registros_por_pagina, registros, status, atualizado_em)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+            ON CONFLICT (endpoint, janela_inicio, janela_fim) DO UPDATE SET
+                ultima_pagina = EXCLUDED.ultima_pagina,
+                registros_por_pagina = EXCLUDED.registros_por_pagina,
+                registros = EXCLUDED.registros,
+                status = EXCLUDED.status,
+                atualizado_em = CURRENT_TIMESTAMP
+        """, (endpoint, window_start, window_end, page, per_page, records, status))
+    
+    def load_page_sizes(self):
+        """Tamanhos de página salvos: {endpoint: (tamanho, maior confirmado)}"""
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT endpoint, registros_por_pagina, maior_confirmado FROM etl_page_sizes")
+                return {endpoint: (size, confirmed) for endpoint, size, confirmed in cursor.fetchall()}
+    
+    def save_page_sizes(self, sizes):
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                execute_batch(cursor, """
+                    INSERT INTO etl_page_sizes (endpoint, registros_por_pagina, maior_confirmado, atualizado_em)
+                    VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
+                    ON CONFLICT (endpoint) DO UPDATE SET
+                        registros_por_pagina = EXCLUDED.registros_por_pagina,
+                        maior_confirmado = EXCLUDED.maior_confirmado,
+                        atualizado_em = CURRENT_TIMESTAMP
+                """, [(endpoint, size, confirmed) for endpoint, (size, confirmed) in sizes.items()])
+            conn.commit()
+    
+    def load_sync_schedule(self):
+        """Estado salvo da agenda adaptativa: {tarefa: linha de etl_agenda}"""
+        with self.get_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute("SELECT * FROM etl_agenda")
+                return {row['tarefa']: dict(row) for row in cursor.fetchall()}
+    
+    def save_sync_schedule(self, state):
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                execute_batch(cursor, """
+                    INSERT INTO etl_agenda (tarefa, intervalo_minutos, taxa_mudanca, custo_requisicoes, digest,
+                                            execucoes, mudancas, ultima_execucao, ultima_mudanca, atualizado_em)
+                    VALUES (%(tarefa)s, %(intervalo_minutos)s, %(taxa_mudanca)s, %(custo_requisicoes)s, %(digest)s,
+                            %(execucoes)s, %(mudancas)s, %(ultima_execucao)s, %(ultima_mudanca)s, CURRENT_TIMESTAMP)
+                    ON CONFLICT (tarefa) DO UPDATE SET
+                        intervalo_minutos = EXCLUDED.intervalo_minutos,
+                        taxa_mudanca = EXCLUDED.taxa_mudanca,
+                        custo_requisicoes = EXCLUDED.custo_requisicoes,
+                        digest = EXCLUDED.digest,
+                        execucoes = EXCLUDED.execucoes,
+                        mudancas = EXCLUDED.mudancas,
+                        ultima_execucao = EXCLUDED.ultima_execucao,
+                        ultima_mudanca = EXCLUDED.ultima_mudanca,
+                        atualizado_em = CURRENT_TIMESTAMP
+                """, list(state.values()))
+            conn.commit()
+    
+    def requests_used(self, day):
+        """Requisições à API já consumidas no dia"""
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT requisicoes FROM etl_agenda_consumo WHERE dia = %s", (day,))
+                row = cursor.fetchone()
+                return row[0] if row else 0
+    
+    def add_requests_used(self, day, requests):
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO etl_agenda_consumo (dia, requisicoes) VALUES (%s, %s)
+                    ON CONFLICT (dia) DO UPDATE SET requisicoes = etl_agenda_consumo.requisicoes + EXCLUDED.requisicoes
+                """, (day, requests))
+            conn.commit()
+    
+    def reserve_request_slot(self, key, min_interval):
+        """Reserva o próximo horário livre de requisição; retorna a espera em segundos"""
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO etl_rate_limit (chave, proximo_slot)
+                    VALUES (%s, clock_timestamp() + make_interval(secs => %s))
+                    ON CONFLICT (chave) DO UPDATE SET proximo_slot =
+                        GREATEST(etl_rate_limit.proximo_slot, clock_timestamp()) + make_interval(secs => %s)
+                    RETURNING EXTRACT(EPOCH FROM proximo_slot - clock_timestamp())::float - %s
+                """, (key, min_interval, min_interval, min_interval))
+                delay = cursor.fetchone()[0]
+            conn.commit()
+        return delay
+    
     def should_run_sync(self):
         """Verifica se deve executar sync (horário comercial para economizar recursos)"""
         if os.getenv('RAILWAY_ENVIRONMENT') == 'production':
@@ -539,196 +2248,1450 @@ class CloudDatabaseManager:
             return 6 <= now.hour <= 22
         return True  # Sempre roda em desenvolvimento
 
+# Esquema de cada destino: colunas esperadas (parâmetros das queries) e tipo.
+# Tipos: int, decimal, date, timestamp, flag ('S'/'N') e str.
+RECORD_SCHEMAS = {
+    'empreendimentos': {
+        'id': 'int', 'nome': 'str', 'endereco': 'str', 'cidade': 'str', 'estado': 'str',
+        'cep': 'str', 'status': 'str', 'vgv': 'decimal', 'data_lancamento': 'date',
+        'created_at': 'timestamp'
+    },
+    'unidades': {
+        'id': 'int', 'empreendimento_id': 'int', 'numero': 'str', 'bloco': 'str', 'andar': 'int',
+        'tipologia_id': 'int', 'area_privativa': 'decimal', 'area_total': 'decimal',
+        'valor_tabela': 'decimal', 'valor_venda': 'decimal', 'status': 'str', 'created_at': 'timestamp'
+    },
+    'vendas': {
+        'id': 'int', 'reserva_id': 'int', 'empreendimento': 'str', 'unidade_id': 'int',
+        'corretor': 'str', 'time_corretor': 'str', 'cliente': 'str', 'valor': 'decimal',
+        'data_venda': 'date', 'ativo': 'flag', 'created_at': 'timestamp'
+    },
+    'reservas': {
+        'id': 'int', 'empreendimento_id': 'int', 'unidade_id': 'int', 'corretor_id': 'int',
+        'corretor_nome': 'str', 'cliente_nome': 'str', 'data_reserva': 'date',
+        'data_vencimento': 'date', 'status': 'str', 'created_at': 'timestamp'
+    },
+    'atendimentos': {
+        'id': 'int', 'corretor_id': 'int', 'corretor_nome': 'str', 'grupo_corretor': 'str',
+        'time_corretor': 'str', 'cliente_nome': 'str', 'cliente_email': 'str',
+        'cliente_telefone': 'str', 'empreendimento_id': 'int', 'data_atendimento': 'timestamp',
+        'tipo_atendimento': 'str', 'status': 'str', 'created_at': 'timestamp'
+    },
+    'repasses': {
+        'id': 'int', 'venda_id': 'int', 'corretor_id': 'int', 'corretor_nome': 'str',
+        'valor_repasse': 'decimal', 'percentual_repasse': 'decimal', 'data_repasse': 'date',
+        'data_pagamento': 'date', 'status': 'str', 'observacoes': 'str', 'created_at': 'timestamp'
+    },
+    'prosoluto': {
+        'id': 'int', 'venda_id': 'int', 'empreendimento_id': 'int', 'corretor_id': 'int',
+        'valor_prosoluto': 'decimal', 'percentual_prosoluto': 'decimal', 'data_calculo': 'date',
+        'data_pagamento': 'date', 'status': 'str', 'created_at': 'timestamp'
+    },
+    'comissoes': {
+        'reserva_id': 'int', 'venda_id': 'int', 'valor_comissao': 'decimal'
+    }
+}
+
+# Destinos (esquemas de RECORD_SCHEMAS) de cada endpoint do sync
+ENDPOINT_TABLES = {
+    'empreendimentos': ('empreendimentos',),
+    'unidades': ('unidades',),
+    'reservas': ('vendas', 'reservas'),
+    'comissoes': ('comissoes',),
+    'prosoluto': ('prosoluto',),
+    'atendimentos': ('atendimentos',),
+    'repasses': ('repasses',)
+}
+
+# Tabelas com cvcrm_id conciliadas pelo conjunto de ids da API (coluna excluido_em)
+TOMBSTONE_TABLES = tuple(table for tables in ENDPOINT_TABLES.values() for table in tables
+                         if 'id' in RECORD_SCHEMAS[table])
+
+# Endpoints do sync que aceitam o filtro a_partir_data_referencia
+DATE_FILTER_ENDPOINTS = ('reservas', 'comissoes', 'prosoluto', 'atendimentos', 'repasses')
+
+class PageTransformer:
+    """Transformação e validação vetorizada (pandas) de uma página da API
+    
+    A página vira um DataFrame com exatamente as colunas do esquema do destino
+    (colunas ausentes entram como nulas), cada coluna é convertida para o seu
+    tipo de uma vez, e valores que não convertem viram NULL com aviso no log,
+    em vez de derrubar a página inteira no execute. Valores monetários
+    (decimal) viram Decimal exato, como a API os mandou. Linhas sem `id`
+    válido são descartadas. Para `vendas` aplica o filtro de venda confirmada
+    (ativo='S' com data_venda); uma venda ativa com data_venda que não
+    converte é rejeitada (quarentena), não filtrada em silêncio.
+    """
+    
+    FLAG_VALUES = {
+        'S': 'S', 'SIM': 'S', 'Y': 'S', 'TRUE': 'S', '1': 'S',
+        'N': 'N', 'NAO': 'N', 'NÃO': 'N', 'FALSE': 'N', '0': 'N'
+    }
+    
+    # Formatos de data aceitos além do ISO 8601 (telas e exportações do CVCRM usam dd/mm/aaaa)
+    DATE_FORMATS = ('%d/%m/%Y', '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M')
+    
+    def __init__(self, schemas=None):
+        self.schemas = schemas or RECORD_SCHEMAS
+    
+    def frame(self, table, records, rejected=None):
+        """DataFrame tipado da página para o destino `table`
+        
+        O índice do DataFrame é a posição do registro na página. Se `rejected`
+        for uma lista, recebe (posição, motivo) das linhas descartadas na
+        validação (sem id válido, venda com data_venda inválida).
+        """
+        import pandas as pd
+        
+        schema = self.schemas[table]
+        raw = pd.DataFrame(records, columns=list(schema), dtype=object)
+        columns = {}
+        
+        for column, kind in schema.items():
+            columns[column] = self._coerce(raw[column], kind)
+            if kind == 'str':
+                continue
+            failed = raw[column][columns[column].isna() & raw[column].notna()]
+            failed = failed[failed.astype(str).str.strip() != ''] if len(failed) else failed
+            if len(failed):
+                logging.warning(f"{table}: {len(failed)} valores inválidos em {column} "
+                                f"(gravados como NULL, ex.: {failed.iloc[0]!r})")
+        
+        df = pd.DataFrame(columns, index=raw.index)
+        if 'id' in schema:
+            missing_id = df['id'].isna()
+            if missing_id.any():
+                logging.warning(f"{table}: {int(missing_id.sum())} registros sem id válido descartados")
+                if rejected is not None:
+                    rejected.extend((i, 'sem id válido') for i in df.index[missing_id])
+                df = df[~missing_id]
+        
+        if table == 'vendas':
+            active = df['ativo'] == 'S'
+            text = raw['data_venda'].reindex(df.index)
+            bad_date = active & df['data_venda'].isna() & text.notna() & (text.astype(str).str.strip() != '')
+            if bad_date.any() and rejected is not None:
+                rejected.extend((i, f"data_venda inválida: {text[i]!r}") for i in df.index[bad_date])
+            df = df[active & df['data_venda'].notna()]
+        return df
+    
+    def records(self, table, records):
+        """Página transformada como lista de dicts (None para nulos) para as queries"""
+        return self._rows(self.frame(table, records))
+    
+    def split(self, table, records):
+        """Página transformada para a carga com quarentena
+        
+        Retorna (linhas, registro original de cada linha, rejeitados), onde
+        rejeitados são (registro original, motivo, None) das linhas descartadas
+        na validação. Registros fora do filtro de `vendas` não são rejeitados.
+        """
+        rejected = []
+        df = self.frame(table, records, rejected)
+        return (self._rows(df), [records[i] for i in df.index],
+                [(records[i], reason, None) for i, reason in rejected])
+    
+    def _rows(self, df):
+        names = list(df.columns)
+        return [dict(zip(names, row)) for row in df.astype(object).where(df.notna(), None).values.tolist()]
+    
+    def _coerce(self, column, kind):
+        """Converte uma coluna inteira para o tipo do esquema
+        
+        A conversão direta cobre a coluna toda de uma vez; só as células que
+        falharem passam pela limpeza de texto (espaços, caixa, vírgula decimal,
+        datas dd/mm/aaaa). Decimais são convertidos célula a célula para
+        Decimal: float64 arredondaria os centavos.
+        """
+        import pandas as pd
+        
+        if kind == 'str':
+            return column.where(column.isna(), column.astype(str))
+        if kind == 'decimal':
+            return column.map(self._decimal, na_action='ignore').astype(object)
+        
+        if kind == 'flag':
+            values = column.map(self.FLAG_VALUES)
+        elif kind in ('date', 'timestamp'):
+            values = pd.to_datetime(column, errors='coerce', format='ISO8601')
+        else:
+            values = pd.to_numeric(column, errors='coerce').astype('float64')
+        
+        retry = values.isna() & column.notna()
+        if retry.any():
+            text = column[retry].astype(str).str.strip()
+            if kind == 'flag':
+                values[retry] = text.str.upper().map(self.FLAG_VALUES)
+            elif kind in ('date', 'timestamp'):
+                parsed = pd.to_datetime(text, errors='coerce', format='ISO8601')
+                for date_format in self.DATE_FORMATS:
+                    missing = parsed.isna()
+                    if not missing.any():
+                        break
+                    parsed[missing] = pd.to_datetime(text[missing], errors='coerce', format=date_format)
+                values[retry] = parsed
+            else:
+                # Formato brasileiro (1.234,56)
+                text = text.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+                values[retry] = pd.to_numeric(text, errors='coerce')
+        
+        if kind == 'date':
+            return values.dt.date.where(values.notna(), None)
+        if kind == 'int':
+            return values.where(values % 1 == 0).astype('Int64')
+        return values
+    
+    @staticmethod
+    def _decimal(value):
+        """Decimal exato de um número ou texto da API (também 1.234,56); None se inválido"""
+        if isinstance(value, bool):
+            return None
+        text = str(value).strip()
+        if ',' in text:
+            text = text.replace('.', '').replace(',', '.')
+        try:
+            number = Decimal(text)
+        except InvalidOperation:
+            return None
+        return number if number.is_finite() else None
+
+class PageSink:
+    """Destino de uma página de registros da API (tabela + transformação + limite)
+    
+    Usado pelo fan-out de endpoints compartilhados: a mesma página é entregue
+    a vários destinos, cada um com sua transformação/filtro (PageTransformer,
+    pelo esquema de `name`) e seu limite de registros. Registros inválidos
+    vão para a quarentena (RowQuarantine) sem impedir a carga do resto. Se o
+    `before_load` devolver uma função, ela é chamada com os ids que foram para
+    a quarentena, para desfazer o que o hook preparou para eles.
+    """
+    
+    def __init__(self, name, insert_query, transformer, quarantine, limit=None, before_load=None, after_load=None):
+        self.name = name
+        self.insert_query = insert_query
+        self.transformer = transformer
+        self.quarantine = quarantine
+        # Carga de registros que já estavam em quarentena (nova tentativa)
+        self.retry = False
+        self.limit = limit
+        self.before_load = before_load
+        self.after_load = after_load
+        self.total = 0
+        self.error = None
+    
+    @property
+    def saturated(self):
+        """Destino não aceita mais registros (limite atingido ou erro)"""
+        return self.error is not None or (self.limit is not None and self.total >= self.limit)
+    
+    def load(self, cursor, records):
+        """Grava os registros da página aceitos por este destino"""
+        if self.saturated:
+            return 0
+        
+        selected, raw, rejected = self.transformer.split(self.name, records)
+        if rejected:
+            self.quarantine.reject(cursor, self.name, rejected, self.retry)
+        undo = self.before_load(cursor, selected) if self.before_load is not None else None
+        loaded = self.quarantine.load(cursor, self.name, self.insert_query, selected, raw, self.retry)
+        if undo is not None and len(loaded) < len(selected):
+            kept = {row.get('id') for row in loaded}
+            undo(cursor, [row.get('id') for row in selected if row.get('id') not in kept])
+        if self.after_load is not None:
+            self.after_load(cursor, loaded)
+        
+        self.total += len(loaded)
+        return len(loaded)
+
+class RowQuarantine:
+    """Carga em lote com isolamento de registros inválidos (etl_quarentena)
+    
+    A página é gravada num único execute_batch dentro de um savepoint. Se um
+    erro de dados (tipo, tamanho, chave estrangeira, NOT NULL) derrubar o
+    lote, ele é dividido ao meio e cada metade é tentada de novo, até isolar
+    os registros com erro: com k registros ruins em n são O(k log n) lotes,
+    não n inserts. Os isolados vão para a quarentena com o payload original e
+    o motivo, na mesma transação da página, e são tentados de novo nas
+    próximas execuções. Um registro que depois grava normalmente sai da
+    quarentena.
+    """
+    
+    def __init__(self, db, max_attempts=None):
+        self.db = db
+        self.max_attempts = max_attempts or int(os.getenv('ETL_QUARENTENA_TENTATIVAS', '5'))
+        # Chaves em quarentena por tabela (carregadas na primeira carga da tabela)
+        self._keys = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def key(record, cvcrm_id=None):
+        """Chave do registro na quarentena: o id, ou o hash do payload se não houver id"""
+        if cvcrm_id is not None:
+            return str(cvcrm_id)
+        encoded = json.dumps(record, sort_keys=True, default=str).encode()
+        return 'md5:' + hashlib.md5(encoded).hexdigest()
+    
+    def load(self, cursor, table, query, rows, raw, attempt=False):
+        """Grava `rows` em lote isolando os que falham; retorna as linhas gravadas"""
+        loaded, rejected = [], []
+        self._bisect(cursor, query, rows, raw, loaded, rejected)
+        if rejected:
+            self.reject(cursor, table, rejected, attempt)
+        self._release(cursor, table, loaded)
+        return loaded
+    
+    def _bisect(self, cursor, query, rows, raw, loaded, rejected):
+        if not rows:
+            return
+        cursor.execute("SAVEPOINT quarentena")
+        try:
+            execute_batch(cursor, query, rows)
+        except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT quarentena")
+            cursor.execute("RELEASE SAVEPOINT quarentena")
+            if len(rows) == 1:
+                rejected.append((raw[0], str(e).strip(), rows[0].get('id')))
+                return
+            middle = len(rows) // 2
+            self._bisect(cursor, query, rows[:middle], raw[:middle], loaded, rejected)
+            self._bisect(cursor, query, rows[middle:], raw[middle:], loaded, rejected)
+            return
+        cursor.execute("RELEASE SAVEPOINT quarentena")
+        loaded.extend(rows)
+    
+    def _known(self, cursor, table):
+        with self._lock:
+            keys = self._keys.get(table)
+        if keys is None:
+            keys = self.db.quarantine_keys(cursor, table)
+            with self._lock:
+                keys = self._keys.setdefault(table, keys)
+        return keys
+    
+    def reject(self, cursor, table, entries, attempt=False):
+        """Põe em quarentena [(registro original, motivo, cvcrm_id ou None)]
+        
+        `attempt`: os registros vieram da quarentena (conta mais uma tentativa).
+        """
+        by_key = {}
+        for record, reason, cvcrm_id in entries:
+            by_key[self.key(record, cvcrm_id)] = (cvcrm_id, record, reason)
+        self.db.quarantine_records(cursor, table, by_key, attempt)
+        keys = self._known(cursor, table)
+        with self._lock:
+            keys.update(by_key)
+        logging.warning(f"{table}: {len(by_key)} registros em quarentena "
+                        f"({next(iter(by_key.values()))[2].splitlines()[0]})")
+    
+    def _release(self, cursor, table, rows):
+        """Tira da quarentena os registros que acabaram de gravar"""
+        keys = self._known(cursor, table)
+        with self._lock:
+            released = [self.key(None, row.get('id')) for row in rows if str(row.get('id')) in keys]
+            keys.difference_update(released)
+        if released:
+            self.db.release_quarantine(cursor, table, released)
+    
+    def pending(self, table):
+        """Registros originais em quarentena ainda dentro do limite de tentativas"""
+        return self.db.load_quarantine(table, self.max_attempts)
+
+# Campos de data de referência dos registros CVDW (usados para fechar janelas do backfill).
+# `referencia_data` é o campo que o filtro a_partir_data_referencia compara (é o que o
+# cliente sintético do bench gera); `referencia` e `data_referencia` são variações de
+# nome aceitas sem verificação contra a API real. CVCRM_CAMPOS_REFERENCIA substitui a
+# lista (nomes separados por vírgula). Sem nenhum deles no registro a janela não fecha
+# antes do fim dos dados: o resultado é o mesmo, só com mais requisições (há aviso no log).
+REFERENCE_DATE_FIELDS = tuple(
+    field.strip() for field in
+    os.getenv('CVCRM_CAMPOS_REFERENCIA', 'referencia_data,referencia,data_referencia').split(',')
+    if field.strip()
+)
+
+def _reference_date(record):
+    """Data de referência CVDW do registro, ou None se ausente/inválida"""
+    for field in REFERENCE_DATE_FIELDS:
+        value = record.get(field)
+        if value:
+            text = str(value)
+            try:
+                if text[2:3] == '/':
+                    return datetime.strptime(text[:10], '%d/%m/%Y').date()
+                return date.fromisoformat(text[:10])
+            except ValueError:
+                return None
+    return None
+
+def split_date_windows(date_start, date_end, window_days):
+    """Divide [date_start, date_end) em janelas consecutivas de `window_days` dias"""
+    windows = []
+    current = date_start
+    while current < date_end:
+        window_end = min(current + timedelta(days=window_days), date_end)
+        windows.append((current, window_end))
+        current = window_end
+    return windows
+
+class BackfillProgress:
+    """Progresso e ETA do backfill (atualizado pelas threads das janelas)"""
+    
+    def __init__(self, total_windows):
+        self.total_windows = total_windows
+        self.windows = 0
+        self.pages = 0
+        self.records = 0
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def page_done(self, records):
+        with self._lock:
+            self.pages += 1
+            self.records += records
+    
+    def window_done(self):
+        with self._lock:
+            self.windows += 1
+    
+    def report(self):
+        with self._lock:
+            elapsed = time.monotonic() - self.started
+            percent = self.windows / self.total_windows * 100 if self.total_windows else 100
+            if self.windows:
+                eta = timedelta(seconds=int(elapsed / self.windows * (self.total_windows - self.windows)))
+            else:
+                eta = 'calculando'
+            return (f"Backfill: {self.windows}/{self.total_windows} janelas ({percent:.0f}%), "
+                    f"{self.pages} páginas, {self.records} registros, ETA {eta}")
+
+class SyncTimings:
+    """Tempos por endpoint de um sync dirigido ou bench
+    
+    Medidos em ETLProcessor._pages: busca é o tempo dentro do iterador de
+    páginas do cliente (rate limit e requisição incluídos); processamento é o
+    tempo do consumidor com a página (transformação e, fora do dry-run, carga).
+    """
+    
+    def __init__(self):
+        self.endpoints = {}
+        self.started = time.perf_counter()
+    
+    def _endpoint(self, endpoint):
+        return self.endpoints.setdefault(endpoint, {
+            'paginas': 0, 'registros': 0, 'requisicoes': 0, 'busca': 0.0, 'processamento': 0.0
+        })
+    
+    def fetched(self, endpoint, records, seconds):
+        entry = self._endpoint(endpoint)
+        entry['paginas'] += 1
+        entry['registros'] += records
+        entry['busca'] += seconds
+    
+    def processed(self, endpoint, seconds):
+        self._endpoint(endpoint)['processamento'] += seconds
+    
+    def add_requests(self, endpoint, requests):
+        self._endpoint(endpoint)['requisicoes'] += requests
+    
+    def report(self):
+        """Tabela de tempos por endpoint e total"""
+        lines = [f"{'endpoint':>16} {'páginas':>8} {'registros':>10} {'req':>6} "
+                 f"{'busca':>10} {'processo':>10} {'reg/s':>9}"]
+        for endpoint, entry in self.endpoints.items():
+            seconds = entry['busca'] + entry['processamento']
+            lines.append(f"{endpoint:>16} {entry['paginas']:>8} {entry['registros']:>10} {entry['requisicoes']:>6} "
+                         f"{entry['busca'] * 1000:>8.0f}ms {entry['processamento'] * 1000:>8.0f}ms "
+                         f"{entry['registros'] / seconds if seconds else 0:>9.0f}")
+        records = sum(entry['registros'] for entry in self.endpoints.values())
+        elapsed = time.perf_counter() - self.started
+        lines.append(f"Total: {records} registros em {elapsed:.1f}s ({records / elapsed if elapsed else 0:.0f} reg/s)")
+        return lines
+
+class PageDigest:
+    """Resumo das páginas lidas por uma tarefa, independente da ordem dos registros
+    
+    Soma (módulo 2^64) do hash de cada registro mais a contagem: se a API
+    devolver os mesmos dados em outra ordem o resumo não muda; qualquer
+    registro novo, removido ou alterado muda.
+    """
+    
+    def __init__(self):
+        self.reset()
+    
+    def reset(self):
+        self.count = 0
+        self.total = 0
+    
+    def add(self, records):
+        for record in records:
+            encoded = json.dumps(record, sort_keys=True, default=str).encode()
+            value = int.from_bytes(hashlib.blake2b(encoded, digest_size=8).digest(), 'big')
+            self.total = (self.total + value) % 2 ** 64
+        self.count += len(records)
+    
+    def hexdigest(self):
+        return f"{self.count}:{self.total:016x}"
+
+class IdSet:
+    """Conjunto compacto dos ids (cvcrm_id) listados na API, para a conciliação
+    
+    Os ids chegam página a página (uint32, 4 bytes cada). Ao fechar, o
+    conjunto fica na menor representação: array ordenado (4 bytes por id) ou
+    bitmap do intervalo [menor, maior] (1 bit por id possível). Ids do CVCRM
+    são sequenciais, então milhões de ids cabem em poucas centenas de KB. A
+    pertinência é testada por lote de ids do banco (numpy).
+    """
+    
+    def __init__(self):
+        self._pages = []
+        self._sorted = None
+        self._bitmap = None
+        self._low = 0
+        self.count = 0
+    
+    def add(self, ids):
+        import numpy as np
+        self._pages.append(np.asarray(ids, dtype=np.uint32))
+    
+    def freeze(self):
+        """Fecha o conjunto (ordena, remove repetidos e escolhe a representação)"""
+        import numpy as np
+        ids = np.unique(np.concatenate(self._pages)) if self._pages else np.empty(0, dtype=np.uint32)
+        self._pages = []
+        self.count = len(ids)
+        if self.count and (int(ids[-1]) - int(ids[0])) // 8 + 1 < ids.nbytes:
+            self._low = int(ids[0])
+            offsets = ids - ids[0]
+            self._bitmap = np.zeros(int(offsets[-1]) // 8 + 1, dtype=np.uint8)
+            np.bitwise_or.at(self._bitmap, offsets >> 3, (0x80 >> (offsets & 7)).astype(np.uint8))
+        else:
+            self._sorted = ids
+        return self
+    
+    @property
+    def nbytes(self):
+        return (self._bitmap if self._bitmap is not None else self._sorted).nbytes
+    
+    def contains(self, ids):
+        """Máscara booleana de quais `ids` (lote do banco) estão no conjunto"""
+        import numpy as np
+        ids = np.asarray(ids, dtype=np.int64)
+        if self._bitmap is not None:
+            offsets = ids - self._low
+            inside = (offsets >= 0) & (offsets < len(self._bitmap) * 8)
+            found = np.zeros(len(ids), dtype=bool)
+            valid = offsets[inside]
+            found[inside] = (self._bitmap[valid >> 3] >> (7 - (valid & 7))) & 1 == 1
+            return found
+        if not len(self._sorted):
+            return np.zeros(len(ids), dtype=bool)
+        positions = np.minimum(np.searchsorted(self._sorted, ids), len(self._sorted) - 1)
+        return self._sorted[positions] == ids
+
+class AdaptiveSchedule:
+    """Cadência de cada tarefa do sync aprendida pela taxa de mudança observada
+    
+    Cada execução compara o resumo de mudança da tarefa (ver
+    ETLProcessor._change_digest) com o da anterior: sem mudança o
+    intervalo da tarefa dobra, com mudança cai pela metade (entre `min_minutes`
+    e `max_minutes`). A taxa de mudança (média móvel) define quais tarefas são
+    "quentes". Se a projeção de requisições por dia passar do orçamento, os
+    intervalos das tarefas mais frias são esticados primeiro; no dia, tarefas
+    vencidas rodam das mais quentes para as mais frias enquanto houver saldo.
+    """
+    
+    SMOOTHING = 0.3
+    # Custo assumido de uma tarefa que ainda não rodou (requisições)
+    DEFAULT_COST = 5
+    
+    def __init__(self, jobs, daily_budget=None, min_minutes=None, max_minutes=None, initial_minutes=None):
+        self.jobs = list(jobs)
+        self.daily_budget = daily_budget or int(os.getenv('CVCRM_DAILY_REQUEST_BUDGET', '2000'))
+        self.min_minutes = min_minutes or int(os.getenv('ETL_AGENDA_MIN_MINUTOS', '30'))
+        self.max_minutes = max_minutes or int(os.getenv('ETL_AGENDA_MAX_MINUTOS', str(7 * 24 * 60)))
+        self.initial_minutes = initial_minutes or int(os.getenv('ETL_AGENDA_INICIAL_MINUTOS', '240'))
+    
+    def state(self, saved):
+        """Estado de todas as tarefas: o salvo em etl_agenda ou o inicial"""
+        state = {}
+        for job in self.jobs:
+            entry = {
+                'tarefa': job, 'intervalo_minutos': self.initial_minutes, 'taxa_mudanca': 0.5,
+                'custo_requisicoes': None, 'digest': None, 'execucoes': 0, 'mudancas': 0,
+                'ultima_execucao': None, 'ultima_mudanca': None
+            }
+            entry.update({key: value for key, value in saved.get(job, {}).items() if key in entry})
+            entry['intervalo_minutos'] = max(self.min_minutes, min(self.max_minutes, entry['intervalo_minutos']))
+            state[job] = entry
+        return state
+    
+    def observe(self, entry, digest, requests, now):
+        """Registra uma execução da tarefa e ajusta seu intervalo; retorna se houve mudança
+    
+        A primeira execução (sem resumo anterior) conta como mudança, mas não
+        altera o intervalo.
+        """
+        changed = digest != entry['digest']
+        if entry['digest'] is not None:
+            if changed:
+                entry['intervalo_minutos'] = max(self.min_minutes, entry['intervalo_minutos'] // 2)
+            else:
+                entry['intervalo_minutos'] = min(self.max_minutes, entry['intervalo_minutos'] * 2)
+            entry['taxa_mudanca'] = (entry['taxa_mudanca'] * (1 - self.SMOOTHING)
+                                     + (self.SMOOTHING if changed else 0))
+    
+        cost = entry['custo_requisicoes']
+        entry['custo_requisicoes'] = requests if cost is None else cost * (1 - self.SMOOTHING) + requests * self.SMOOTHING
+        entry['digest'] = digest
+        entry['execucoes'] += 1
+        entry['ultima_execucao'] = now
+        if changed:
+            entry['mudancas'] += 1
+            entry['ultima_mudanca'] = now
+        return changed
+    
+    def cost(self, entry):
+        """Requisições esperadas por execução da tarefa (média móvel ou padrão)"""
+        cost = entry['custo_requisicoes']
+        return self.DEFAULT_COST if cost is None else max(1, cost)
+    
+    def projected(self, state, intervals):
+        """Requisições por dia projetadas com os intervalos dados"""
+        return sum(self.cost(state[job]) * 24 * 60 / intervals[job] for job in self.jobs)
+    
+    def plan(self, state):
+        """Intervalos efetivos (minutos) que cabem no orçamento diário
+    
+        Dobra o intervalo da tarefa mais fria ainda abaixo do máximo até a
+        projeção caber; se nem todas no máximo couberem, o saldo diário segura
+        as execuções em `due`.
+        """
+        intervals = {job: state[job]['intervalo_minutos'] for job in self.jobs}
+        coldest_first = sorted(self.jobs, key=lambda job: state[job]['taxa_mudanca'])
+        while self.projected(state, intervals) > self.daily_budget:
+            stretchable = [job for job in coldest_first if intervals[job] < self.max_minutes]
+            if not stretchable:
+                break
+            job = stretchable[0]
+            intervals[job] = min(self.max_minutes, intervals[job] * 2)
+        return intervals
+    
+    def overdue(self, entry, interval, now):
+        """Fração do intervalo já decorrida desde a última execução (>= 1: vencida)"""
+        if entry['ultima_execucao'] is None:
+            return float('inf')
+        return (now - entry['ultima_execucao']).total_seconds() / 60 / interval
+    
+    def due(self, state, intervals, now, remaining):
+        """Tarefas vencidas que cabem no saldo do dia, das mais quentes às mais frias
+    
+        Retorna (a executar, adiadas por falta de orçamento).
+        """
+        pending = [job for job in self.jobs if self.overdue(state[job], intervals[job], now) >= 1]
+        pending.sort(key=lambda job: (-state[job]['taxa_mudanca'], -self.overdue(state[job], intervals[job], now)))
+        selected, deferred = [], []
+        for job in pending:
+            cost = self.cost(state[job])
+            if cost <= remaining:
+                selected.append(job)
+                remaining -= cost
+            else:
+                deferred.append(job)
+        return selected, deferred
+    
+    def report(self, state, intervals, now, used_today=0):
+        """Defasagem esperada de cada tarefa: em média meio intervalo, no máximo um intervalo"""
+        lines = [f"Orçamento: {self.projected(state, intervals):.0f} req/dia projetadas de "
+                 f"{self.daily_budget} ({used_today} consumidas hoje)"]
+        for job in sorted(self.jobs, key=lambda job: -state[job]['taxa_mudanca']):
+            entry = state[job]
+            interval = timedelta(minutes=intervals[job])
+            if intervals[job] != entry['intervalo_minutos']:
+                cadence = f"a cada {interval} (aprendido {timedelta(minutes=entry['intervalo_minutos'])})"
+            else:
+                cadence = f"a cada {interval}"
+            if entry['ultima_execucao'] is None:
+                age = "nunca executada"
+            else:
+                age = f"idade {timedelta(seconds=int((now - entry['ultima_execucao']).total_seconds()))}"
+            lines.append(f"{job}: {cadence}, mudança {entry['taxa_mudanca'] * 100:.0f}%, "
+                         f"~{self.cost(entry):.0f} req/execução, {age}, "
+                         f"defasagem esperada {interval / 2} (máx {interval})")
+        return lines
+    
+class ScheduledTick:
+    """Execução da agenda em andamento: tarefas, estado da agenda e contagens"""
+    
+    def __init__(self, run_id, state, pending, used_today, started):
+        self.run_id = run_id
+        self.state = state
+        self.pending = pending
+        self.used_today = used_today
+        self.started = started
+        self.counts = {}
+        self.changed = []
+        # Tarefas que não rodaram completas (circuito aberto ou falhas da API)
+        self.incomplete = []
+
+class TenantScheduler:
+    """Executa a agenda de vários tenants no mesmo worker, com revezamento justo
+    
+    Cada tenant tem seu próprio rate limit e orçamento, então as requisições de
+    um não atrasam as de outro. As tarefas vencidas de cada tenant rodam em
+    sequência (dependências), mas a fila é por tarefa e não por tenant: ao
+    terminar uma tarefa o tenant volta para o fim da fila. Com menos threads
+    (ETL_TENANTS_PARALELO) que tenants, um tenant grande ocupa no máximo uma
+    thread por vez e os outros seguem andando. A ordem inicial gira a cada tick.
+    """
+    
+    def __init__(self, processors, workers=None):
+        self.processors = list(processors)
+        self.workers = max(1, workers or int(os.getenv('ETL_TENANTS_PARALELO', str(len(self.processors)))))
+        self._turn = 0
+    
+    @staticmethod
+    def _call(processor, method, *args):
+        """Chama `method` com o nome do tenant nos logs da thread"""
+        _log_context.tenant = processor.tenant.name
+        try:
+            return method(*args)
+        finally:
+            _log_context.tenant = None
+    
+    def run(self):
+        """Um tick de todos os tenants; falha de um tenant não interrompe os outros"""
+        order = self.processors[self._turn:] + self.processors[:self._turn]
+        self._turn = (self._turn + 1) % len(self.processors)
+        
+        ready = deque()
+        for processor in order:
+            try:
+                tick = self._call(processor, processor.start_scheduled_tick)
+            except Exception:
+                continue  # já registrado e alertado pelo processador
+            if tick is not None:
+                ready.append((processor, tick, iter(tick.pending)))
+        
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='tenant') as executor:
+            while ready or running:
+                while ready and len(running) < self.workers:
+                    processor, tick, jobs = ready.popleft()
+                    job = next(jobs, None)
+                    if job is None:
+                        self._finish(processor, tick)
+                        continue
+                    future = executor.submit(self._call, processor, processor.run_scheduled_job, tick, job)
+                    running[future] = (processor, tick, jobs)
+                if not running:
+                    continue
+                
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    processor, tick, jobs = running.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        self._finish(processor, tick, error)
+                    else:
+                        ready.append((processor, tick, jobs))
+    
+    def _finish(self, processor, tick, error=None):
+        try:
+            self._call(processor, processor.finish_scheduled_tick, tick, error)
+        except Exception:
+            pass  # já registrado e alertado pelo processador
+
+class WorkQueue:
+    """Fila de tarefas do ETL no Postgres (etl_tarefas), para várias réplicas do worker
+    
+    Cada tarefa é uma unidade de trabalho independente: uma tarefa da agenda
+    (tipo 'agenda') ou uma janela de data do backfill (tipo 'janela'). Qualquer
+    processo reivindica a próxima com FOR UPDATE SKIP LOCKED e recebe um lease
+    que o heartbeat renova enquanto a tarefa roda; se o processo morrer, o
+    lease expira e outra réplica retoma a tarefa. Erros voltam a tarefa para a
+    fila com espera exponencial até `max_tentativas`. Quando a última tarefa de
+    um lote termina, quem a concluiu fecha o lote no etl_sync_runs.
+    """
+    
+    def __init__(self, db, worker_id=None, lease_seconds=None, retry_seconds=None, circuit=None):
+        """`circuit`: ApiCircuit do processo, registrado no lote ao fechá-lo"""
+        self.db = db
+        self.circuit = circuit
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_seconds = lease_seconds or int(os.getenv('ETL_FILA_LEASE_SEGUNDOS', '600'))
+        self.retry_seconds = retry_seconds or int(os.getenv('ETL_FILA_RETRY_SEGUNDOS', '60'))
+    
+    def enqueue(self, mode, tasks):
+        """Cria um lote com as tarefas [(tipo, tarefa, janela_inicio, janela_fim, etapa)]
+        
+        Tarefas que já estão ativas na fila são ignoradas; se nenhuma entrar,
+        o lote não é criado e retorna None. Senão retorna o id do lote.
+        """
+        with self.db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("INSERT INTO etl_sync_runs (modo) VALUES (%s) RETURNING id", (mode,))
+                run_id = cursor.fetchone()[0]
+                inserted = execute_values(cursor, """
+                    INSERT INTO etl_tarefas (lote, tipo, tarefa, janela_inicio, janela_fim, etapa)
+                    VALUES %s
+                    ON CONFLICT DO NOTHING
+                    RETURNING id
+                """, [(run_id, *task) for task in tasks], fetch=True)
+            if not inserted:
+                conn.rollback()
+                return None
+            conn.commit()
+        logging.info(f"Fila: lote {run_id} com {len(inserted)} tarefas ({len(tasks) - len(inserted)} já na fila)")
+        return run_id
+    
+    def claim(self):
+        """Reivindica a próxima tarefa disponível (ou com lease expirado); None se não houver
+        
+        Tarefas de uma etapa só ficam disponíveis quando as etapas anteriores do
+        mesmo lote terminaram. Antes, tarefas com lease expirado e sem
+        tentativas restantes são marcadas como 'falhou'.
+        """
+        finished = []
+        with self.db.get_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute("""
+                    UPDATE etl_tarefas SET status = 'falhou', erro = COALESCE(erro, 'lease expirado')
+                    WHERE status = 'executando' AND lease_ate < CURRENT_TIMESTAMP
+                    AND tentativas >= max_tentativas
+                    RETURNING lote
+                """)
+                for lote in {row['lote'] for row in cursor.fetchall()}:
+                    finished.append(self._close_lote(cursor, lote))
+                
+                cursor.execute("""
+                    WITH candidata AS (
+                        SELECT t.id FROM etl_tarefas t
+                        WHERE ((t.status = 'pendente' AND t.disponivel_em <= CURRENT_TIMESTAMP)
+                               OR (t.status = 'executando' AND t.lease_ate < CURRENT_TIMESTAMP))
+                        AND NOT EXISTS (
+                            SELECT 1 FROM etl_tarefas d
+                            WHERE d.lote = t.lote AND d.etapa < t.etapa
+                            AND d.status IN ('pendente', 'executando')
+                        )
+                        ORDER BY t.etapa, t.id
+                        LIMIT 1
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    UPDATE etl_tarefas t SET
+                        status = 'executando',
+                        worker = %s,
+                        tentativas = t.tentativas + 1,
+                        lease_ate = CURRENT_TIMESTAMP + make_interval(secs => %s),
+                        heartbeat_em = CURRENT_TIMESTAMP,
+                        iniciado_em = CURRENT_TIMESTAMP
+                    FROM candidata WHERE t.id = candidata.id
+                    RETURNING t.*
+                """, (self.worker_id, self.lease_seconds))
+                task = cursor.fetchone()
+            conn.commit()
+        for lote, status in filter(None, finished):
+            logging.warning(f"Fila: lote {lote} fechado como '{status}' (tarefas com lease expirado)")
+        return dict(task) if task else None
+    
+    def heartbeat(self, task):
+        """Renova o lease; False se a tarefa não é mais deste worker"""
+        with self.db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    UPDATE etl_tarefas
+                    SET lease_ate = CURRENT_TIMESTAMP + make_interval(secs => %s), heartbeat_em = CURRENT_TIMESTAMP
+                    WHERE id = %s AND worker = %s AND status = 'executando'
+                """, (self.lease_seconds, task['id'], self.worker_id))
+                owned = cursor.rowcount == 1
+            conn.commit()
+        return owned
+    
+    @contextmanager
+    def leased(self, task):
+        """Mantém o lease da tarefa renovado (a cada 1/3 do lease) enquanto o bloco roda"""
+        stop = threading.Event()
+        
+        def beat():
+            while not stop.wait(self.lease_seconds / 3):
+                try:
+                    if not self.heartbeat(task):
+                        logging.warning(f"Fila: lease da tarefa {task['id']} perdido para outro worker")
+                        return
+                except Exception as e:
+                    logging.warning(f"Fila: heartbeat da tarefa {task['id']} falhou: {e}")
+        
+        thread = threading.Thread(target=beat, name=f"heartbeat-{task['id']}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+    
+    def complete(self, task, records, changed, requests):
+        """Conclui a tarefa; se fechou o lote, retorna (lote, status), senão None"""
+        return self._finish(task, """
+            UPDATE etl_tarefas SET status = 'concluida', concluido_em = CURRENT_TIMESTAMP,
+                registros = %s, mudou = %s, requisicoes = %s, lease_ate = NULL
+            WHERE id = %s AND worker = %s AND status = 'executando'
+            RETURNING lote, status
+        """, (json.dumps(records), changed, requests, task['id'], self.worker_id))
+    
+    def fail(self, task, error):
+        """Devolve a tarefa à fila com espera exponencial, ou marca 'falhou' sem tentativas
+        
+        Retorna (lote, status) se a falha fechou o lote, senão None.
+        """
+        return self._finish(task, """
+            UPDATE etl_tarefas SET
+                status = CASE WHEN tentativas < max_tentativas THEN 'pendente' ELSE 'falhou' END,
+                disponivel_em = CURRENT_TIMESTAMP + make_interval(secs => %s * 2 ^ (tentativas - 1)),
+                erro = %s, worker = NULL, lease_ate = NULL
+            WHERE id = %s AND worker = %s AND status = 'executando'
+            RETURNING lote, status
+        """, (self.retry_seconds, str(error), task['id'], self.worker_id))
+    
+    def _finish(self, task, query, params):
+        with self.db.get_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute(query, params)
+                row = cursor.fetchone()
+                if row is None:
+                    conn.rollback()
+                    logging.warning(f"Fila: tarefa {task['id']} não é mais deste worker (lease expirado); "
+                                    f"resultado descartado")
+                    return None
+                closed = self._close_lote(cursor, row['lote']) if row['status'] != 'pendente' else None
+            conn.commit()
+        return closed
+    
+    def _close_lote(self, cursor, lote):
+        """Fecha o lote no etl_sync_runs se não restam tarefas ativas; retorna (lote, status)
+        
+        O lock na linha do lote serializa as conclusões concorrentes: só a última
+        vê zero tarefas ativas.
+        """
+        cursor.execute("SELECT status FROM etl_sync_runs WHERE id = %s FOR UPDATE", (lote,))
+        run = cursor.fetchone()
+        if run is None or run['status'] != 'executando':
+            return None
+        cursor.execute("""
+            SELECT status, mudou, registros FROM etl_tarefas WHERE lote = %s
+        """, (lote,))
+        tasks = cursor.fetchall()
+        if any(task['status'] in ('pendente', 'executando') for task in tasks):
+            return None
+        
+        records = {}
+        for task in tasks:
+            for name, count in (task['registros'] or {}).items():
+                records[name] = records.get(name, 0) + count
+        if any(task['status'] == 'falhou' for task in tasks):
+            status = 'erro'
+        elif any(task['mudou'] for task in tasks):
+            status = 'sucesso'
+        else:
+            status = 'sem_mudancas'
+        
+        circuit = json.dumps(self.circuit.snapshot()) if self.circuit is not None else None
+        cursor.execute("""
+            UPDATE etl_sync_runs SET status = %s, finalizado_em = CURRENT_TIMESTAMP, registros = %s, circuito = %s
+            WHERE id = %s
+        """, (status, json.dumps(records), circuit, lote))
+        return lote, status
+
+class QueueWorker:
+    """Laço de uma réplica do worker no modo fila
+    
+    A cada tick cada tenant enfileira suas tarefas vencidas da agenda (réplicas
+    que fazem o mesmo não duplicam tarefas); no resto do tempo a réplica
+    reivindica e executa tarefas, revezando entre os tenants. Mais réplicas
+    dividem a fila; o rate limit de cada tenant é compartilhado entre elas
+    (SharedRateLimiter), então a vazão cresce até o limite da API.
+    """
+    
+    def __init__(self, processors, poll_seconds=None, tick_minutes=None):
+        self.processors = list(processors)
+        self.poll_seconds = poll_seconds or float(os.getenv('ETL_FILA_POLL_SEGUNDOS', '5'))
+        self.tick_seconds = (tick_minutes or int(os.getenv('ETL_AGENDA_TICK_MINUTOS', '15'))) * 60
+        for processor in self.processors:
+            processor.enable_queue()
+    
+    def enqueue_due(self):
+        for processor in self.processors:
+            try:
+                TenantScheduler._call(processor, processor.enqueue_scheduled)
+            except Exception as e:
+                logging.error(f"Fila: erro ao enfileirar tarefas de {processor.tenant.label}: {e}")
+    
+    def work_once(self):
+        """Uma rodada: no máximo uma tarefa de cada tenant; retorna quantas executou"""
+        executed = 0
+        for processor in self.processors:
+            try:
+                if TenantScheduler._call(processor, processor.run_next_task):
+                    executed += 1
+            except Exception as e:
+                logging.error(f"Fila: erro no worker de {processor.tenant.label}: {e}")
+        return executed
+    
+    def run_forever(self):
+        logging.info(f"Fila: worker {self.processors[0].queue.worker_id} iniciado")
+        next_tick = 0.0
+        while True:
+            if time.monotonic() >= next_tick:
+                self.enqueue_due()
+                next_tick = time.monotonic() + self.tick_seconds
+            if not self.work_once():
+                time.sleep(self.poll_seconds)
+
 class ETLProcessor:
     """Processador principal do ETL"""
     
-    def __init__(self):
-        self.api = CVCRMAPIClient()
-        self.db = CloudDatabaseManager()
+    def __init__(self, replay_dir=None, tenant=None, api=None, database=True):
+        """`replay_dir`: modo reload, lê as páginas do PageArchive em vez da API
+        
+        `tenant`: instância do CVCRM (credenciais, rate limit, orçamento e
+        schema próprios); padrão: o tenant único configurado pelas CVCRM_*.
+        `api`: cliente já montado no lugar da API (ex: MockSourceClient no bench).
+        `database`: False para rodar sem banco (DATABASE_URL dispensada), só
+        para o sync dirigido em dry-run (bench sem --carregar).
+        """
+        self.tenant = tenant or Tenant()
+        if api is not None:
+            self.api = api
+        elif replay_dir:
+            self.api = ArchiveReplayClient(PageArchive(self.tenant.archive_dir(replay_dir)))
+        else:
+            self.api = CVCRMAPIClient(archive=PageArchive.from_env(self.tenant), tenant=self.tenant)
+        self.db = CloudDatabaseManager(schema=self.tenant.schema) if database else None
+        if self.db is not None:
+            self.api.circuit.on_change = lambda state: self.db.save_circuit_state(socket.gethostname(), state)
+        self.transformer = PageTransformer()
+        self.quarantine = RowQuarantine(self.db)
+        self.alerts = AlertDispatcher()
+        # No reload/bench não há custo de API: os limites de registros por
+        # execução e o orçamento diário não se aplicam
+        self.record_limits = not replay_dir and api is None
+        self.page_digest = PageDigest()
+        # Sync dirigido (run_targeted_sync): filtro de data, limite de páginas e tempos
+        self.since = None
+        self.max_pages = None
+        self.timings = None
+        self.schedule = AdaptiveSchedule(self.sync_jobs(), daily_budget=self.tenant.daily_budget)
+        self._tables_ready = False
+    
+    # Etapa de cada tarefa no modo fila: tarefas da mesma etapa rodam em
+    # paralelo; uma etapa espera as anteriores do lote (chaves estrangeiras e
+    # comissões aplicadas sobre vendas)
+    JOB_STAGES = {
+        'empreendimentos': 0, 'atendimentos': 0, 'repasses': 0,
+        'unidades': 1, 'prosoluto': 1,
+        'reservas': 2,
+        'comissoes': 3
+    }
+    
+    # Tarefas que rodam logo depois quando a tarefa muda, mesmo fora da sua
+    # cadência: as comissões são aplicadas sobre as vendas (de /reservas)
+    CHANGE_DEPENDENTS = {'reservas': ('comissoes',)}
+    
+    def sync_jobs(self):
+        """Tarefas do sync na ordem de execução (dependências primeiro)
+        
+        `reservas` é o fan-out de /reservas (destinos vendas e reservas).
+        """
+        return {
+            'empreendimentos': self.sync_empreendimentos,
+            'unidades': self.sync_unidades,
+            'reservas': self.sync_reservas_fanout,
+            'comissoes': self.sync_comissoes_vendas,
+            'prosoluto': self.sync_prosoluto,
+            'atendimentos': lambda: self.sync_other_table('atendimentos'),
+            'repasses': lambda: self.sync_other_table('repasses')
+        }
+    
+    def select_jobs(self, names=None):
+        """Tarefas (na ordem do sync) das tabelas ou endpoints pedidos; todas sem `names`
+        
+        Tabelas que vêm do mesmo endpoint selecionam a mesma tarefa (ex: vendas -> reservas).
+        """
+        jobs = list(self.sync_jobs())
+        if not names:
+            return jobs
+        selected = set()
+        for name in names:
+            matches = [job for job in jobs if name == job or name in ENDPOINT_TABLES[job]]
+            if not matches:
+                tables = sorted({table for job in jobs for table in ENDPOINT_TABLES[job]})
+                raise ValueError(f"Tabela desconhecida: {name} (disponíveis: {', '.join(tables)})")
+            selected.update(matches)
+        return [job for job in jobs if job in selected]
+    
+    def _pages(self, endpoint):
+        """Páginas do endpoint, acumuladas no resumo da tarefa em execução
+        
+        No sync dirigido aplica o filtro de data (`since`, nos endpoints que
+        aceitam), o limite de páginas (`max_pages`) e mede os tempos.
+        """
+        date_from = None
+        if self.since is not None and endpoint in DATE_FILTER_ENDPOINTS:
+            date_from = self.since.isoformat()
+        pages = self.api.iter_pages(endpoint, date_from=date_from)
+        count = 0
+        
+        while self.max_pages is None or count < self.max_pages:
+            started = time.perf_counter()
+            records = next(pages, None)
+            if records is None:
+                return
+            resumed = time.perf_counter()
+            if self.timings is not None:
+                self.timings.fetched(endpoint, len(records), resumed - started)
+            self.page_digest.add(records)
+            count += 1
+            try:
+                yield records
+            finally:
+                # Também quando o consumidor para no meio (limite de registros)
+                if self.timings is not None:
+                    self.timings.processed(endpoint, time.perf_counter() - resumed)
+    
+    def _record_limit(self, limit):
+        return limit if self.record_limits else None
+    
+    def _limit_reached(self, total, limit):
+        return self.record_limits and total >= limit
+    
+    def _load_page_sizes(self):
+        if self.db is None:
+            return
+        try:
+            self.api.page_sizes.load(self.db.load_page_sizes())
+        except Exception as e:
+            logging.warning(f"Não foi possível carregar tamanhos de página salvos: {e}")
+    
+    def _save_page_sizes(self):
+        """Persiste os tamanhos de página e registra registros/requisição por endpoint"""
+        for line in self.api.page_sizes.report():
+            logging.info(f"Paginação {line}")
+        try:
+            self.db.save_page_sizes(self.api.page_sizes.snapshot())
+        except Exception as e:
+            logging.warning(f"Não foi possível salvar tamanhos de página: {e}")
         
     def sync_empreendimentos(self):
         """Sincroniza empreendimentos"""
         try:
-            page = 1
-            total_records = 0
-            
-            while True:
-                data = self.api.get_empreendimentos(page=page, per_page=50)
-                empreendimentos = data.get('data', [])
-                
-                if not empreendimentos:
-                    break
-                
-                with self.db.get_connection() as conn:
-                    with conn.cursor() as cursor:
-                        for emp in empreendimentos:
-                            cursor.execute("""
-                                INSERT INTO empreendimentos (cvcrm_id, nome, endereco, cidade, estado, cep, status, vgv, data_lancamento, created_at, updated_at)
-                                VALUES (%(id)s, %(nome)s, %(endereco)s, %(cidade)s, %(estado)s, %(cep)s, %(status)s, %(vgv)s, %(data_lancamento)s, %(created_at)s, CURRENT_TIMESTAMP)
-                                ON CONFLICT (cvcrm_id) 
-                                DO UPDATE SET
-                                    nome = EXCLUDED.nome,
-                                    endereco = EXCLUDED.endereco,
-                                    cidade = EXCLUDED.cidade,
-                                    estado = EXCLUDED.estado,
-                                    cep = EXCLUDED.cep,
-                                    status = EXCLUDED.status,
-                                    vgv = EXCLUDED.vgv,
-                                    data_lancamento = EXCLUDED.data_lancamento,
-                                    updated_at = CURRENT_TIMESTAMP
-                            """, emp)
-                    conn.commit()
-                
-                total_records += len(empreendimentos)
-                page += 1
-                
-                if total_records >= 500:
-                    break
-            
+            total_records = self._sync_table('empreendimentos', 500)
             logging.info(f"Empreendimentos sincronizados: {total_records} registros")
             return total_records
             
         except Exception as e:
-            logging.error(f"Erro ao sincronizar empreendimentos: {e}")
-            return 0
+            logging.error(f"Erro ao sincronizar empreendimentos: {e}")
+            return 0
+    
+    def sync_reservas_fanout(self):
+        """Sincroniza vendas e reservas com uma única leitura do endpoint /reservas
+        
+        Cada página de /reservas é buscada uma vez e entregue aos dois destinos:
+        `vendas` (apenas ativo='S' com data_venda) e `reservas` (todos os registros).
+        """
+        sinks = [self._sink('vendas', self._record_limit(2000)), self._sink('reservas', self._record_limit(500))]
+        try:
+            counts = self._sync_fanout('reservas', sinks)
+        except Exception as e:
+            logging.error(f"Erro ao sincronizar /reservas (vendas + reservas): {e}")
+            counts = {sink.name: sink.total for sink in sinks}
+        
+        logging.info(f"Vendas reais sincronizadas: {counts['vendas']} registros")
+        logging.info(f"Reservas sincronizada: {counts['reservas']} registros")
+        return counts
     
-    def sync_vendas_reais(self):
-        """Sincroniza vendas reais via endpoint /reservas - CORRIGIDO CVDW"""
-        try:
-            page = 1
-            total_records = 0
+    def _sink(self, table, limit=None):
+        """Destino de carga de `table`: query de upsert, hooks e quarentena"""
+        if table == 'vendas':
+            return PageSink('vendas', self._get_vendas_insert_query(), self.transformer, self.quarantine, limit,
+                            before_load=self._before_vendas_load, after_load=self._after_vendas_load)
+        query = getattr(self, f'_get_{table}_insert_query')()
+        return PageSink(table, query, self.transformer, self.quarantine, limit,
+                        before_load=self._partition_hook(table))
+    
+    def _sync_table(self, table, limit):
+        """Sincroniza um endpoint de destino único (endpoint e tabela com o mesmo nome)"""
+        return self._sync_fanout(table, [self._sink(table, self._record_limit(limit))])[table]
+    
+    def _partition_hook(self, table):
+        """Hook `before_load` que prepara partições e mudanças de data da página"""
+        return lambda cursor, records: self._prepare_partitions(cursor, table, records)
+    
+    def _prepare_partitions(self, cursor, table, records):
+        """Prepara a carga particionada; retorna o desfazer dos registros que não gravarem"""
+        moves = self.db.prepare_partitioned_load(cursor, table, records)
+        return lambda cursor, ids: self.db.undo_partition_moves(cursor, table, moves, ids)
+    
+    def _before_vendas_load(self, cursor, records):
+        """Marca as células do cubo das versões atuais e prepara as partições"""
+        self.db.mark_cube_dirty(cursor, [r.get('id') for r in records])
+        return self._prepare_partitions(cursor, 'vendas', records)
+    
+    def _after_vendas_load(self, cursor, records):
+        """Marca as células das versões novas e recalcula as células alteradas do cubo"""
+        self.db.mark_cube_dirty(cursor, [r.get('id') for r in records])
+        self.db.refresh_cube(cursor)
+    
+    def _sync_fanout(self, endpoint, sinks):
+        """Lê um endpoint página a página e distribui cada página entre vários destinos
+        
+        A leitura para quando a API não retorna mais registros ou quando todos
+        os destinos atingiram seu limite. Antes das páginas novas, os registros
+        em quarentena dos destinos são tentados de novo. Retorna {nome do
+        destino: registros}.
+        """
+        self._retry_quarantine([sink.name for sink in sinks])
+        for records in self._pages(endpoint):
+            with self.db.get_connection() as conn:
+                with conn.cursor() as cursor:
+                    self._load_page(cursor, sinks, records)
+                conn.commit()
             
-            while True:
-                data = self.api.get_vendas_reais(page=page, per_page=50)
-                reservas = data.get('data', [])
-                
-                if not reservas:
-                    break
-                
-                with self.db.get_connection() as conn:
-                    with conn.cursor() as cursor:
-                        for reserva in reservas:
-                            # Filtrar apenas reservas com vendas confirmadas
-                            if (reserva.get('ativo') == 'S' and 
-                                reserva.get('data_venda') and 
-                                reserva.get('data_venda') != ''):
-                                
-                                cursor.execute("""
-                                    INSERT INTO vendas (cvcrm_id, reserva_id, empreendimento, unidade_id, 
-                                                      corretor, time_corretor, cliente, valor, data_venda, 
-                                                      ativo, status, vgv, created_at, updated_at)
-                                    VALUES (%(id)s, %(reserva_id)s, %(empreendimento)s, %(unidade_id)s,
-                                           %(corretor)s, %(time_corretor)s, %(cliente)s, %(valor)s, %(data_venda)s,
-                                           %(ativo)s, 'Vendido', %(valor)s, %(created_at)s, CURRENT_TIMESTAMP)
-                                    ON CONFLICT (cvcrm_id)
-                                    DO UPDATE SET
-                                        empreendimento = EXCLUDED.empreendimento,
-                                        corretor = EXCLUDED.corretor,
-                                        time_corretor = EXCLUDED.time_corretor,
-                                        cliente = EXCLUDED.cliente,
-                                        valor = EXCLUDED.valor,
-                                        data_venda = EXCLUDED.data_venda,
-                                        ativo = EXCLUDED.ativo,
-                                        vgv = EXCLUDED.vgv,
-                                        updated_at = CURRENT_TIMESTAMP
-                                """, reserva)
-                    conn.commit()
-                
-                total_records += len([r for r in reservas if r.get('ativo') == 'S' and r.get('data_venda')])
-                page += 1
-                
-                if total_records >= 2000:
-                    break
+            if all(sink.saturated for sink in sinks):
+                break
+        
+        return {sink.name: sink.total for sink in sinks}
+    
+    def _load_page(self, cursor, sinks, records):
+        """Entrega uma página a cada destino ativo, com savepoint por destino"""
+        for sink in sinks:
+            if sink.saturated:
+                continue
+            # Savepoint por destino: erro em um não descarta os outros
+            cursor.execute("SAVEPOINT fanout_sink")
+            try:
+                sink.load(cursor, records)
+                cursor.execute("RELEASE SAVEPOINT fanout_sink")
+            except Exception as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT fanout_sink")
+                sink.error = e
+                logging.error(f"Erro ao gravar {sink.name}: {e}")
+    
+    def _retry_quarantine(self, tables):
+        """Tenta gravar de novo os registros em quarentena das tabelas
+        
+        Os que gravarem saem da quarentena; os que falharem de novo somam uma
+        tentativa (até ETL_QUARENTENA_TENTATIVAS, depois ficam para análise).
+        """
+        for table in tables:
+            try:
+                records = self.quarantine.pending(table)
+            except Exception as e:
+                logging.warning(f"Não foi possível ler a quarentena de {table}: {e}")
+                continue
+            if not records:
+                continue
+            sink = self._sink(table)
+            sink.retry = True
+            with self.db.get_connection() as conn:
+                with conn.cursor() as cursor:
+                    self._load_page(cursor, [sink], records)
+                conn.commit()
+            logging.info(f"Quarentena {table}: {sink.total} de {len(records)} registros recuperados")
+    
+    # Endpoints com filtro a_partir_data_referencia suportados pelo backfill
+    BACKFILL_ENDPOINTS = ('reservas', 'atendimentos', 'repasses')
+    
+    def _backfill_sinks(self, endpoint):
+        """Destinos (sem limite de registros) de cada endpoint do backfill"""
+        if endpoint in self.BACKFILL_ENDPOINTS:
+            return [self._sink(table) for table in ENDPOINT_TABLES[endpoint]]
+        raise ValueError(f"Endpoint sem suporte a backfill: {endpoint}")
+    
+    def run_backfill(self, endpoints, date_start, date_end, window_days=30, workers=3):
+        """Carga histórica paralela em janelas de data
+        
+        O intervalo [date_start, date_end) é dividido em janelas de `window_days`
+        dias e cada janela (por endpoint) é buscada com a_partir_data_referencia
+        no início da janela, em paralelo, sob o rate limit compartilhado do cliente.
+        Cada página gravada atualiza o checkpoint da janela na mesma transação,
+        então uma janela interrompida retoma da página seguinte e janelas
+        concluídas são puladas. Os upserts por cvcrm_id tornam a junção idempotente.
+        """
+        self.db.create_tables()
+        self._load_page_sizes()
+        run_id = self.db.start_sync_run('backfill')
+        
+        windows = split_date_windows(date_start, date_end, window_days)
+        checkpoints = self.db.load_backfill_checkpoints()
+        tasks = []
+        for endpoint in endpoints:
+            self._backfill_sinks(endpoint)  # valida o endpoint antes de iniciar
+            for window_start, window_end in windows:
+                checkpoint = checkpoints.get((endpoint, window_start, window_end))
+                if checkpoint and checkpoint['status'] == 'concluida':
+                    continue
+                tasks.append((endpoint, window_start, window_end, checkpoint))
+        
+        progress = BackfillProgress(len(tasks))
+        logging.info(f"Backfill: {len(tasks)} janelas pendentes "
+                     f"({len(windows) * len(endpoints) - len(tasks)} já concluídas), {workers} em paralelo")
+        
+        failures = 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(self._backfill_window, *task, progress): task for task in tasks}
+            for future in as_completed(futures):
+                endpoint, window_start, window_end, _ = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    failures += 1
+                    logging.error(f"Backfill {endpoint} {window_start}..{window_end} falhou: {e}")
+                progress.window_done()
+                logging.info(progress.report())
+        
+        logging.info(f"Backfill finalizado: {progress.records} registros, {failures} janelas com erro")
+        self._save_page_sizes()
+        self.db.finish_sync_run(run_id, 'sucesso' if failures == 0 else 'erro',
+                                {'registros': progress.records, 'janelas_com_erro': failures},
+                                circuit=self.api.circuit.snapshot())
+        if failures == 0:
+            self.publish_dashboard(run_id)
+        return failures == 0
+    
+    def _backfill_window(self, endpoint, window_start, window_end, checkpoint, progress):
+        """Busca uma janela página a página, gravando dados e checkpoint juntos"""
+        api_method = getattr(self.api, f'get_{endpoint}')
+        sinks = self._backfill_sinks(endpoint)
+        page = checkpoint['ultima_pagina'] + 1 if checkpoint else 1
+        # Tamanho fixo dentro da janela (o checkpoint guarda a página e o tamanho)
+        per_page = checkpoint['registros_por_pagina'] if checkpoint else self.api.page_sizes.size(endpoint)
+        total = checkpoint['registros'] if checkpoint else 0
+        
+        while True:
+            data = api_method(page=page, per_page=per_page, date_from=window_start.isoformat())
+            records = (data or {}).get('data', [])
+            in_window = [r for r in records if _reference_date(r) is None or _reference_date(r) < window_end]
+            if records and page == 1 and all(_reference_date(r) is None for r in records):
+                logging.warning(f"Backfill {endpoint}: registros sem data de referência "
+                                f"({', '.join(REFERENCE_DATE_FIELDS)}); a janela {window_start} lê até o fim dos dados")
+            # Partições dos meses da página (chave de partição, não a data de referência)
+            # criadas e confirmadas antes da transação de carga: janelas em paralelo
+            # nunca fazem DDL dentro de uma transação que grava na tabela
+            for sink in sinks:
+                self.db.ensure_partitions(sink.name, self.db.partition_months(sink.name, in_window))
+            # A API só filtra o início; páginas já além do fim da janela encerram a leitura
+            finished = not records or len(in_window) < len(records)
             
-            logging.info(f"Vendas reais sincronizadas: {total_records} registros")
-            return total_records
+            with self.db.get_connection() as conn:
+                with conn.cursor() as cursor:
+                    self._load_page(cursor, sinks, in_window)
+                    for sink in sinks:
+                        if sink.error is not None:
+                            raise sink.error
+                    total += len(in_window)
+                    self.db.save_backfill_checkpoint(
+                        cursor, endpoint, window_start, window_end, page, per_page, total,
+                        'concluida' if finished else 'em_andamento'
+                    )
+                conn.commit()
             
-        except Exception as e:
-            logging.error(f"Erro ao sincronizar vendas reais: {e}")
-            return 0
+            progress.page_done(len(in_window))
+            if finished:
+                return total
+            page += 1
     
     def sync_comissoes_vendas(self):
         """Sincroniza comissões das vendas - ENDPOINT CORRETO CVDW"""
         try:
-            page = 1
             total_records = 0
+            total_aplicadas = 0
+            total_sem_venda = 0
             
-            while True:
-                data = self.api.get_comissoes(page=page, per_page=50)
-                comissoes = data.get('data', [])
-                
-                if not comissoes:
-                    break
-                
+            for comissoes in self._pages('comissoes'):
                 with self.db.get_connection() as conn:
                     with conn.cursor() as cursor:
-                        for comissao in comissoes:
-                            # Atualizar vendas com dados de comissão
-                            cursor.execute("""
-                                UPDATE vendas 
-                                SET comissao_valor = %(valor_comissao)s,
-                                    updated_at = CURRENT_TIMESTAMP
-                                WHERE reserva_id = %(reserva_id)s
-                                OR cvcrm_id = %(venda_id)s
-                            """, comissao)
+                        aplicadas, sem_venda = self._apply_comissoes_page(cursor, comissoes)
                     conn.commit()
                 
                 total_records += len(comissoes)
-                page += 1
+                total_aplicadas += aplicadas
+                total_sem_venda += sem_venda
                 
-                if total_records >= 1000:
+                if self._limit_reached(total_records, 1000):
                     break
             
-            logging.info(f"Comissões sincronizadas: {total_records} registros")
+            logging.info(f"Comissões sincronizadas: {total_records} registros "
+                         f"({total_aplicadas} aplicadas, {total_sem_venda} sem venda correspondente)")
             return total_records
             
         except Exception as e:
             logging.error(f"Erro ao sincronizar comissões: {e}")
             return 0
     
+    def _apply_comissoes_page(self, cursor, comissoes):
+        """Aplica uma página de comissões em lote via tabela de staging
+        
+        Substitui o UPDATE por registro com `reserva_id = ... OR cvcrm_id = ...`
+        (que não usa índice) por um único UPDATE com join. Cada ramo do join
+        usa um índice (reserva_id ou cvcrm_id); quando mais de uma comissão da
+        página aponta para a mesma venda, vale a última, como no loop antigo.
+        
+        Retorna (comissões aplicadas, comissões sem venda correspondente).
+        """
+        cursor.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS tmp_comissoes (
+                ordem INTEGER,
+                reserva_id INTEGER,
+                venda_id INTEGER,
+                valor_comissao DECIMAL(15,2)
+            ) ON COMMIT DELETE ROWS
+        """)
+        execute_values(
+            cursor,
+            "INSERT INTO tmp_comissoes (ordem, reserva_id, venda_id, valor_comissao) VALUES %s",
+            [(ordem, c['reserva_id'], c['venda_id'], c['valor_comissao'])
+             for ordem, c in enumerate(self.transformer.records('comissoes', comissoes))]
+        )
+        cursor.execute("""
+            WITH candidatos AS (
+                SELECT v.cvcrm_id AS venda_alvo, s.ordem, s.valor_comissao
+                FROM tmp_comissoes s
+                JOIN vendas v ON v.reserva_id = s.reserva_id
+                UNION
+                SELECT v.cvcrm_id AS venda_alvo, s.ordem, s.valor_comissao
+                FROM tmp_comissoes s
+                JOIN vendas v ON v.cvcrm_id = s.venda_id
+            ),
+            escolhidas AS (
+                SELECT DISTINCT ON (venda_alvo) venda_alvo, valor_comissao
+                FROM candidatos
+                ORDER BY venda_alvo, ordem DESC
+            )
+            UPDATE vendas v
+            SET comissao_valor = e.valor_comissao,
+                updated_at = CURRENT_TIMESTAMP
+            FROM escolhidas e
+            WHERE v.cvcrm_id = e.venda_alvo
+            RETURNING v.cvcrm_id
+        """)
+        self.db.mark_cube_dirty(cursor, [row[0] for row in cursor.fetchall()])
+        self.db.refresh_cube(cursor)
+        cursor.execute("""
+            SELECT
+                COUNT(*) FILTER (WHERE casou) AS aplicadas,
+                COUNT(*) FILTER (WHERE NOT casou) AS sem_venda
+            FROM (
+                SELECT EXISTS (SELECT 1 FROM vendas v WHERE v.reserva_id = s.reserva_id)
+                    OR EXISTS (SELECT 1 FROM vendas v WHERE v.cvcrm_id = s.venda_id) AS casou
+                FROM tmp_comissoes s
+            ) t
+        """)
+        aplicadas, sem_venda = cursor.fetchone()
+        if sem_venda:
+            logging.warning(f"{sem_venda} comissões sem venda correspondente nesta página")
+        return aplicadas, sem_venda
+    
     def sync_unidades(self):
         """Sincroniza unidades"""
         try:
-            page = 1
-            total_records = 0
-            
-            while True:
-                data = self.api.get_unidades(page=page, per_page=50)
-                unidades = data.get('data', [])
-                
-                if not unidades:
-                    break
-                
-                with self.db.get_connection() as conn:
-                    with conn.cursor() as cursor:
-                        for unidade in unidades:
-                            cursor.execute("""
-                                INSERT INTO unidades (cvcrm_id, empreendimento_id, numero, bloco, andar, tipologia_id,
-                                                    area_privativa, area_total, valor_tabela, valor_venda, status, created_at, updated_at)
-                                VALUES (%(id)s, %(empreendimento_id)s, %(numero)s, %(bloco)s, %(andar)s, %(tipologia_id)s,
-                                       %(area_privativa)s, %(area_total)s, %(valor_tabela)s, %(valor_venda)s, %(status)s, %(created_at)s, CURRENT_TIMESTAMP)
-                                ON CONFLICT (cvcrm_id)
-                                DO UPDATE SET
-                                    empreendimento_id = EXCLUDED.empreendimento_id,
-                                    numero = EXCLUDED.numero,
-                                    bloco = EXCLUDED.bloco,
-                                    andar = EXCLUDED.andar,
-                                    tipologia_id = EXCLUDED.tipologia_id,
-                                    area_privativa = EXCLUDED.area_privativa,
-                                    area_total = EXCLUDED.area_total,
-                                    valor_tabela = EXCLUDED.valor_tabela,
-                                    valor_venda = EXCLUDED.valor_venda,
-                                    status = EXCLUDED.status,
-                                    updated_at = CURRENT_TIMESTAMP
-                            """, unidade)
-                    conn.commit()
-                
-                total_records += len(unidades)
-                page += 1
-                
-                if total_records >= 1000:
-                    break
-            
+            total_records = self._sync_table('unidades', 1000)
             logging.info(f"Unidades sincronizadas: {total_records} registros")
             return total_records
             
@@ -739,41 +3702,7 @@ class ETLProcessor:
     def sync_prosoluto(self):
         """Sincroniza prosoluto"""
         try:
-            page = 1
-            total_records = 0
-            
-            while True:
-                data = self.api.get_prosoluto(page=page, per_page=50)
-                prosoluto_data = data.get('data', [])
-                
-                if not prosoluto_data:
-                    break
-                
-                with self.db.get_connection() as conn:
-                    with conn.cursor() as cursor:
-                        for prosoluto in prosoluto_data:
-                            cursor.execute("""
-                                INSERT INTO prosoluto (cvcrm_id, venda_id, empreendimento_id, corretor_id, valor_prosoluto,
-                                                     percentual_prosoluto, data_calculo, data_pagamento, status, created_at, updated_at)
-                                VALUES (%(id)s, %(venda_id)s, %(empreendimento_id)s, %(corretor_id)s, %(valor_prosoluto)s,
-                                       %(percentual_prosoluto)s, %(data_calculo)s, %(data_pagamento)s, %(status)s, %(created_at)s, CURRENT_TIMESTAMP)
-                                ON CONFLICT (cvcrm_id)
-                                DO UPDATE SET
-                                    valor_prosoluto = EXCLUDED.valor_prosoluto,
-                                    percentual_prosoluto = EXCLUDED.percentual_prosoluto,
-                                    data_calculo = EXCLUDED.data_calculo,
-                                    data_pagamento = EXCLUDED.data_pagamento,
-                                    status = EXCLUDED.status,
-                                    updated_at = CURRENT_TIMESTAMP
-                            """, prosoluto)
-                    conn.commit()
-                
-                total_records += len(prosoluto_data)
-                page += 1
-                
-                if total_records >= 1000:
-                    break
-            
+            total_records = self._sync_table('prosoluto', 1000)
             logging.info(f"Prosoluto sincronizado: {total_records} registros")
             return total_records
             
@@ -781,18 +3710,26 @@ class ETLProcessor:
             logging.error(f"Erro ao sincronizar prosoluto: {e}")
             return 0
     
-    def run_full_sync(self):
+    def run_reload(self):
+        """Reconstrói o banco a partir do arquivo de páginas (modo reload)"""
+        logging.info("Modo reload: recarregando páginas arquivadas, sem chamadas à API")
+        self.run_full_sync(force=True)
+    
+    def run_full_sync(self, force=False):
         """Executa sincronização completa focada em vendas"""
-        if not self.db.should_run_sync():
+        if not force and not self.db.should_run_sync():
             logging.info("Fora do horário de sincronização (economizando recursos)")
             return
         
         start_time = datetime.now()
         logging.info("Iniciando sincronização completa do CVCRM...")
+        run_id = None
         
         try:
             # Criar estrutura se não existir
             self.db.create_tables()
+            run_id = self.db.start_sync_run('completa' if self.record_limits else 'reload')
+            self._load_page_sizes()
             
             # Sincronizar dados base primeiro
             logging.info("Sincronizando dados base...")
@@ -802,9 +3739,10 @@ class ETLProcessor:
             logging.info("Sincronizando unidades...")
             unidades_count = self.sync_unidades()
             
-            # Sincronizar vendas reais (endpoint /reservas) - dados principais
-            logging.info("Sincronizando vendas reais (reservas)...")
-            vendas_count = self.sync_vendas_reais()
+            # Sincronizar vendas reais e reservas (uma única leitura de /reservas)
+            logging.info("Sincronizando vendas reais e reservas (/reservas)...")
+            reservas_counts = self.sync_reservas_fanout()
+            vendas_count = reservas_counts['vendas']
             
             # Sincronizar comissões das vendas
             logging.info("Sincronizando comissões...")
@@ -823,9 +3761,6 @@ class ETLProcessor:
                 logging.info("Sincronizando repasses...")
                 other_counts['repasses'] = self.sync_other_table('repasses')
                 
-                logging.info("Sincronizando reservas...")
-                other_counts['reservas'] = self.sync_other_table('reservas')
-                
             except Exception as e:
                 logging.warning(f"Erro ao sincronizar tabelas secundárias: {e}")
             
@@ -841,10 +3776,28 @@ class ETLProcessor:
             Prosoluto: {prosoluto_count}
             Atendimentos: {other_counts.get('atendimentos', 0)}
             Repasses: {other_counts.get('repasses', 0)}
-            Reservas: {other_counts.get('reservas', 0)}
+            Reservas: {reservas_counts['reservas']}
             """
             
             logging.info(summary)
+            self._save_page_sizes()
+            if self.api.circuit.is_open():
+                # Tabelas restantes falharam na hora: a execução não vira geração
+                error = "API indisponível (circuito aberto)"
+                logging.error(f"Sincronização incompleta: {error}")
+                self.db.finish_sync_run(run_id, 'erro', error=error, circuit=self.api.circuit.snapshot())
+                self.send_error_alert(error)
+                return
+            self.db.finish_sync_run(run_id, 'sucesso', circuit=self.api.circuit.snapshot(), records={
+                'empreendimentos': empreendimentos_count,
+                'unidades': unidades_count,
+                'vendas': vendas_count,
+                'reservas': reservas_counts['reservas'],
+                'comissoes': comissoes_count,
+                'prosoluto': prosoluto_count,
+                **other_counts
+            })
+            self.publish_dashboard(run_id)
             
             # Enviar alerta de sucesso
             self.send_success_alert(empreendimentos_count, vendas_count, prosoluto_count)
@@ -852,50 +3805,603 @@ class ETLProcessor:
         except Exception as e:
             error_msg = f"Erro na sincronização: {e}"
             logging.error(error_msg)
+            if run_id is not None:
+                self.db.finish_sync_run(run_id, 'erro', error=str(e), circuit=self.api.circuit.snapshot())
             self.send_error_alert(str(e))
             raise
     
-    def sync_other_table(self, table_name):
-        """Sincroniza tabelas secundárias de forma genérica"""
+    def run_scheduled_sync(self):
+        """Executa as tarefas vencidas da agenda adaptativa (chamado a cada tick)
+        
+        Substitui o sync completo a cada 4 horas: cada tarefa tem sua cadência
+        e o consumo de requisições fica dentro do orçamento diário do tenant.
+        Uma execução em que nenhuma tarefa mudou é registrada como
+        'sem_mudancas' e não gera nova geração do dashboard.
+        """
+        tick = self.start_scheduled_tick()
+        if tick is None:
+            return
         try:
-            if table_name == 'atendimentos':
-                return self._sync_generic_table(self.api.get_atendimentos, 'atendimentos', self._get_atendimentos_insert_query())
-            elif table_name == 'repasses':
-                return self._sync_generic_table(self.api.get_repasses, 'repasses', self._get_repasses_insert_query())
-            elif table_name == 'reservas':
-                return self._sync_generic_table(self.api.get_reservas, 'reservas', self._get_reservas_insert_query())
-            else:
-                return 0
+            for job in tick.pending:
+                self.run_scheduled_job(tick, job)
         except Exception as e:
-            logging.error(f"Erro ao sincronizar {table_name}: {e}")
-            return 0
+            self.finish_scheduled_tick(tick, error=e)
+            raise
+        self.finish_scheduled_tick(tick)
+    
+    def start_scheduled_tick(self):
+        """Planeja o tick: ScheduledTick com as tarefas a executar, ou None se nada venceu"""
+        now = datetime.now()
+        try:
+            if not self._tables_ready:
+                self.db.create_tables()
+                self._tables_ready = True
+            
+            state = self.schedule.state(self.db.load_sync_schedule())
+            intervals = self.schedule.plan(state)
+            used_today = self.db.requests_used(now.date())
+            due, deferred = self.schedule.due(state, intervals, now, self.schedule.daily_budget - used_today)
+            if deferred:
+                logging.info(f"Agenda: adiadas por orçamento diário: {', '.join(deferred)}")
+            if not due:
+                return None
+            if self.api.circuit.is_open():
+                logging.warning(f"Agenda: API indisponível (circuito aberto), tick adiado: {', '.join(due)}")
+                return None
+            
+            logging.info(f"Agenda: executando {', '.join(due)}")
+            run_id = self.db.start_sync_run('agendada')
+            self._load_page_sizes()
+        except Exception as e:
+            self._scheduled_error(None, e)
+            raise
+        
+        # Execução na ordem das dependências (a prioridade só decide quem entra no saldo)
+        pending = [job for job in self.sync_jobs() if job in due]
+        return ScheduledTick(run_id, state, pending, used_today, now)
     
-    def _sync_generic_table(self, api_method, table_name, insert_query):
-        """Método genérico para sincronização de tabelas"""
-        page = 1
-        total_records = 0
+    def run_scheduled_job(self, tick, job):
+        """Executa uma tarefa do tick e atualiza sua cadência
         
-        while True:
-            data = api_method(page=page, per_page=50)
-            records = data.get('data', [])
+        Com o circuito global aberto a tarefa nem começa; se houve falhas da
+        API durante a tarefa, ela não conta para a cadência e continua vencida.
+        """
+        if self.api.circuit.is_open():
+            logging.warning(f"Agenda: {job} adiada (circuito da API aberto)")
+            tick.incomplete.append(job)
+            return
+        
+        self.page_digest.reset()
+        requests_before = self.api.rate_limiter.requests
+        errors_before = self.api.circuit.errors
+        result = self.sync_jobs()[job]()
+        digest = None
+        if self.api.circuit.errors == errors_before:
+            try:
+                digest = self._change_digest(job, tick.state[job]['digest'])
+            except requests.exceptions.RequestException as e:
+                logging.warning(f"Agenda: {job} sem resumo de mudança: {e}")
+        requests_used = self.api.rate_limiter.requests - requests_before
+        
+        self.db.add_requests_used(tick.started.date(), requests_used)
+        tick.used_today += requests_used
+        tick.counts.update(result if isinstance(result, dict) else {job: result})
+        if digest is None:
+            logging.warning(f"Agenda: {job} incompleta (falhas na API), continua vencida")
+            tick.incomplete.append(job)
+        elif self.schedule.observe(tick.state[job], digest, requests_used, datetime.now()):
+            tick.changed.append(job)
+            for dependent in self.CHANGE_DEPENDENTS.get(job, ()):
+                if dependent not in tick.pending:
+                    logging.info(f"Agenda: {job} mudou, {dependent} entra no tick")
+                    tick.pending.append(dependent)
+    
+    def _change_digest(self, job, previous):
+        """Resumo de mudança da tarefa sobre todo o intervalo de dados da API
+        
+        O PageDigest só cobre as páginas lidas, que param no limite de
+        registros da execução. O resumo junta a ele sinais baratos do
+        intervalo todo, com requisições de 1 registro: o total_de_registros do
+        endpoint e, nos endpoints com filtro de data, quantos registros têm
+        data de referência a partir de uma marca (registro alterado ganha data
+        de referência nova e entra na contagem). A marca fica no próprio resumo
+        (total:marca:contagem:páginas) e só avança para hoje quando há mudança,
+        então execuções sem mudança comparam a mesma contagem. Sem total na
+        resposta da API o resumo é só o das páginas lidas.
+        """
+        total = self.api.count(job)
+        if total is None:
+            return self.page_digest.hexdigest()
+        pages = f"{self.page_digest.total >> 32:08x}"
+        if job not in DATE_FILTER_ENDPOINTS:
+            return f"{total}::{pages}"
+        
+        today = date.today().isoformat()
+        parts = (previous or '').split(':')
+        mark = parts[1] if len(parts) == 4 and parts[1] else today
+        digest = f"{total}:{mark}:{self.api.count(job, date_from=mark)}:{pages}"
+        if digest != previous and mark != today:
+            digest = f"{total}:{today}:{self.api.count(job, date_from=today)}:{pages}"
+        return digest
+    
+    def finish_scheduled_tick(self, tick, error=None):
+        """Fecha o tick no etl_sync_runs e publica o dashboard se algo mudou"""
+        if error is not None:
+            self._scheduled_error(tick.run_id, error)
+            return
+        error = None
+        if tick.incomplete:
+            error = f"tarefas incompletas por falha da API: {', '.join(tick.incomplete)}"
+        if tick.changed:
+            status = 'sucesso'
+        else:
+            status = 'erro' if error else 'sem_mudancas'
+        try:
+            self._save_page_sizes()
+            self.db.save_sync_schedule(tick.state)
+            self.db.finish_sync_run(tick.run_id, status, tick.counts, error=error, circuit=self.api.circuit.snapshot())
+        except Exception as e:
+            self._scheduled_error(tick.run_id, e)
+            raise
+        if tick.changed:
+            self.publish_dashboard(tick.run_id)
+        if error:
+            self.send_error_alert(error)
+        
+        logging.info(f"Agenda: {len(tick.pending)} tarefas em {datetime.now() - tick.started}, "
+                     f"com mudança: {', '.join(tick.changed) or 'nenhuma'}"
+                     f"{', incompletas: ' + ', '.join(tick.incomplete) if tick.incomplete else ''}")
+        for line in self.schedule.report(tick.state, self.schedule.plan(tick.state), datetime.now(), tick.used_today):
+            logging.info(f"Agenda {line}")
+    
+    def _scheduled_error(self, run_id, error):
+        logging.error(f"Erro na sincronização agendada: {error}")
+        if run_id is not None:
+            try:
+                self.db.finish_sync_run(run_id, 'erro', error=str(error), circuit=self.api.circuit.snapshot())
+            except Exception as e:
+                logging.error(f"Não foi possível registrar o erro da execução {run_id}: {e}")
+        self.send_error_alert(str(error))
+    
+    def schedule_report(self):
+        """Defasagem esperada de cada tarefa com a agenda atual"""
+        self.db.create_tables()
+        state = self.schedule.state(self.db.load_sync_schedule())
+        now = datetime.now()
+        return self.schedule.report(state, self.schedule.plan(state), now, self.db.requests_used(now.date()))
+    
+    def run_targeted_sync(self, jobs, since=None, max_pages=None, dry_run=False):
+        """Sincroniza agora só as tarefas pedidas (comando `sync` e `bench`)
+        
+        `since` filtra por data de referência os endpoints que aceitam o filtro,
+        `max_pages` limita as páginas lidas por endpoint e `dry_run` busca e
+        transforma sem gravar nada. A agenda adaptativa não é alterada (a
+        leitura pode ser parcial); as requisições contam no orçamento do dia.
+        Retorna True se todas as tarefas terminaram sem falha.
+        """
+        ignored = [job for job in jobs if job not in DATE_FILTER_ENDPOINTS]
+        if since is not None and ignored:
+            logging.warning(f"--desde não se aplica a {', '.join(ignored)} (leitura completa)")
+        self.since, self.max_pages, self.timings = since, max_pages, SyncTimings()
+        run_id = None
+        counts, failed = {}, []
+        
+        try:
+            if not dry_run:
+                self.db.create_tables()
+                run_id = self.db.start_sync_run('parcial')
+            self._load_page_sizes()
+            requests_start = self.api.rate_limiter.requests
             
-            if not records:
-                break
+            for job in jobs:
+                if self.api.circuit.is_open():
+                    logging.warning(f"{job}: não executada (circuito da API aberto)")
+                    failed.append(job)
+                    continue
+                logging.info(f"Sincronizando {job}{' (dry-run)' if dry_run else ''}...")
+                requests_before = self.api.rate_limiter.requests
+                errors_before = self.api.circuit.errors
+                self.page_digest.reset()
+                try:
+                    result = self._dry_run_job(job) if dry_run else self.sync_jobs()[job]()
+                except Exception as e:
+                    logging.error(f"Erro ao processar {job}: {e}")
+                    failed.append(job)
+                    result = {}
+                else:
+                    if self.api.circuit.errors > errors_before:
+                        failed.append(job)
+                counts.update(result if isinstance(result, dict) else {job: result})
+                self.timings.add_requests(job, self.api.rate_limiter.requests - requests_before)
             
-            with self.db.get_connection() as conn:
-                with conn.cursor() as cursor:
-                    for record in records:
-                        cursor.execute(insert_query, record)
-                conn.commit()
+            if self.record_limits:
+                try:
+                    self.db.add_requests_used(date.today(), self.api.rate_limiter.requests - requests_start)
+                except Exception as e:
+                    logging.warning(f"Não foi possível registrar o consumo de requisições: {e}")
             
-            total_records += len(records)
-            page += 1
+            if run_id is not None:
+                self._save_page_sizes()
+                error = f"tarefas com falha: {', '.join(failed)}" if failed else None
+                self.db.finish_sync_run(run_id, 'erro' if failed else 'sucesso', counts,
+                                        error=error, circuit=self.api.circuit.snapshot())
+                if not failed:
+                    self.publish_dashboard(run_id)
+        except Exception as e:
+            logging.error(f"Erro na sincronização dirigida: {e}")
+            if run_id is not None:
+                self.db.finish_sync_run(run_id, 'erro', error=str(e), circuit=self.api.circuit.snapshot())
+            raise
+        finally:
+            self.since = self.max_pages = None
+        
+        logging.info(f"Sincronização dirigida: {counts}{', com falha: ' + ', '.join(failed) if failed else ''}")
+        return not failed
+    
+    def _dry_run_job(self, job):
+        """Busca e transforma as páginas da tarefa sem gravar; retorna {tabela: registros}"""
+        counts = dict.fromkeys(ENDPOINT_TABLES[job], 0)
+        for records in self._pages(job):
+            for table in counts:
+                counts[table] += len(self.transformer.records(table, records))
+        return counts
+    
+    def reconcile(self, jobs=None, force=False):
+        """Conciliação por conjunto de ids: marca registros excluídos ou cancelados no CVCRM
+        
+        Lista os ids de cada endpoint (paginação com o maior tamanho de página,
+        sem gravar nem transformar o resto do registro) num IdSet e compara com
+        os cvcrm_id do banco, lidos em lotes. Os ausentes na API recebem
+        excluido_em (em vendas também ativo='N': venda cancelada ou excluída);
+        os marcados que voltaram à API perdem a marca. Endpoints com listagem
+        incompleta (erro da API ou orçamento do dia esgotado) não são
+        conciliados, e uma tabela em que as exclusões passariam de
+        ETL_CONCILIACAO_MAX_PERCENTUAL dos registros só é marcada com `force`.
+        Retorna True se todas as tabelas foram conciliadas.
+        """
+        import numpy as np
+        
+        self.db.create_tables()
+        self._load_page_sizes()
+        jobs = [job for job in (jobs or self.sync_jobs())
+                if any(table in TOMBSTONE_TABLES for table in ENDPOINT_TABLES[job])]
+        max_fraction = float(os.getenv('ETL_CONCILIACAO_MAX_PERCENTUAL', '5')) / 100
+        # Só as colunas que decidem o conjunto (id e, em vendas, o filtro de venda confirmada)
+        id_transformer = PageTransformer({
+            table: {column: kind for column, kind in RECORD_SCHEMAS[table].items()
+                    if column in ('id', 'ativo', 'data_venda')}
+            for table in TOMBSTONE_TABLES
+        })
+        run_id = self.db.start_sync_run('conciliacao')
+        remaining = self.schedule.daily_budget - self.db.requests_used(date.today()) if self.record_limits else None
+        requests_start = self.api.rate_limiter.requests
+        results, failed, changed = {}, [], False
+        
+        for job in jobs:
+            tables = [table for table in ENDPOINT_TABLES[job] if table in TOMBSTONE_TABLES]
+            id_sets = {table: IdSet() for table in tables}
+            errors_before = self.api.circuit.errors
+            try:
+                for records in self.api.iter_pages(job):
+                    for table, id_set in id_sets.items():
+                        id_set.add(id_transformer.frame(table, records)['id'].to_numpy(dtype='int64'))
+                    if remaining is not None and self.api.rate_limiter.requests - requests_start >= remaining:
+                        raise RuntimeError("orçamento diário de requisições esgotado")
+            except Exception as e:
+                logging.error(f"Conciliação {job}: listagem incompleta, nada marcado ({e})")
+                failed.append(job)
+                continue
+            if self.api.circuit.errors > errors_before:
+                logging.error(f"Conciliação {job}: falhas da API na listagem, nada marcado")
+                failed.append(job)
+                continue
             
-            if total_records >= 500:  # Limite para tabelas secundárias
-                break
+            for table, id_set in id_sets.items():
+                id_set.freeze()
+                deleted, restored = [], []
+                live = matched = 0
+                for rows in self.db.iter_ids(table):
+                    ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+                    marked = np.fromiter((row[1] for row in rows), dtype=bool, count=len(rows))
+                    present = id_set.contains(ids)
+                    deleted.append(ids[~present & ~marked])
+                    restored.append(ids[present & marked])
+                    live += int((~marked).sum())
+                    matched += int(present.sum())
+                deleted = np.concatenate(deleted) if deleted else np.empty(0, dtype=np.int64)
+                restored = np.concatenate(restored) if restored else np.empty(0, dtype=np.int64)
+                missing = id_set.count - matched
+                
+                if len(deleted) > max_fraction * live and not force:
+                    logging.error(f"Conciliação {table}: {len(deleted)} de {live} registros sumiram da API "
+                                  f"(acima de {max_fraction * 100:g}%), nada marcado; confira e use --forcar")
+                    failed.append(table)
+                    continue
+                self.db.apply_tombstones(table, deleted, restored)
+                changed = changed or bool(len(deleted) or len(restored))
+                results[table] = len(deleted) + len(restored)
+                logging.info(f"Conciliação {table}: {id_set.count} ids na API ({id_set.nbytes / 1024:.0f} KB), "
+                             f"{len(deleted)} excluídos, {len(restored)} restaurados, "
+                             f"{missing} ainda não sincronizados")
+        
+        if self.record_limits:
+            self.db.add_requests_used(date.today(), self.api.rate_limiter.requests - requests_start)
+        self._save_page_sizes()
+        error = f"não conciliadas: {', '.join(failed)}" if failed else None
+        self.db.finish_sync_run(run_id, 'erro' if failed else ('sucesso' if changed else 'sem_mudancas'),
+                                results, error=error, circuit=self.api.circuit.snapshot())
+        if changed:
+            self.publish_dashboard(run_id)
+        if failed:
+            self.send_error_alert(f"Conciliação por ids: {error}")
+        return not failed
+    
+    def explain(self, jobs, since=None, max_pages=None):
+        """Requisições planejadas por tarefa para um sync dirigido, sem chamar a API
+        
+        A base é o custo aprendido pela agenda (média das últimas execuções
+        completas); `max_pages` limita e `since` reduz esse custo.
+        """
+        self.db.create_tables()
+        self._load_page_sizes()
+        now = datetime.now()
+        state = self.schedule.state(self.db.load_sync_schedule())
+        intervals = self.schedule.plan(state)
+        remaining = self.schedule.daily_budget - self.db.requests_used(now.date())
+        lines = []
+        total = 0
+        
+        for job in jobs:
+            entry = state[job]
+            planned = round(self.schedule.cost(entry))
+            if entry['custo_requisicoes'] is None:
+                notes = [f"sem histórico, custo padrão {planned} req"]
+            else:
+                notes = [f"custo aprendido ~{entry['custo_requisicoes']:.0f} req"]
+            bound = ''
+            if since is not None:
+                if job in DATE_FILTER_ENDPOINTS:
+                    bound = '≤'
+                    notes.append(f"filtro a partir de {since.isoformat()}")
+                else:
+                    notes.append("sem filtro de data (leitura completa)")
+            if max_pages is not None and max_pages < planned:
+                planned = max_pages
+                bound = '≤'
+                notes.append("limitado por --paginas")
+            if self.schedule.overdue(entry, intervals[job], now) >= 1:
+                notes.append("vencida na agenda")
+            else:
+                next_run = entry['ultima_execucao'] + timedelta(minutes=intervals[job])
+                notes.append(f"próxima na agenda em {timedelta(seconds=int((next_run - now).total_seconds()))}")
+            total += planned
+            lines.append(f"{job} ({', '.join(ENDPOINT_TABLES[job])}): {bound}{planned} req, "
+                         f"página de {self.api.page_sizes.size(job)} registros; {'; '.join(notes)}")
+        
+        duration = timedelta(seconds=int(total * self.tenant.min_interval))
+        lines.append(f"Total: até {total} requisições (~{duration} com {self.tenant.min_interval:g}s entre "
+                     f"requisições); saldo do dia: {remaining} de {self.schedule.daily_budget}")
+        if total > remaining:
+            lines.append("Atenção: o plano passa do saldo do dia; a agenda adia tarefas até o orçamento renovar")
+        return lines
+    
+    def enable_queue(self):
+        """Modo fila: WorkQueue do tenant e rate limit compartilhado entre réplicas"""
+        self.db.create_tables()
+        self._tables_ready = True
+        self.queue = WorkQueue(self.db, circuit=self.api.circuit)
+        requests_so_far = self.api.rate_limiter.requests
+        self.api.rate_limiter = SharedRateLimiter(self.db, self.tenant.min_interval)
+        self.api.rate_limiter.requests = requests_so_far
+        self._load_page_sizes()
+    
+    def enqueue_scheduled(self):
+        """Enfileira as tarefas vencidas da agenda como um lote; retorna o id ou None"""
+        now = datetime.now()
+        state = self.schedule.state(self.db.load_sync_schedule())
+        intervals = self.schedule.plan(state)
+        remaining = self.schedule.daily_budget - self.db.requests_used(now.date())
+        due, deferred = self.schedule.due(state, intervals, now, remaining)
+        if deferred:
+            logging.info(f"Agenda: adiadas por orçamento diário: {', '.join(deferred)}")
+        if not due:
+            return None
+        return self.queue.enqueue('fila', [('agenda', job, None, None, self.JOB_STAGES[job]) for job in due])
+    
+    def enqueue_backfill(self, endpoints, date_start, date_end, window_days=30):
+        """Enfileira as janelas pendentes do backfill para as réplicas do worker"""
+        self.db.create_tables()
+        checkpoints = self.db.load_backfill_checkpoints()
+        tasks = []
+        for endpoint in endpoints:
+            self._backfill_sinks(endpoint)  # valida o endpoint antes de enfileirar
+            for window_start, window_end in split_date_windows(date_start, date_end, window_days):
+                checkpoint = checkpoints.get((endpoint, window_start, window_end))
+                if not (checkpoint and checkpoint['status'] == 'concluida'):
+                    tasks.append(('janela', endpoint, window_start, window_end, 0))
+        if not tasks:
+            logging.info("Backfill: todas as janelas já concluídas")
+            return None
+        return WorkQueue(self.db).enqueue('backfill', tasks)
+    
+    def run_next_task(self):
+        """Reivindica e executa uma tarefa da fila; False se a fila está vazia"""
+        if self.api.circuit.is_open():
+            return False  # API fora do ar: as tarefas esperam na fila
+        task = self.queue.claim()
+        if task is None:
+            return False
+        
+        label = task['tarefa'] if task['tipo'] == 'agenda' else \
+            f"{task['tarefa']} {task['janela_inicio']}..{task['janela_fim']}"
+        logging.info(f"Fila: tarefa {task['id']} ({label}), tentativa {task['tentativas']}")
+        try:
+            with self.queue.leased(task):
+                records, changed, requests = self.run_queue_task(task)
+        except Exception as e:
+            logging.error(f"Fila: tarefa {task['id']} ({label}) falhou: {e}")
+            closed = self.queue.fail(task, e)
+        else:
+            closed = self.queue.complete(task, records, changed, requests)
         
-        logging.info(f"{table_name.title()} sincronizada: {total_records} registros")
-        return total_records
+        if closed:
+            lote, status = closed
+            logging.info(f"Fila: lote {lote} concluído ({status})")
+            if status == 'sucesso':
+                self.publish_dashboard(lote)
+            elif status == 'erro':
+                self.send_error_alert(f"lote {lote} terminou com tarefas que falharam")
+        return True
+    
+    def run_queue_task(self, task):
+        """Executa uma tarefa da fila; retorna (registros, mudou, requisições)"""
+        requests_before = self.api.rate_limiter.requests
+        
+        if task['tipo'] == 'agenda':
+            job = task['tarefa']
+            self.page_digest.reset()
+            errors_before = self.api.circuit.errors
+            result = self.sync_jobs()[job]()
+            if self.api.circuit.errors > errors_before:
+                self.db.add_requests_used(date.today(), self.api.rate_limiter.requests - requests_before)
+                raise RuntimeError(f"{job} incompleta por falhas da API")
+            # Estado relido por tarefa: outras réplicas atualizam as demais linhas
+            state = self.schedule.state(self.db.load_sync_schedule())
+            try:
+                digest = self._change_digest(job, state[job]['digest'])
+            except Exception:
+                self.db.add_requests_used(date.today(), self.api.rate_limiter.requests - requests_before)
+                raise
+            requests = self.api.rate_limiter.requests - requests_before
+            changed = self.schedule.observe(state[job], digest, requests, datetime.now())
+            self.db.save_sync_schedule({job: state[job]})
+            records = result if isinstance(result, dict) else {job: result}
+            dependents = self.CHANGE_DEPENDENTS.get(job, ()) if changed else ()
+            if dependents:
+                # Já na fila (ex: etapa seguinte do mesmo lote): o enqueue ignora
+                logging.info(f"Fila: {job} mudou, enfileirando {', '.join(dependents)}")
+                self.queue.enqueue('fila', [('agenda', dependent, None, None, self.JOB_STAGES[dependent])
+                                            for dependent in dependents])
+        elif task['tipo'] == 'janela':
+            endpoint, window_start, window_end = task['tarefa'], task['janela_inicio'], task['janela_fim']
+            checkpoint = self.db.load_backfill_checkpoints().get((endpoint, window_start, window_end))
+            total = self._backfill_window(endpoint, window_start, window_end, checkpoint, BackfillProgress(1))
+            requests = self.api.rate_limiter.requests - requests_before
+            changed = True
+            records = {endpoint: total}
+        else:
+            raise ValueError(f"Tipo de tarefa desconhecido: {task['tipo']}")
+        
+        self.db.add_requests_used(date.today(), requests)
+        self._save_page_sizes()
+        return records, changed, requests
+    
+    def publish_dashboard(self, generation):
+        """Publica o dashboard pré-renderizado da geração recém-concluída
+        
+        Falhas aqui não derrubam a sincronização: o dashboard volta a renderizar
+        ao vivo até a próxima publicação.
+        """
+        try:
+            from monitoring import publish_snapshot
+            publish_snapshot(generation, schema=self.db.schema)
+        except Exception as e:
+            logging.warning(f"Falha ao publicar snapshot do dashboard: {e}")
+    
+    def sync_other_table(self, table_name):
+        """Sincroniza tabelas secundárias de forma genérica"""
+        try:
+            if table_name not in ('atendimentos', 'repasses', 'reservas'):
+                return 0
+            total_records = self._sync_table(table_name, 500)  # Limite para tabelas secundárias
+            logging.info(f"{table_name.title()} sincronizada: {total_records} registros")
+            return total_records
+        except Exception as e:
+            logging.error(f"Erro ao sincronizar {table_name}: {e}")
+            return 0
+    
+    def _get_empreendimentos_insert_query(self):
+        """Query de inserção para empreendimentos"""
+        return """
+            INSERT INTO empreendimentos (cvcrm_id, nome, endereco, cidade, estado, cep, status, vgv, data_lancamento, created_at, updated_at)
+            VALUES (%(id)s, %(nome)s, %(endereco)s, %(cidade)s, %(estado)s, %(cep)s, %(status)s, %(vgv)s, %(data_lancamento)s, %(created_at)s, CURRENT_TIMESTAMP)
+            ON CONFLICT (cvcrm_id) 
+            DO UPDATE SET
+                nome = EXCLUDED.nome,
+                endereco = EXCLUDED.endereco,
+                cidade = EXCLUDED.cidade,
+                estado = EXCLUDED.estado,
+                cep = EXCLUDED.cep,
+                status = EXCLUDED.status,
+                vgv = EXCLUDED.vgv,
+                data_lancamento = EXCLUDED.data_lancamento,
+                excluido_em = NULL,
+                updated_at = CURRENT_TIMESTAMP
+        """
+    
+    def _get_unidades_insert_query(self):
+        """Query de inserção para unidades"""
+        return """
+            INSERT INTO unidades (cvcrm_id, empreendimento_id, numero, bloco, andar, tipologia_id,
+                                area_privativa, area_total, valor_tabela, valor_venda, status, created_at, updated_at)
+            VALUES (%(id)s, %(empreendimento_id)s, %(numero)s, %(bloco)s, %(andar)s, %(tipologia_id)s,
+                   %(area_privativa)s, %(area_total)s, %(valor_tabela)s, %(valor_venda)s, %(status)s, %(created_at)s, CURRENT_TIMESTAMP)
+            ON CONFLICT (cvcrm_id)
+            DO UPDATE SET
+                empreendimento_id = EXCLUDED.empreendimento_id,
+                numero = EXCLUDED.numero,
+                bloco = EXCLUDED.bloco,
+                andar = EXCLUDED.andar,
+                tipologia_id = EXCLUDED.tipologia_id,
+                area_privativa = EXCLUDED.area_privativa,
+                area_total = EXCLUDED.area_total,
+                valor_tabela = EXCLUDED.valor_tabela,
+                valor_venda = EXCLUDED.valor_venda,
+                status = EXCLUDED.status,
+                excluido_em = NULL,
+                updated_at = CURRENT_TIMESTAMP
+        """
+    
+    def _get_prosoluto_insert_query(self):
+        """Query de inserção para prosoluto"""
+        return """
+            INSERT INTO prosoluto (cvcrm_id, venda_id, empreendimento_id, corretor_id, valor_prosoluto,
+                                 percentual_prosoluto, data_calculo, data_pagamento, status, created_at, updated_at)
+            VALUES (%(id)s, %(venda_id)s, %(empreendimento_id)s, %(corretor_id)s, %(valor_prosoluto)s,
+                   %(percentual_prosoluto)s, %(data_calculo)s, %(data_pagamento)s, %(status)s, %(created_at)s, CURRENT_TIMESTAMP)
+            ON CONFLICT (cvcrm_id)
+            DO UPDATE SET
+                valor_prosoluto = EXCLUDED.valor_prosoluto,
+                percentual_prosoluto = EXCLUDED.percentual_prosoluto,
+                data_calculo = EXCLUDED.data_calculo,
+                data_pagamento = EXCLUDED.data_pagamento,
+                status = EXCLUDED.status,
+                excluido_em = NULL,
+                updated_at = CURRENT_TIMESTAMP
+        """
+    
+    def _get_vendas_insert_query(self):
+        """Query para inserir vendas (reservas com venda confirmada)"""
+        return """
+            INSERT INTO vendas (cvcrm_id, reserva_id, empreendimento, unidade_id, 
+                              corretor, time_corretor, cliente, valor, data_venda, 
+                              ativo, status, vgv, created_at, updated_at)
+            VALUES (%(id)s, %(reserva_id)s, %(empreendimento)s, %(unidade_id)s,
+                   %(corretor)s, %(time_corretor)s, %(cliente)s, %(valor)s, %(data_venda)s,
+                   %(ativo)s, 'Vendido', %(valor)s, %(created_at)s, CURRENT_TIMESTAMP)
+            ON CONFLICT (cvcrm_id, data_venda)
+            DO UPDATE SET
+                empreendimento = EXCLUDED.empreendimento,
+                corretor = EXCLUDED.corretor,
+                time_corretor = EXCLUDED.time_corretor,
+                cliente = EXCLUDED.cliente,
+                valor = EXCLUDED.valor,
+                data_venda = EXCLUDED.data_venda,
+                ativo = EXCLUDED.ativo,
+                vgv = EXCLUDED.vgv,
+                excluido_em = NULL,
+                updated_at = CURRENT_TIMESTAMP
+        """
     
     def _get_atendimentos_insert_query(self):
         """Query para inserir atendimentos"""
@@ -906,7 +4412,7 @@ class ETLProcessor:
             VALUES (%(id)s, %(corretor_id)s, %(corretor_nome)s, %(grupo_corretor)s, %(time_corretor)s,
                    %(cliente_nome)s, %(cliente_email)s, %(cliente_telefone)s, %(empreendimento_id)s,
                    %(data_atendimento)s, %(tipo_atendimento)s, %(status)s, %(created_at)s, CURRENT_TIMESTAMP)
-            ON CONFLICT (cvcrm_id) DO UPDATE SET
+            ON CONFLICT (cvcrm_id, data_atendimento) DO UPDATE SET
                 corretor_nome = EXCLUDED.corretor_nome,
                 grupo_corretor = EXCLUDED.grupo_corretor,
                 time_corretor = EXCLUDED.time_corretor,
@@ -916,6 +4422,7 @@ class ETLProcessor:
                 data_atendimento = EXCLUDED.data_atendimento,
                 tipo_atendimento = EXCLUDED.tipo_atendimento,
                 status = EXCLUDED.status,
+                excluido_em = NULL,
                 updated_at = CURRENT_TIMESTAMP
         """
     
@@ -933,6 +4440,7 @@ class ETLProcessor:
                 data_pagamento = EXCLUDED.data_pagamento,
                 status = EXCLUDED.status,
                 observacoes = EXCLUDED.observacoes,
+                excluido_em = NULL,
                 updated_at = CURRENT_TIMESTAMP
         """
     
@@ -943,7 +4451,7 @@ class ETLProcessor:
                                 cliente_nome, data_reserva, data_vencimento, status, created_at, updated_at)
             VALUES (%(id)s, %(empreendimento_id)s, %(unidade_id)s, %(corretor_id)s, %(corretor_nome)s,
                    %(cliente_nome)s, %(data_reserva)s, %(data_vencimento)s, %(status)s, %(created_at)s, CURRENT_TIMESTAMP)
-            ON CONFLICT (cvcrm_id) DO UPDATE SET
+            ON CONFLICT (cvcrm_id, data_reserva) DO UPDATE SET
                 empreendimento_id = EXCLUDED.empreendimento_id,
                 unidade_id = EXCLUDED.unidade_id,
                 corretor_nome = EXCLUDED.corretor_nome,
@@ -951,12 +4459,13 @@ class ETLProcessor:
                 data_reserva = EXCLUDED.data_reserva,
                 data_vencimento = EXCLUDED.data_vencimento,
                 status = EXCLUDED.status,
+                excluido_em = NULL,
                 updated_at = CURRENT_TIMESTAMP
         """
     
     def send_success_alert(self, empreendimentos, vendas, prosoluto):
         """Envia alerta de sincronização bem-sucedida focada em vendas"""
-        if not all([os.getenv('ALERT_EMAIL_USER'), os.getenv('ALERT_EMAIL_PASSWORD')]):
+        if not self.alerts.enabled:
             return
         
         try:
@@ -985,8 +4494,8 @@ class ETLProcessor:
             logging.error(f"Erro ao enviar alerta de sucesso: {e}")
     
     def send_error_alert(self, error):
-        """Envia alerta de erro"""
-        if not all([os.getenv('ALERT_EMAIL_USER'), os.getenv('ALERT_EMAIL_PASSWORD')]):
+        """Envia alerta de erro (erros repetidos são agrupados pela fila)"""
+        if not self.alerts.enabled:
             return
         
         try:
@@ -1000,57 +4509,249 @@ class ETLProcessor:
             Verifique os logs para mais detalhes.
             """
             
-            self.send_email(subject, message)
+            self.send_email(subject, message, coalesce_key=f"erro:{error}")
             
         except Exception as e:
             logging.error(f"Erro ao enviar alerta de erro: {e}")
     
-    def send_email(self, subject, message):
-        """Envia email usando Gmail"""
-        smtp_server = "smtp.gmail.com"
-        smtp_port = 587
-        
-        email_user = os.getenv('ALERT_EMAIL_USER')
-        email_password = os.getenv('ALERT_EMAIL_PASSWORD')
-        email_to = os.getenv('ALERT_EMAIL_TO', email_user)
-        
-        msg = MIMEMultipart()
-        msg['From'] = email_user
-        msg['To'] = email_to
-        msg['Subject'] = subject
-        
-        msg.attach(MIMEText(message, 'plain'))
-        
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(email_user, email_password)
-        text = msg.as_string()
-        server.sendmail(email_user, email_to, text)
-        server.quit()
+    def send_email(self, subject, message, coalesce_key=None):
+        """Enfileira email para entrega em background (não bloqueia o sync)"""
+        if self.tenant.name:
+            subject = f"[{self.tenant.name}] {subject}"
+            coalesce_key = coalesce_key and f"{self.tenant.name}:{coalesce_key}"
+        return self.alerts.submit(subject, message, coalesce_key=coalesce_key)
+
+# Subcomandos da linha de comando (sem subcomando: agendador)
+COMMANDS = ('agendador', 'sync', 'explain', 'bench', 'conciliar', 'reload', 'backfill', 'desanexar-particoes', 'agenda')
+
+# Opções da linha de comando antiga -> subcomando equivalente
+LEGACY_FLAGS = {
+    '--reload': 'reload',
+    '--backfill': 'backfill',
+    '--desanexar-particoes': 'desanexar-particoes',
+    '--agenda': 'agenda'
+}
+
+def _legacy_argv(argv):
+    """Traduz a linha de comando antiga (--reload, --backfill, ...) para subcomandos"""
+    if argv[:1] in (['-h'], ['--help']):
+        return argv
+    for index, token in enumerate(argv):
+        flag, _, value = token.partition('=')
+        if flag in LEGACY_FLAGS:
+            logging.warning(f"Opção {flag} obsoleta: use 'python main.py {LEGACY_FLAGS[flag]}'")
+            return [LEGACY_FLAGS[flag]] + argv[:index] + ([value] if value else []) + argv[index + 1:]
+    if not any(token in COMMANDS for token in argv):
+        return ['agendador'] + argv
+    return argv
+
+def _name_list(value):
+    return [name.strip().lower() for name in value.split(',') if name.strip()]
+
+def parse_args(argv=None):
+    argv = _legacy_argv(sys.argv[1:] if argv is None else list(argv))
+    parser = argparse.ArgumentParser(description='CVCRM ETL - sincronização CVDW -> PostgreSQL',
+                                     epilog='Sem subcomando executa o agendador (worker contínuo).')
+    commands = parser.add_subparsers(dest='comando', metavar='COMANDO')
+    
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--tenant', metavar='NOME',
+                        help='executa só este tenant de CVCRM_TENANTS (obrigatório nos comandos de um tenant com vários)')
+    selection = argparse.ArgumentParser(add_help=False)
+    selection.add_argument('--tabelas', '--tables', type=_name_list, metavar='LISTA',
+                           help='tabelas ou endpoints separados por vírgula, ex: vendas,unidades (padrão: todas)')
+    selection.add_argument('--paginas', '--pages', type=int, metavar='N', help='lê no máximo N páginas por endpoint')
+    queue_mode = argparse.ArgumentParser(add_help=False)
+    queue_mode.add_argument('--fila', action='store_true',
+                            default=os.getenv('ETL_FILA', '').lower() in ('1', 'true', 'sim'),
+                            help='modo fila (etl_tarefas): várias réplicas dividem o sync; no backfill só enfileira')
+    
+    commands.add_parser('agendador', parents=[common, queue_mode],
+                        help='worker contínuo: executa as tarefas vencidas da agenda adaptativa (padrão)')
+    
+    sync = commands.add_parser('sync', parents=[common, selection], help='sincroniza agora só as tabelas pedidas')
+    sync.add_argument('--desde', '--since', type=date.fromisoformat, metavar='AAAA-MM-DD',
+                      help='só registros com data de referência a partir desta data (endpoints com filtro)')
+    sync.add_argument('--dry-run', action='store_true', help='busca e transforma sem gravar no banco')
+    
+    explain = commands.add_parser('explain', parents=[common, selection],
+                                  help='mostra as requisições planejadas por tabela, sem chamar a API')
+    explain.add_argument('--desde', '--since', type=date.fromisoformat, metavar='AAAA-MM-DD')
+    
+    bench = commands.add_parser('bench', parents=[common, selection],
+                                help='mede busca, transformação e carga com páginas gravadas ou sintéticas')
+    bench.add_argument('--arquivo', metavar='DIR', help='páginas gravadas (PageArchive); padrão: fonte sintética')
+    bench.add_argument('--registros', type=int, default=5000, help='registros por endpoint da fonte sintética')
+    bench.add_argument('--carregar', action='store_true',
+                       help='também grava no banco (use um banco de teste); padrão: só busca e transforma')
+    
+    reconcile = commands.add_parser('conciliar', parents=[common],
+                                    help='marca registros excluídos ou cancelados no CVCRM (conjunto de ids)')
+    reconcile.add_argument('--tabelas', '--tables', type=_name_list, metavar='LISTA',
+                           help='tabelas ou endpoints separados por vírgula (padrão: todas com id)')
+    reconcile.add_argument('--forcar', action='store_true',
+                           help='marca mesmo acima de ETL_CONCILIACAO_MAX_PERCENTUAL (exclusão em massa)')
+    
+    reload = commands.add_parser('reload', parents=[common],
+                                 help='recarrega o banco a partir do arquivo de páginas, sem chamar a API')
+    reload.add_argument('diretorio', nargs='?', default='', help='arquivo de páginas (padrão: CVDW_ARCHIVE_DIR)')
+    
+    backfill = commands.add_parser('backfill', parents=[common, queue_mode],
+                                   help='carga histórica em janelas de data')
+    backfill.add_argument('endpoints', type=_name_list, help='ex: reservas,atendimentos,repasses')
+    backfill.add_argument('--desde', type=date.fromisoformat, required=True, help='início do backfill (AAAA-MM-DD)')
+    backfill.add_argument('--ate', type=date.fromisoformat, default=date.today() + timedelta(days=1),
+                          help='fim exclusivo do backfill (padrão: amanhã)')
+    backfill.add_argument('--janela-dias', type=int, default=30, help='tamanho das janelas do backfill')
+    backfill.add_argument('--paralelo', type=int, default=3, help='janelas buscadas em paralelo')
+    
+    detach = commands.add_parser('desanexar-particoes', parents=[common],
+                                 help='desanexa partições mensais antigas (arquivamento)')
+    detach.add_argument('meses', type=int, help='mantém anexadas as partições dos últimos MESES meses')
+    
+    commands.add_parser('agenda', parents=[common],
+                        help='mostra cadência, custo e defasagem esperada de cada tabela e sai')
+    return parser.parse_args(argv)
+
+def select_tenants(name=None):
+    """Tenants configurados, ou só o de nome `name`"""
+    tenants = Tenant.from_env()
+    if name is None:
+        return tenants
+    selected = [tenant for tenant in tenants if tenant.name == name.lower()]
+    if not selected:
+        raise SystemExit(f"Tenant {name} não está em CVCRM_TENANTS")
+    return selected
+
+def single_tenant(name=None):
+    """Tenant único para comandos de manutenção (reload, backfill, partições)"""
+    tenants = select_tenants(name)
+    if len(tenants) > 1:
+        raise SystemExit("Vários tenants configurados: informe --tenant NOME")
+    return tenants[0]
 
 def main():
-    """Função principal - inicia o agendador"""
+    """Função principal - executa o subcomando (padrão: agendador)"""
+    args = parse_args()
+    
+    if args.comando == 'reload':
+        archive_dir = args.diretorio or os.getenv('CVDW_ARCHIVE_DIR')
+        if not archive_dir:
+            raise SystemExit("Informe o diretório do arquivo (reload DIR ou CVDW_ARCHIVE_DIR)")
+        ETLProcessor(replay_dir=archive_dir, tenant=single_tenant(args.tenant)).run_reload()
+        return
+    
+    if args.comando == 'backfill':
+        processor = ETLProcessor(tenant=single_tenant(args.tenant))
+        if args.fila:
+            processor.enqueue_backfill(args.endpoints, args.desde, args.ate, args.janela_dias)
+            return
+        ok = processor.run_backfill(args.endpoints, args.desde, args.ate, args.janela_dias, args.paralelo)
+        raise SystemExit(0 if ok else 1)
+    
+    if args.comando == 'desanexar-particoes':
+        tenant = single_tenant(args.tenant)
+        CloudDatabaseManager(schema=tenant.schema).detach_old_partitions(args.meses)
+        return
+    
+    if args.comando == 'agenda':
+        for tenant in select_tenants(args.tenant):
+            if tenant.name:
+                print(f"== {tenant.name} ==")
+            for line in ETLProcessor(tenant=tenant).schedule_report():
+                print(line)
+        return
+    
+    if args.comando == 'explain':
+        for tenant in select_tenants(args.tenant):
+            if tenant.name:
+                print(f"== {tenant.name} ==")
+            processor = ETLProcessor(tenant=tenant)
+            for line in processor.explain(processor.select_jobs(args.tabelas), args.desde, args.paginas):
+                print(line)
+        return
+    
+    if args.comando == 'sync':
+        processor = ETLProcessor(tenant=single_tenant(args.tenant))
+        ok = processor.run_targeted_sync(processor.select_jobs(args.tabelas), args.desde, args.paginas, args.dry_run)
+        for line in processor.timings.report():
+            print(line)
+        raise SystemExit(0 if ok else 1)
+    
+    if args.comando == 'conciliar':
+        ok = True
+        for tenant in select_tenants(args.tenant):
+            processor = ETLProcessor(tenant=tenant)
+            ok = TenantScheduler._call(processor, processor.reconcile,
+                                       processor.select_jobs(args.tabelas), args.forcar) and ok
+        raise SystemExit(0 if ok else 1)
+    
+    if args.comando == 'bench':
+        tenant = single_tenant(args.tenant)
+        # Sem --carregar o banco não é usado (nem os tamanhos de página salvos)
+        if args.arquivo:
+            processor = ETLProcessor(replay_dir=args.arquivo, tenant=tenant, database=args.carregar)
+            source = f"arquivo {args.arquivo}"
+        else:
+            processor = ETLProcessor(tenant=tenant, api=MockSourceClient(args.registros), database=args.carregar)
+            source = f"sintética, {args.registros} registros por endpoint"
+        # Avisos de valores inválidos não interessam na medição
+        logging.getLogger().setLevel(logging.ERROR)
+        ok = processor.run_targeted_sync(processor.select_jobs(args.tabelas), max_pages=args.paginas,
+                                         dry_run=not args.carregar)
+        print(f"=== BENCH DO SYNC (fonte {source}; {'busca + transformação + carga' if args.carregar else 'busca + transformação'}) ===")
+        for line in processor.timings.report():
+            print(line)
+        raise SystemExit(0 if ok else 1)
+    
     logging.info("Iniciando CVCRM ETL...")
     
     try:
-        # Inicializar ETL
-        etl_processor = ETLProcessor()
+        # Inicializar ETL (um processador por tenant)
+        processors = [ETLProcessor(tenant=tenant) for tenant in select_tenants(args.tenant)]
+        if args.fila:
+            QueueWorker(processors).run_forever()
+            return
+        if len(processors) == 1:
+            run_sync = processors[0].run_scheduled_sync
+        else:
+            run_sync = TenantScheduler(processors).run
+            logging.info(f"Tenants: {', '.join(p.tenant.name for p in processors)}")
+        
+        # Conciliação por ids (excluídos/cancelados), se configurada. Roda dentro
+        # do tick, depois do sync: nunca junto com ele, porque as duas medem o
+        # consumo de requisições e as falhas da API pelos mesmos contadores
+        reconcile_days = int(os.getenv('ETL_CONCILIACAO_DIAS', '0'))
+        next_reconcile = datetime.now() + timedelta(days=reconcile_days)
+        
+        def run_tick():
+            nonlocal next_reconcile
+            run_sync()
+            if reconcile_days and datetime.now() >= next_reconcile:
+                next_reconcile = datetime.now() + timedelta(days=reconcile_days)
+                for processor in processors:
+                    TenantScheduler._call(processor, processor.reconcile)
         
-        # Executar primeira sincronização
-        etl_processor.run_full_sync()
+        # Primeiro tick: tarefas que nunca rodaram ou já vencidas
+        run_tick()
         
-        # Configurar agendador para cloud gratuito
+        # Configurar agendador: o tick só executa as tarefas vencidas da agenda
+        from apscheduler.schedulers.blocking import BlockingScheduler
+        from apscheduler.triggers.interval import IntervalTrigger
         scheduler = BlockingScheduler()
+        tick_minutes = int(os.getenv('ETL_AGENDA_TICK_MINUTOS', '15'))
         
-        # Sync a cada 4 horas para economizar compute hours
         scheduler.add_job(
-            func=etl_processor.run_full_sync,
-            trigger=CronTrigger(minute=0, hour='*/4'),
+            func=run_tick,
+            trigger=IntervalTrigger(minutes=tick_minutes),
             id='sync_cvcrm_cloud',
-            max_instances=1
+            max_instances=1,
+            coalesce=True
         )
+        if reconcile_days:
+            logging.info(f"Conciliação por ids a cada {reconcile_days} dias (no tick da agenda)")
         
-        logging.info("Agendador configurado - sync a cada 4 horas")
+        logging.info(f"Agendador configurado - agenda adaptativa verificada a cada {tick_minutes} min")
         logging.info("Iniciando monitoramento contínuo...")
         
         scheduler.start()
@@ -16,36 +16,394 @@ LGPD: Compliant - dados corporativos agregados
 """
 
 import os
+import gzip
 import json
+import hashlib
+import time
+import stat
+import sqlite3
 import logging
-from datetime import datetime, timedelta
-from flask import Flask, render_template_string, jsonify
+import tempfile
+import threading
+import functools
+from contextlib import contextmanager, ExitStack
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from flask import Flask, Response, jsonify, request
 import psycopg2
 from psycopg2.extras import RealDictCursor
-import plotly.graph_objs as go
-import plotly.utils
+from psycopg2.pool import ThreadedConnectionPool
 from dotenv import load_dotenv
 
 load_dotenv()
 
 app = Flask(__name__)
 
+def _cache_default(value):
+    """Tipos das views que o JSON não tem, marcados para voltar iguais na leitura"""
+    if isinstance(value, Decimal):
+        return {'__decimal__': str(value)}
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, date):
+        return {'__date__': value.isoformat()}
+    raise TypeError(f"Valor sem serialização no cache: {type(value).__name__}")
+
+def _cache_object(obj):
+    if len(obj) == 1:
+        if '__decimal__' in obj:
+            return Decimal(obj['__decimal__'])
+        if '__datetime__' in obj:
+            return datetime.fromisoformat(obj['__datetime__'])
+        if '__date__' in obj:
+            return date.fromisoformat(obj['__date__'])
+    return obj
+
+def default_cache_path():
+    """Arquivo do cache num diretório privado do usuário do processo, no tmp do sistema"""
+    return os.path.join(tempfile.gettempdir(), f"cvcrm_dashboard_{os.getuid()}", 'cache.sqlite3')
+
+class SharedCache:
+    """Cache de resultados compartilhado entre os workers do gunicorn (SQLite local)
+    
+    Cada entrada vale para uma geração dos dados (etl_sync_runs): o primeiro
+    worker que calcula um resultado grava, os demais leem em vez de repetir as
+    consultas. Uma geração nova simplesmente não encontra as entradas antigas,
+    que são sobrescritas. Os valores são gravados em JSON (Decimal, date e
+    datetime marcados para voltar com o mesmo tipo), nunca com pickle: ler o
+    cache não executa código. O arquivo fica num diretório 0700 do usuário do
+    processo; um diretório de outro usuário ou que não seja um diretório de
+    verdade (link simbólico) é recusado.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self._private_directory(os.path.dirname(os.path.abspath(path)))
+        self._local = threading.local()
+    
+    @staticmethod
+    def _private_directory(directory):
+        """Cria o diretório com permissão 0700 ou confere que ele é privado deste usuário"""
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        info = os.lstat(directory)
+        if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+            raise PermissionError(f"Diretório do cache não pertence a este usuário: {directory}")
+        if info.st_mode & 0o077:
+            os.chmod(directory, 0o700)
+    
+    def _connection(self):
+        """Conexão SQLite da thread (recriada após fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache (
+                    chave TEXT PRIMARY KEY,
+                    geracao TEXT NOT NULL,
+                    valor BLOB NOT NULL
+                )
+            """)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+    
+    def get(self, key, generation):
+        """(True, valor) se `key` estiver no cache para `generation`, senão (False, None)"""
+        try:
+            row = self._connection().execute(
+                "SELECT valor FROM cache WHERE chave = ? AND geracao = ?", (key, generation)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logging.warning(f"Cache compartilhado indisponível: {e}")
+            return False, None
+        if not row:
+            return False, None
+        try:
+            return True, json.loads(row[0], object_hook=_cache_object)
+        except ValueError:
+            return False, None  # entrada de outro formato: recalculada e sobrescrita
+    
+    def set(self, key, generation, value):
+        try:
+            encoded = json.dumps(value, default=_cache_default)
+        except (TypeError, ValueError) as e:
+            logging.warning(f"Resultado não gravado no cache compartilhado: {e}")
+            return
+        try:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO cache (chave, geracao, valor) VALUES (?, ?, ?)",
+                (key, generation, encoded)
+            )
+        except sqlite3.Error as e:
+            logging.warning(f"Falha ao gravar no cache compartilhado: {e}")
+
+def shared_result(method):
+    """Guarda o resultado de um get_* do DashboardData no cache compartilhado
+    
+    A chave é o nome do método mais os argumentos, válida para a geração atual.
+    Resultados de fallback por erro (o método chama self._skip_cache()) não
+    são gravados, para não fixar um erro até a próxima sincronização.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args):
+        if self.cache is None or self.generation() is None:
+            return method(self, *args)
+        
+        generation = self._generation_key
+        key = ':'.join([method.__name__, *map(str, args)])
+        found, value = self.cache.get(key, generation)
+        if found:
+            return value
+        
+        self._local.cacheable = True
+        value = method(self, *args)
+        if self._local.cacheable:
+            self.cache.set(key, generation, value)
+        return value
+    return wrapper
+
 class DashboardData:
-    """Classe para gerenciar dados do dashboard"""
+    """Classe para gerenciar dados do dashboard
+    
+    KPIs, séries mensais, VSO e rankings são calculados no ColumnarSnapshot
+    em memória; o Postgres (views) é o fallback quando não há snapshot
+    (nenhuma sincronização registrada, erro de carga ou DASHBOARD_COLUMNAR=false).
     
-    def __init__(self):
+    Com DATABASE_READ_URL as leituras (read_connection) vão para a réplica
+    enquanto ela tiver a última geração do primário; atrasada ou fora do ar,
+    as leituras voltam ao primário. A geração é sempre lida no primário.
+    """
+    
+    def __init__(self, columnar=None, schema=None):
+        """`schema`: schema do tenant lido (padrão: cvcrm_<DASHBOARD_TENANT>, ou o schema padrão)"""
         self.database_url = os.getenv('DATABASE_URL')
         if not self.database_url:
             raise ValueError("DATABASE_URL não encontrada")
+        self.read_url = os.getenv('DATABASE_READ_URL') or None
+        tenant = os.getenv('DASHBOARD_TENANT', '').strip().lower()
+        self.schema = schema or (f"cvcrm_{tenant}" if tenant else None)
+        if columnar is None:
+            columnar = os.getenv('DASHBOARD_COLUMNAR', 'true').lower() not in ('0', 'false', 'nao', 'não')
+        self.columnar = columnar
+        # Intervalo mínimo entre consultas da geração atual ao banco
+        self.generation_check_interval = float(os.getenv('DASHBOARD_GENERATION_CHECK_SECONDS', '30'))
+        self.snapshot = None
+        self._generation = None
+        self._generation_key = None
+        self._generation_checked_at = float('-inf')
+        # Última geração vista na réplica e para qual geração do primário foi conferida
+        self._replica_generation = None
+        self._replica_checked_for = None
+        self._replica_checked_at = float('-inf')
+        self._snapshot_lock = threading.Lock()
+        self._local = threading.local()
+        
+        # Pools de conexões por processo (um por banco): criados no primeiro uso e
+        # recriados se o pid mudar (fork do gunicorn), nunca compartilhados entre processos
+        self.pool_size = int(os.getenv('DASHBOARD_DB_POOL_SIZE', '4'))
+        self._pools = {}
+        self._pool_pid = None
+        self._pool_lock = threading.Lock()
+        
+        cache_path = os.getenv('DASHBOARD_CACHE_PATH', default_cache_path())
+        self.cache = None
+        if cache_path.lower() not in ('', '0', 'false'):
+            try:
+                self.cache = SharedCache(cache_path)
+            except OSError as e:
+                logging.warning(f"Cache compartilhado desativado: {e}")
+    
+    def _get_pool(self, url):
+        """(pool, vagas) do processo para `url`"""
+        if self._pool_pid != os.getpid() or url not in self._pools:
+            with self._pool_lock:
+                if self._pool_pid != os.getpid():
+                    # Conexões herdadas do processo pai não são reutilizadas nem fechadas aqui
+                    self._pools = {}
+                    self._pool_pid = os.getpid()
+                if url not in self._pools:
+                    self._pools[url] = (ThreadedConnectionPool(1, self.pool_size, url),
+                                        threading.BoundedSemaphore(self.pool_size))
+        return self._pools[url]
+    
+    @contextmanager
+    def get_connection(self, url=None):
+        """Conexão do pool do processo (commit ao sair, rollback em erro, devolvida ao pool)
+        
+        `url`: banco da conexão (padrão: o primário, DATABASE_URL). Com todas as
+        conexões em uso, espera uma ser devolvida em vez de abrir outra.
+        """
+        pool, slots = self._get_pool(url or self.database_url)
+        slots.acquire()
+        try:
+            conn = pool.getconn()
+            try:
+                with conn:
+                    if self.schema:
+                        with conn.cursor() as cursor:
+                            cursor.execute("SET LOCAL search_path TO %s", (self.schema,))
+                    timeout_ms = getattr(self._local, 'statement_timeout', None)
+                    if timeout_ms:
+                        with conn.cursor() as cursor:
+                            cursor.execute("SET LOCAL statement_timeout = %s", (int(timeout_ms),))
+                    yield conn
+            finally:
+                pool.putconn(conn, close=bool(conn.closed))
+        finally:
+            slots.release()
+    
+    def reset(self):
+        """Descarta pools e caches em memória (chamado no processo filho após o fork)"""
+        self._pools = {}
+        self._pool_pid = None
+        self.snapshot = None
+        self._generation = None
+        self._generation_key = None
+        self._generation_checked_at = float('-inf')
+        self._replica_generation = None
+        self._replica_checked_for = None
+        self._replica_checked_at = float('-inf')
+    
+    def generation(self):
+        """Geração atual, consultada no banco no máximo a cada generation_check_interval
+        
+        Se a consulta falhar, mantém a última geração conhecida.
+        """
+        now = time.monotonic()
+        if now - self._generation_checked_at >= self.generation_check_interval:
+            try:
+                with self.get_connection() as conn:
+                    with conn.cursor() as cursor:
+                        cursor.execute("""
+                            SELECT id, finalizado_em FROM etl_sync_runs
+                            WHERE status = 'sucesso' ORDER BY id DESC LIMIT 1
+                        """)
+                        row = cursor.fetchone()
+                self._generation = row[0] if row else None
+                # O id sozinho se repete se o banco for recriado (ou em outro tenant);
+                # o cache usa schema + id + horário
+                self._generation_key = (f"{self.schema or ''}:{row[0]}@{row[1].isoformat() if row[1] else ''}"
+                                        if row else None)
+                self._generation_checked_at = now
+            except Exception as e:
+                logging.warning(f"Geração atual indisponível: {e}")
+        return self._generation
+    
+    def replica_ready(self):
+        """A réplica tem a última geração do primário (e pode atender as leituras)
+        
+        A geração da réplica é consultada de novo quando o primário conclui uma
+        sincronização e, enquanto ela estiver atrasada, no máximo a cada
+        generation_check_interval.
+        """
+        if not self.read_url:
+            return False
+        generation = self.generation()
+        if generation is None:
+            return False
+        if self._replica_generation is not None and self._replica_generation >= generation:
+            return True
+        now = time.monotonic()
+        if generation != self._replica_checked_for or now - self._replica_checked_at >= self.generation_check_interval:
+            self._replica_checked_for, self._replica_checked_at = generation, now
+            try:
+                with self.get_connection(self.read_url) as conn:
+                    with conn.cursor() as cursor:
+                        cursor.execute("SELECT MAX(id) FROM etl_sync_runs WHERE status = 'sucesso'")
+                        self._replica_generation = cursor.fetchone()[0]
+            except Exception as e:
+                logging.warning(f"Réplica de leitura indisponível, lendo do primário: {e}")
+                self._replica_generation = None
+            if self._replica_generation is not None and self._replica_generation < generation:
+                logging.info(f"Réplica de leitura na geração {self._replica_generation} "
+                             f"(primário em {generation}), lendo do primário")
+        return self._replica_generation is not None and self._replica_generation >= generation
+    
+    @contextmanager
+    def read_connection(self):
+        """Conexão para consultas do dashboard: a réplica se estiver em dia, senão o primário"""
+        with ExitStack() as stack:
+            conn = None
+            if self.replica_ready():
+                try:
+                    conn = stack.enter_context(self.get_connection(self.read_url))
+                except psycopg2.OperationalError as e:
+                    logging.warning(f"Réplica de leitura indisponível, lendo do primário: {e}")
+                    self._replica_generation = None
+            if conn is None:
+                conn = stack.enter_context(self.get_connection())
+            yield conn
+    
+    @contextmanager
+    def statement_timeout(self, milliseconds):
+        """Limita cada consulta feita por esta thread dentro do bloco (SET LOCAL statement_timeout)"""
+        previous = getattr(self._local, 'statement_timeout', None)
+        self._local.statement_timeout = milliseconds
+        try:
+            yield
+        finally:
+            self._local.statement_timeout = previous
+    
+    def widget(self, build, timeout_ms=None):
+        """(build(self), ok): ok é False se algum get_* caiu no fallback de erro"""
+        self._local.failed = False
+        with self.statement_timeout(timeout_ms):
+            content = build(self)
+        return content, not self._local.failed
+    
+    def _skip_cache(self):
+        """Marca o resultado em cálculo como fallback de erro (não vai para o cache)"""
+        self._local.cacheable = False
+        self._local.failed = True
+    
+    def current_generation(self):
+        """Geração dos dados: id da última execução do ETL concluída com sucesso"""
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT MAX(id) FROM etl_sync_runs WHERE status = 'sucesso'")
+                return cursor.fetchone()[0]
     
-    def get_connection(self):
-        """Cria conexão com o banco"""
-        return psycopg2.connect(self.database_url)
+    def get_snapshot(self):
+        """Snapshot colunar da geração atual (recarregado só quando a geração muda)"""
+        if not self.columnar:
+            return None
+        generation = self.generation()
+        if generation is None:
+            return None
+        if self.snapshot is not None and self.snapshot.generation == generation:
+            return self.snapshot
+        
+        with self._snapshot_lock:
+            if self.snapshot is None or self.snapshot.generation != generation:
+                try:
+                    from dashboard_columnar import ColumnarSnapshot
+                    # A carga não herda o statement_timeout do widget que a disparou
+                    with self.statement_timeout(None), self.read_connection() as conn:
+                        self.snapshot = ColumnarSnapshot.load(conn, generation)
+                except Exception as e:
+                    # Mantém o snapshot anterior (se houver); sem ele, as consultas vão ao Postgres
+                    logging.warning(f"Snapshot colunar indisponível: {e}")
+            return self.snapshot
     
+    def _from_snapshot(self, method, *args):
+        """Resultado calculado no snapshot colunar, ou None para usar o Postgres"""
+        snapshot = self.get_snapshot()
+        if snapshot is None:
+            return None
+        try:
+            return getattr(snapshot, method)(*args)
+        except Exception as e:
+            logging.error(f"Erro no snapshot colunar ({method}), usando Postgres: {e}")
+            return None
+    
+    @shared_result
     def get_kpis(self):
         """Busca KPIs focados em vendas e análises"""
+        result = self._from_snapshot('kpis')
+        if result is not None:
+            return result
         try:
-            with self.get_connection() as conn:
+            with self.read_connection() as conn:
                 with conn.cursor(cursor_factory=RealDictCursor) as cursor:
                     # KPIs principais de vendas
                     cursor.execute("""
@@ -70,7 +428,8 @@ class DashboardData:
                             COALESCE(SUM(valor), 0) as valor_mes_atual,
                             COALESCE(AVG(valor), 0) as ticket_medio_mes
                         FROM vendas 
-                        WHERE DATE_TRUNC('month', data_venda) = DATE_TRUNC('month', CURRENT_DATE)
+                        WHERE data_venda >= DATE_TRUNC('month', CURRENT_DATE)::date
+                        AND data_venda < (DATE_TRUNC('month', CURRENT_DATE) + INTERVAL '1 month')::date
                         AND ativo = 'S'
                         AND data_venda IS NOT NULL
                     """)
@@ -101,12 +460,14 @@ class DashboardData:
                     cursor.execute("""
                         SELECT 
                             COUNT(DISTINCT e.id) as total_empreendimentos,
-                            COUNT(DISTINCT v.corretor_nome) as total_corretores,
+                            COUNT(DISTINCT v.corretor) as total_corretores,
                             COUNT(DISTINCT v.time_corretor) as total_times
                         FROM empreendimentos e
-                        LEFT JOIN vendas v ON e.cvcrm_id = v.empreendimento_id
+                        LEFT JOIN vendas v ON e.nome = v.empreendimento
                         WHERE v.data_venda >= CURRENT_DATE - INTERVAL '12 months'
                         AND v.status NOT IN ('cancelado', 'distratado')
+                        AND v.ativo = 'S'
+                        AND e.excluido_em IS NULL
                     """)
                     
                     estrutura = cursor.fetchone()
@@ -119,6 +480,7 @@ class DashboardData:
                         FROM prosoluto 
                         WHERE data_calculo >= CURRENT_DATE - INTERVAL '12 months'
                         AND status NOT IN ('cancelado')
+                        AND excluido_em IS NULL
                     """)
                     
                     prosoluto = cursor.fetchone()
@@ -128,10 +490,11 @@ class DashboardData:
                         WITH vendas_ultimos_2_meses AS (
                             SELECT 
                                 DATE_TRUNC('month', data_venda) as mes,
-                                SUM(valor_venda) as valor_mes
+                                SUM(valor) as valor_mes
                             FROM vendas
                             WHERE data_venda >= CURRENT_DATE - INTERVAL '2 months'
                             AND status NOT IN ('cancelado', 'distratado')
+                            AND ativo = 'S'
                             GROUP BY DATE_TRUNC('month', data_venda)
                             ORDER BY mes DESC
                             LIMIT 2
@@ -185,6 +548,7 @@ class DashboardData:
                     
         except Exception as e:
             logging.error(f"Erro ao buscar KPIs: {e}")
+            self._skip_cache()
             return {
                 'total_vendas': 0,
                 'valor_total_vendas': 0,
@@ -206,10 +570,14 @@ class DashboardData:
                 'crescimento_mensal': 0
             }
     
+    @shared_result
     def get_vendas_mensais_chart_data(self):
         """Dados para gráfico de vendas mensais com comparação anual"""
+        result = self._from_snapshot('vendas_mensais')
+        if result is not None:
+            return result
         try:
-            with self.get_connection() as conn:
+            with self.read_connection() as conn:
                 with conn.cursor(cursor_factory=RealDictCursor) as cursor:
                     cursor.execute("""
                         SELECT * FROM vw_vendas_mensais
@@ -229,12 +597,17 @@ class DashboardData:
                     
         except Exception as e:
             logging.error(f"Erro ao buscar dados de vendas mensais: {e}")
+            self._skip_cache()
             return {'meses': [], 'valores': [], 'quantidades': [], 'tickets_medios': [], 'vgv': [], 'comissoes': []}
     
+    @shared_result
     def get_vso_chart_data(self):
         """Dados para gráfico de VSO mensal"""
+        result = self._from_snapshot('vso')
+        if result is not None:
+            return result
         try:
-            with self.get_connection() as conn:
+            with self.read_connection() as conn:
                 with conn.cursor(cursor_factory=RealDictCursor) as cursor:
                     cursor.execute("""
                         SELECT * FROM vw_vso_mensal
@@ -252,12 +625,17 @@ class DashboardData:
                     
         except Exception as e:
             logging.error(f"Erro ao buscar dados VSO: {e}")
+            self._skip_cache()
             return {'meses': [], 'vso_valores': [], 'vso_tickets': [], 'quantidades': []}
     
+    @shared_result
     def get_top_empreendimentos(self, limit=10):
         """Top empreendimentos por vendas"""
+        result = self._from_snapshot('top_empreendimentos', limit)
+        if result is not None:
+            return result
         try:
-            with self.get_connection() as conn:
+            with self.read_connection() as conn:
                 with conn.cursor(cursor_factory=RealDictCursor) as cursor:
                     cursor.execute(f"""
                         SELECT * FROM vw_vendas_por_empreendimento 
@@ -270,12 +648,17 @@ class DashboardData:
                     
         except Exception as e:
             logging.error(f"Erro ao buscar top empreendimentos: {e}")
+            self._skip_cache()
             return []
     
+    @shared_result
     def get_top_corretores(self, limit=15):
         """Top corretores por vendas"""
+        result = self._from_snapshot('top_corretores', limit)
+        if result is not None:
+            return result
         try:
-            with self.get_connection() as conn:
+            with self.read_connection() as conn:
                 with conn.cursor(cursor_factory=RealDictCursor) as cursor:
                     cursor.execute(f"""
                         SELECT * FROM vw_vendas_por_corretor 
@@ -287,12 +670,17 @@ class DashboardData:
                     
         except Exception as e:
             logging.error(f"Erro ao buscar top corretores: {e}")
+            self._skip_cache()
             return []
     
+    @shared_result
     def get_vendas_por_time(self):
         """Vendas por time de corretores"""
+        result = self._from_snapshot('vendas_por_time')
+        if result is not None:
+            return result
         try:
-            with self.get_connection() as conn:
+            with self.read_connection() as conn:
                 with conn.cursor(cursor_factory=RealDictCursor) as cursor:
                     cursor.execute("""
                         SELECT * FROM vw_vendas_por_time 
@@ -303,12 +691,14 @@ class DashboardData:
                     
         except Exception as e:
             logging.error(f"Erro ao buscar vendas por time: {e}")
+            self._skip_cache()
             return []
     
+    @shared_result
     def get_prosoluto_chart_data(self):
         """Dados para análise de prosoluto"""
         try:
-            with self.get_connection() as conn:
+            with self.read_connection() as conn:
                 with conn.cursor(cursor_factory=RealDictCursor) as cursor:
                     cursor.execute("""
                         SELECT * FROM vw_prosoluto_analise
@@ -326,27 +716,27 @@ class DashboardData:
                     
         except Exception as e:
             logging.error(f"Erro ao buscar dados prosoluto: {e}")
+            self._skip_cache()
             return {'meses': [], 'valores_prosoluto': [], 'medias_prosoluto': [], 'percentuais': []}
     
     def get_sync_status(self):
         """Status da última sincronização"""
         try:
-            with self.get_connection() as conn:
+            with self.read_connection() as conn:
                 with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                    # Última execução do ETL concluída com sucesso (etl_sync_runs)
                     cursor.execute("""
                         SELECT 
-                            MAX(updated_at) as last_sync,
-                            COUNT(*) as total_records
-                        FROM (
-                            SELECT updated_at FROM clients
-                            UNION ALL
-                            SELECT updated_at FROM opportunities  
-                            UNION ALL
-                            SELECT updated_at FROM sales
-                        ) t
+                            id as geracao,
+                            finalizado_em as last_sync,
+                            COALESCE((SELECT SUM(value::numeric) FROM jsonb_each_text(registros)), 0) as total_records
+                        FROM etl_sync_runs
+                        WHERE status = 'sucesso'
+                        ORDER BY id DESC
+                        LIMIT 1
                     """)
                     
-                    result = cursor.fetchone()
+                    result = cursor.fetchone() or {'geracao': None, 'last_sync': None, 'total_records': 0}
                     last_sync = result['last_sync']
                     
                     if last_sync:
@@ -365,21 +755,47 @@ class DashboardData:
                     return {
                         'last_sync': status_text,
                         'last_sync_date': last_sync.strftime('%d/%m/%Y %H:%M') if last_sync else 'N/A',
-                        'total_records': result['total_records']
+                        'last_sync_iso': last_sync.isoformat() if last_sync else '',
+                        'geracao': result['geracao'],
+                        'total_records': int(result['total_records'])
                     }
                     
         except Exception as e:
             logging.error(f"Erro ao buscar status: {e}")
+            self._skip_cache()
             return {
                 'last_sync': 'Erro',
                 'last_sync_date': 'N/A',
+                'last_sync_iso': '',
+                'geracao': None,
                 'total_records': 0
             }
 
-dashboard_data = DashboardData()
+_dashboard_data = None
+_dashboard_data_lock = threading.Lock()
 
-# Template HTML do dashboard focado em vendas
-DASHBOARD_TEMPLATE = """
+def get_dashboard_data():
+    """DashboardData do processo, criado no primeiro uso e não no import
+    
+    Assim o boot do gunicorn (e de cada worker) não depende do banco nem do
+    DATABASE_URL; um erro de configuração aparece na primeira requisição.
+    """
+    global _dashboard_data
+    if _dashboard_data is None:
+        with _dashboard_data_lock:
+            if _dashboard_data is None:
+                _dashboard_data = DashboardData()
+    return _dashboard_data
+
+def reset_after_fork():
+    """Hook post_fork do gunicorn: o worker não herda conexões nem caches do master"""
+    global snapshots
+    if _dashboard_data is not None:
+        _dashboard_data.reset()
+    snapshots = SnapshotStore()
+
+# Shell HTML estático do dashboard: os dados de cada widget vêm de /api/widgets/<nome>
+DASHBOARD_SHELL = """
 <!DOCTYPE html>
 <html>
 <head>
@@ -442,7 +858,7 @@ DASHBOARD_TEMPLATE = """
                 </div>
                 <div class="col-md-4 text-end">
                     <span class="badge bg-light text-dark fs-6">
-                        <i class="bi bi-clock"></i> Última sync: {{ sync_status.last_sync }}
+                        <i class="bi bi-clock"></i> Última sync: <span id="last-sync">—</span>
                     </span>
                 </div>
             </div>
@@ -451,12 +867,15 @@ DASHBOARD_TEMPLATE = """
 
     <div class="container-fluid my-4">
         <!-- KPIs Principais de Vendas -->
-        <div class="row mb-4">
+        <div class="row mb-4" data-widget="kpis">
+            <div class="col-12 mb-2">
+                <small class="text-muted" data-status="kpis">Carregando KPIs...</small>
+            </div>
             <div class="col-xl-2 col-md-4 mb-3">
                 <div class="card kpi-card">
                     <div class="card-body text-center">
                         <i class="bi bi-cash-stack text-success" style="font-size: 2rem;"></i>
-                        <div class="kpi-value text-success">{{ kpis.total_vendas }}</div>
+                        <div class="kpi-value text-success" data-kpi="total_vendas">—</div>
                         <div class="text-muted small">Total Vendas (12m)</div>
                     </div>
                 </div>
@@ -465,7 +884,7 @@ DASHBOARD_TEMPLATE = """
                 <div class="card kpi-card">
                     <div class="card-body text-center">
                         <i class="bi bi-currency-dollar text-primary" style="font-size: 2rem;"></i>
-                        <div class="kpi-small text-primary">R$ {{ "%.0f"|format(kpis.valor_total_vendas) }}</div>
+                        <div class="kpi-small text-primary" data-kpi="valor_total_vendas" data-reais>—</div>
                         <div class="text-muted small">Valor Total</div>
                     </div>
                 </div>
@@ -474,7 +893,7 @@ DASHBOARD_TEMPLATE = """
                 <div class="card kpi-card">
                     <div class="card-body text-center">
                         <i class="bi bi-ticket text-warning" style="font-size: 2rem;"></i>
-                        <div class="kpi-small text-warning">R$ {{ "%.0f"|format(kpis.ticket_medio_geral) }}</div>
+                        <div class="kpi-small text-warning" data-kpi="ticket_medio_geral" data-reais>—</div>
                         <div class="text-muted small">Ticket Médio</div>
                     </div>
                 </div>
@@ -483,7 +902,7 @@ DASHBOARD_TEMPLATE = """
                 <div class="card kpi-card">
                     <div class="card-body text-center">
                         <i class="bi bi-building text-info" style="font-size: 2rem;"></i>
-                        <div class="kpi-value text-info">{{ kpis.total_empreendimentos }}</div>
+                        <div class="kpi-value text-info" data-kpi="total_empreendimentos">—</div>
                         <div class="text-muted small">Empreendimentos</div>
                     </div>
                 </div>
@@ -492,7 +911,7 @@ DASHBOARD_TEMPLATE = """
                 <div class="card kpi-card">
                     <div class="card-body text-center">
                         <i class="bi bi-people text-secondary" style="font-size: 2rem;"></i>
-                        <div class="kpi-value text-secondary">{{ kpis.total_corretores }}</div>
+                        <div class="kpi-value text-secondary" data-kpi="total_corretores">—</div>
                         <div class="text-muted small">Corretores</div>
                     </div>
                 </div>
@@ -501,73 +920,29 @@ DASHBOARD_TEMPLATE = """
                 <div class="card kpi-card">
                     <div class="card-body text-center">
                         <i class="bi bi-award text-danger" style="font-size: 2rem;"></i>
-                        <div class="kpi-small text-danger">R$ {{ "%.0f"|format(kpis.total_comissoes) }}</div>
+                        <div class="kpi-small text-danger" data-kpi="total_comissoes" data-reais>—</div>
                         <div class="text-muted small">Comissões</div>
                     </div>
                 </div>
             </div>
         </div>
 
-        <!-- Comparação Anual -->
-        {% if kpis.ano_atual and kpis.ano_passado %}
-        <div class="row mb-4">
-            <div class="col-12">
-                <div class="card comparison-card">
-                    <div class="card-body">
-                        <h5><i class="bi bi-calendar-check"></i> Comparação Ano Atual vs Ano Passado</h5>
-                        <div class="row text-center">
-                            <div class="col-md-2">
-                                <h6>{{ kpis.ano_atual.ano }} (Atual)</h6>
-                                <strong class="text-success">{{ kpis.ano_atual.quantidade_vendas }} vendas</strong><br>
-                                <span>R$ {{ "%.0f"|format(kpis.ano_atual.valor_total) }}</span>
-                            </div>
-                            <div class="col-md-2">
-                                <h6>{{ kpis.ano_passado.ano }} (Anterior)</h6>
-                                <strong class="text-primary">{{ kpis.ano_passado.quantidade_vendas }} vendas</strong><br>
-                                <span>R$ {{ "%.0f"|format(kpis.ano_passado.valor_total) }}</span>
-                            </div>
-                            <div class="col-md-2">
-                                <h6>Crescimento Vendas</h6>
-                                {% set crescimento_qty = ((kpis.ano_atual.quantidade_vendas - kpis.ano_passado.quantidade_vendas) / kpis.ano_passado.quantidade_vendas * 100) if kpis.ano_passado.quantidade_vendas > 0 else 0 %}
-                                <strong class="{% if crescimento_qty >= 0 %}growth-positive{% else %}growth-negative{% endif %}">
-                                    {{ "%.1f"|format(crescimento_qty) }}%
-                                </strong>
-                            </div>
-                            <div class="col-md-2">
-                                <h6>Crescimento Valor</h6>
-                                {% set crescimento_valor = ((kpis.ano_atual.valor_total - kpis.ano_passado.valor_total) / kpis.ano_passado.valor_total * 100) if kpis.ano_passado.valor_total > 0 else 0 %}
-                                <strong class="{% if crescimento_valor >= 0 %}growth-positive{% else %}growth-negative{% endif %}">
-                                    {{ "%.1f"|format(crescimento_valor) }}%
-                                </strong>
-                            </div>
-                            <div class="col-md-2">
-                                <h6>Ticket Médio Atual</h6>
-                                <strong>R$ {{ "%.0f"|format(kpis.ano_atual.ticket_medio) }}</strong>
-                            </div>
-                            <div class="col-md-2">
-                                <h6>Crescimento Mensal</h6>
-                                <strong class="{% if kpis.crescimento_mensal >= 0 %}growth-positive{% else %}growth-negative{% endif %}">
-                                    {{ "%.1f"|format(kpis.crescimento_mensal) }}%
-                                </strong>
-                            </div>
-                        </div>
-                    </div>
-                </div>
-            </div>
-        </div>
-        {% endif %}
+        <!-- Comparação Anual (preenchida com os KPIs) -->
+        <div id="comparacao"></div>
 
         <!-- Gráficos -->
         <div class="row mb-4">
             <div class="col-lg-8">
                 <div class="chart-container">
                     <h4><i class="bi bi-bar-chart-line"></i> Vendas Mensais</h4>
+                    <small class="text-muted" data-status="vendas-mensais">Carregando...</small>
                     <div id="vendas-mensais-chart" style="height: 400px;"></div>
                 </div>
             </div>
             <div class="col-lg-4">
                 <div class="chart-container">
                     <h4><i class="bi bi-graph-up"></i> VSO & Ticket Médio</h4>
+                    <small class="text-muted" data-status="vso">Carregando...</small>
                     <div id="vso-chart" style="height: 400px;"></div>
                 </div>
             </div>
@@ -577,6 +952,7 @@ DASHBOARD_TEMPLATE = """
             <div class="col-lg-6">
                 <div class="chart-container">
                     <h4><i class="bi bi-building-fill"></i> Top 10 Empreendimentos</h4>
+                    <small class="text-muted" data-status="top-empreendimentos">Carregando...</small>
                     <div class="table-responsive">
                         <table class="table table-sm table-hover">
                             <thead class="table-dark">
@@ -587,16 +963,7 @@ DASHBOARD_TEMPLATE = """
                                     <th>Ticket Médio</th>
                                 </tr>
                             </thead>
-                            <tbody>
-                                {% for emp in top_empreendimentos %}
-                                <tr>
-                                    <td><strong>{{ emp.empreendimento }}</strong></td>
-                                    <td><span class="badge bg-success">{{ emp.quantidade_vendas }}</span></td>
-                                    <td>R$ {{ "%.0f"|format(emp.valor_total_vendas) }}</td>
-                                    <td>R$ {{ "%.0f"|format(emp.ticket_medio) }}</td>
-                                </tr>
-                                {% endfor %}
-                            </tbody>
+                            <tbody id="top-empreendimentos"></tbody>
                         </table>
                     </div>
                 </div>
@@ -604,6 +971,7 @@ DASHBOARD_TEMPLATE = """
             <div class="col-lg-6">
                 <div class="chart-container">
                     <h4><i class="bi bi-person-badge"></i> Top 15 Corretores</h4>
+                    <small class="text-muted" data-status="top-corretores">Carregando...</small>
                     <div class="table-responsive" style="max-height: 400px; overflow-y: auto;">
                         <table class="table table-sm table-hover">
                             <thead class="table-dark sticky-top">
@@ -614,16 +982,7 @@ DASHBOARD_TEMPLATE = """
                                     <th>Valor</th>
                                 </tr>
                             </thead>
-                            <tbody>
-                                {% for corretor in top_corretores %}
-                                <tr>
-                                    <td><strong>{{ corretor.corretor_nome }}</strong></td>
-                                    <td><small>{{ corretor.time_corretor or 'N/A' }}</small></td>
-                                    <td><span class="badge bg-primary">{{ corretor.quantidade_vendas }}</span></td>
-                                    <td>R$ {{ "%.0f"|format(corretor.valor_total_vendas) }}</td>
-                                </tr>
-                                {% endfor %}
-                            </tbody>
+                            <tbody id="top-corretores"></tbody>
                         </table>
                     </div>
                 </div>
@@ -635,6 +994,7 @@ DASHBOARD_TEMPLATE = """
             <div class="col-lg-6">
                 <div class="chart-container">
                     <h4><i class="bi bi-people-fill"></i> Vendas por Time</h4>
+                    <small class="text-muted" data-status="times">Carregando...</small>
                     <div class="table-responsive">
                         <table class="table table-striped">
                             <thead class="table-dark">
@@ -646,17 +1006,7 @@ DASHBOARD_TEMPLATE = """
                                     <th>Ticket Médio</th>
                                 </tr>
                             </thead>
-                            <tbody>
-                                {% for time in vendas_por_time %}
-                                <tr>
-                                    <td><strong>{{ time.time_corretor }}</strong></td>
-                                    <td>{{ time.total_corretores }}</td>
-                                    <td><span class="badge bg-warning">{{ time.quantidade_vendas }}</span></td>
-                                    <td>R$ {{ "%.0f"|format(time.valor_total_vendas) }}</td>
-                                    <td>R$ {{ "%.0f"|format(time.ticket_medio) }}</td>
-                                </tr>
-                                {% endfor %}
-                            </tbody>
+                            <tbody id="times"></tbody>
                         </table>
                     </div>
                 </div>
@@ -664,15 +1014,16 @@ DASHBOARD_TEMPLATE = """
             <div class="col-lg-6">
                 <div class="chart-container">
                     <h4><i class="bi bi-cash-coin"></i> Análise Prosoluto</h4>
+                    <small class="text-muted" data-status="prosoluto">Carregando...</small>
                     <div id="prosoluto-chart" style="height: 350px;"></div>
                     <div class="row text-center mt-3">
                         <div class="col-6">
                             <h6>Total Prosoluto (12m)</h6>
-                            <strong class="text-success">R$ {{ "%.0f"|format(kpis.total_prosoluto) }}</strong>
+                            <strong class="text-success" data-kpi="total_prosoluto" data-reais>—</strong>
                         </div>
                         <div class="col-6">
                             <h6>Média Prosoluto</h6>
-                            <strong class="text-primary">R$ {{ "%.0f"|format(kpis.media_prosoluto) }}</strong>
+                            <strong class="text-primary" data-kpi="media_prosoluto" data-reais>—</strong>
                         </div>
                     </div>
                 </div>
@@ -681,130 +1032,505 @@ DASHBOARD_TEMPLATE = """
     </div>
 
     <script>
+        function reais(valor) {
+            return 'R$ ' + Math.round(valor || 0);
+        }
+
+        function percentual(valor) {
+            return '<strong class="' + (valor >= 0 ? 'growth-positive' : 'growth-negative') + '">' + valor.toFixed(1) + '%</strong>';
+        }
+
+        function escapar(texto) {
+            return String(texto === null || texto === undefined ? '' : texto).replace(/[&<>"']/g, function(c) {
+                return {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}[c];
+            });
+        }
+
+        function preencherTabela(id, linhas, celulas) {
+            document.getElementById(id).innerHTML = linhas.map(function(linha) {
+                return '<tr>' + celulas(linha) + '</tr>';
+            }).join('');
+        }
+
+        // KPIs, comparação anual e totais do prosoluto
+        function mostrarKpis(kpis) {
+            document.querySelectorAll('[data-kpi]').forEach(function(el) {
+                var valor = kpis[el.dataset.kpi];
+                if (valor === undefined || valor === null) return;
+                el.textContent = el.hasAttribute('data-reais') ? reais(valor) : valor;
+            });
+            
+            var comparacao = document.getElementById('comparacao');
+            var atual = kpis.ano_atual, passado = kpis.ano_passado;
+            if (!atual || !passado) {
+                comparacao.innerHTML = '';
+                return;
+            }
+            var crescimentoQtd = passado.quantidade_vendas > 0 ? (atual.quantidade_vendas - passado.quantidade_vendas) / passado.quantidade_vendas * 100 : 0;
+            var crescimentoValor = passado.valor_total > 0 ? (atual.valor_total - passado.valor_total) / passado.valor_total * 100 : 0;
+            comparacao.innerHTML =
+                '<div class="row mb-4"><div class="col-12"><div class="card comparison-card"><div class="card-body">' +
+                '<h5><i class="bi bi-calendar-check"></i> Comparação Ano Atual vs Ano Passado</h5>' +
+                '<div class="row text-center">' +
+                '<div class="col-md-2"><h6>' + escapar(atual.ano) + ' (Atual)</h6><strong class="text-success">' + atual.quantidade_vendas + ' vendas</strong><br><span>' + reais(atual.valor_total) + '</span></div>' +
+                '<div class="col-md-2"><h6>' + escapar(passado.ano) + ' (Anterior)</h6><strong class="text-primary">' + passado.quantidade_vendas + ' vendas</strong><br><span>' + reais(passado.valor_total) + '</span></div>' +
+                '<div class="col-md-2"><h6>Crescimento Vendas</h6>' + percentual(crescimentoQtd) + '</div>' +
+                '<div class="col-md-2"><h6>Crescimento Valor</h6>' + percentual(crescimentoValor) + '</div>' +
+                '<div class="col-md-2"><h6>Ticket Médio Atual</h6><strong>' + reais(atual.ticket_medio) + '</strong></div>' +
+                '<div class="col-md-2"><h6>Crescimento Mensal</h6>' + percentual(kpis.crescimento_mensal || 0) + '</div>' +
+                '</div></div></div></div></div>';
+        }
+
         // Gráfico de Vendas Mensais
-        var vendasMensais = {{ vendas_mensais_chart_data|tojson }};
-        
-        var trace1 = {
-            x: vendasMensais.meses,
-            y: vendasMensais.valores,
-            type: 'bar',
-            name: 'Valor Vendas',
-            marker: { color: 'rgba(40, 167, 69, 0.8)' }
-        };
-        
-        var trace2 = {
-            x: vendasMensais.meses,
-            y: vendasMensais.quantidades,
-            yaxis: 'y2',
-            type: 'scatter',
-            mode: 'lines+markers',
-            name: 'Quantidade',
-            line: { color: 'rgba(255, 193, 7, 1)' }
-        };
-        
-        var layout1 = {
-            title: 'Evolução de Vendas',
-            xaxis: { title: 'Mês' },
-            yaxis: { title: 'Valor (R$)', side: 'left' },
-            yaxis2: { title: 'Quantidade', side: 'right', overlaying: 'y' },
-            showlegend: true,
-            margin: { t: 50, b: 50, l: 80, r: 80 }
-        };
-        
-        Plotly.newPlot('vendas-mensais-chart', [trace1, trace2], layout1, {responsive: true});
+        function desenharVendasMensais(vendasMensais) {
+            var trace1 = {
+                x: vendasMensais.meses,
+                y: vendasMensais.valores,
+                type: 'bar',
+                name: 'Valor Vendas',
+                marker: { color: 'rgba(40, 167, 69, 0.8)' }
+            };
+            
+            var trace2 = {
+                x: vendasMensais.meses,
+                y: vendasMensais.quantidades,
+                yaxis: 'y2',
+                type: 'scatter',
+                mode: 'lines+markers',
+                name: 'Quantidade',
+                line: { color: 'rgba(255, 193, 7, 1)' }
+            };
+            
+            var layout1 = {
+                title: 'Evolução de Vendas',
+                xaxis: { title: 'Mês' },
+                yaxis: { title: 'Valor (R$)', side: 'left' },
+                yaxis2: { title: 'Quantidade', side: 'right', overlaying: 'y' },
+                showlegend: true,
+                margin: { t: 50, b: 50, l: 80, r: 80 }
+            };
+            
+            Plotly.react('vendas-mensais-chart', [trace1, trace2], layout1, {responsive: true});
+        }
 
         // Gráfico VSO
-        var vsoData = {{ vso_chart_data|tojson }};
-        
-        var trace3 = {
-            x: vsoData.meses,
-            y: vsoData.vso_tickets,
-            type: 'bar',
-            name: 'VSO Ticket Médio',
-            marker: { color: 'rgba(23, 162, 184, 0.8)' }
-        };
-        
-        var layout2 = {
-            title: 'VSO Ticket Médio',
-            xaxis: { title: 'Mês' },
-            yaxis: { title: 'Valor (R$)' },
-            showlegend: false,
-            margin: { t: 50, b: 50, l: 60, r: 20 }
-        };
-        
-        Plotly.newPlot('vso-chart', [trace3], layout2, {responsive: true});
+        function desenharVso(vsoData) {
+            var trace3 = {
+                x: vsoData.meses,
+                y: vsoData.vso_tickets,
+                type: 'bar',
+                name: 'VSO Ticket Médio',
+                marker: { color: 'rgba(23, 162, 184, 0.8)' }
+            };
+            
+            var layout2 = {
+                title: 'VSO Ticket Médio',
+                xaxis: { title: 'Mês' },
+                yaxis: { title: 'Valor (R$)' },
+                showlegend: false,
+                margin: { t: 50, b: 50, l: 60, r: 20 }
+            };
+            
+            Plotly.react('vso-chart', [trace3], layout2, {responsive: true});
+        }
 
         // Gráfico Prosoluto
-        var prosolutData = {{ prosoluto_chart_data|tojson }};
-        
-        var trace4 = {
-            x: prosolutData.meses,
-            y: prosolutData.valores_prosoluto,
-            type: 'bar',
-            name: 'Valor Prosoluto',
-            marker: { color: 'rgba(220, 53, 69, 0.8)' }
-        };
-        
-        var layout3 = {
-            title: 'Evolução do Prosoluto',
-            xaxis: { title: 'Mês' },
-            yaxis: { title: 'Valor (R$)' },
-            showlegend: false,
-            margin: { t: 50, b: 50, l: 60, r: 20 }
+        function desenharProsoluto(prosolutData) {
+            var trace4 = {
+                x: prosolutData.meses,
+                y: prosolutData.valores_prosoluto,
+                type: 'bar',
+                name: 'Valor Prosoluto',
+                marker: { color: 'rgba(220, 53, 69, 0.8)' }
+            };
+            
+            var layout3 = {
+                title: 'Evolução do Prosoluto',
+                xaxis: { title: 'Mês' },
+                yaxis: { title: 'Valor (R$)' },
+                showlegend: false,
+                margin: { t: 50, b: 50, l: 60, r: 20 }
+            };
+            
+            Plotly.react('prosoluto-chart', [trace4], layout3, {responsive: true});
+        }
+
+        // "Última sync" relativa ao momento da visita
+        function atualizarUltimaSync() {
+            var lastSync = document.getElementById('last-sync');
+            if (lastSync.dataset.sync) {
+                var horas = Math.floor((Date.now() - new Date(lastSync.dataset.sync).getTime()) / 3600000);
+                lastSync.textContent = horas <= 0 ? 'Agora mesmo' : (horas === 1 ? '1 hora atrás' : horas + ' horas atrás');
+            }
+        }
+
+        function mostrarSync(status) {
+            var lastSync = document.getElementById('last-sync');
+            lastSync.dataset.sync = status.last_sync_iso || '';
+            lastSync.textContent = status.last_sync;
+            atualizarUltimaSync();
+            iniciarEventos(status.geracao);
+        }
+
+        // Cada widget busca seus dados em /api/widgets/<nome> de forma independente:
+        // um agregado lento atrasa (ou deixa indisponível) só o próprio card
+        var WIDGETS = {
+            'sync': mostrarSync,
+            'kpis': mostrarKpis,
+            'vendas-mensais': desenharVendasMensais,
+            'vso': desenharVso,
+            'prosoluto': desenharProsoluto,
+            'top-empreendimentos': function(linhas) {
+                preencherTabela('top-empreendimentos', linhas, function(emp) {
+                    return '<td><strong>' + escapar(emp.empreendimento) + '</strong></td>' +
+                        '<td><span class="badge bg-success">' + emp.quantidade_vendas + '</span></td>' +
+                        '<td>' + reais(emp.valor_total_vendas) + '</td>' +
+                        '<td>' + reais(emp.ticket_medio) + '</td>';
+                });
+            },
+            'top-corretores': function(linhas) {
+                preencherTabela('top-corretores', linhas, function(corretor) {
+                    return '<td><strong>' + escapar(corretor.corretor) + '</strong></td>' +
+                        '<td><small>' + escapar(corretor.time_corretor || 'N/A') + '</small></td>' +
+                        '<td><span class="badge bg-primary">' + corretor.quantidade_vendas + '</span></td>' +
+                        '<td>' + reais(corretor.valor_total_vendas) + '</td>';
+                });
+            },
+            'times': function(linhas) {
+                preencherTabela('times', linhas, function(time) {
+                    return '<td><strong>' + escapar(time.time_corretor) + '</strong></td>' +
+                        '<td>' + time.total_corretores + '</td>' +
+                        '<td><span class="badge bg-warning">' + time.quantidade_vendas + '</span></td>' +
+                        '<td>' + reais(time.valor_total_vendas) + '</td>' +
+                        '<td>' + reais(time.ticket_medio) + '</td>';
+                });
+            }
         };
-        
-        Plotly.newPlot('prosoluto-chart', [trace4], layout3, {responsive: true});
 
-        // Auto-refresh a cada 10 minutos
-        setTimeout(function() {
-            location.reload();
-        }, 600000);
+        function mostrarWidget(nome, dados) {
+            WIDGETS[nome](dados);
+            var status = document.querySelector('[data-status="' + nome + '"]');
+            if (status) status.textContent = '';
+        }
+
+        function carregarWidget(nome) {
+            return fetch('/api/widgets/' + nome).then(function(r) {
+                if (!r.ok) throw new Error(r.status);
+                return r.json();
+            }).then(function(dados) {
+                mostrarWidget(nome, dados);
+            }).catch(function() {
+                var status = document.querySelector('[data-status="' + nome + '"]');
+                if (status) status.textContent = 'Dados indisponíveis no momento';
+                if (nome === 'sync') iniciarEventos(null);
+            });
+        }
+
+        Object.keys(WIDGETS).forEach(carregarWidget);
+        setInterval(atualizarUltimaSync, 60000);
+
+        // Sincronização nova: KPIs e gráficos vêm no próprio evento, tabelas são buscadas de novo
+        function aplicarPainel(painel) {
+            mostrarWidget('sync', painel.sync_status);
+            mostrarWidget('kpis', painel.kpis);
+            mostrarWidget('vendas-mensais', painel.vendas_mensais);
+            mostrarWidget('vso', painel.vso);
+            mostrarWidget('prosoluto', painel.prosoluto);
+            ['top-empreendimentos', 'top-corretores', 'times'].forEach(carregarWidget);
+        }
+
+        // Atualização por server-sent events: o servidor só envia algo quando o
+        // ETL conclui uma sincronização (nova geração). Sem SSE, ou com o
+        // servidor sem vagas, consulta /api/painel a cada 10 minutos (ETag/304).
+        var eventosIniciados = false;
+        function consultarPainel() {
+            var ultimo = null;
+            function consultar() {
+                fetch('/api/painel', {cache: 'no-cache'}).then(function(r) { return r.text(); }).then(function(texto) {
+                    if (ultimo !== null && texto !== ultimo) aplicarPainel(JSON.parse(texto));
+                    ultimo = texto;
+                });
+            }
+            consultar();
+            setInterval(consultar, 600000);
+        }
+        function iniciarEventos(geracao) {
+            if (eventosIniciados) return;
+            eventosIniciados = true;
+            if (!window.EventSource) {
+                consultarPainel();
+                return;
+            }
+            var eventos = new EventSource('/api/eventos' + (geracao !== null && geracao !== undefined ? '?geracao=' + geracao : ''));
+            eventos.addEventListener('geracao', function(e) {
+                aplicarPainel(JSON.parse(e.data));
+            });
+            eventos.onerror = function() {
+                if (eventos.readyState === EventSource.CLOSED) consultarPainel();
+            };
+        }
     </script>
 </body>
 </html>
 """
 
+def _jsonable(value):
+    """Resultado das views com Decimal/date convertidos para float/ISO (JSON numérico no navegador)"""
+    if isinstance(value, dict):
+        return {key: _jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(item) for item in value]
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if value is not None and not isinstance(value, (int, float, str, bool)) and hasattr(value, '__float__'):
+        return float(value)
+    return value
+
+# Widgets do dashboard: nome -> (gerador, statement_timeout em ms). Cada um tem
+# endpoint próprio (/api/widgets/<nome>), snapshot publicado e cache por geração
+WIDGETS = {
+    'sync': (lambda data: data.get_sync_status(), 2000),
+    'kpis': (lambda data: _jsonable(data.get_kpis()), 8000),
+    'vendas-mensais': (lambda data: data.get_vendas_mensais_chart_data(), 5000),
+    'vso': (lambda data: data.get_vso_chart_data(), 5000),
+    'prosoluto': (lambda data: data.get_prosoluto_chart_data(), 5000),
+    'top-empreendimentos': (lambda data: _jsonable(data.get_top_empreendimentos()), 5000),
+    'top-corretores': (lambda data: _jsonable(data.get_top_corretores()), 5000),
+    'times': (lambda data: _jsonable(data.get_vendas_por_time()), 5000)
+}
+
+def tabela_geral_vendas_payload(data):
+    """Últimas 1000 vendas da vw_tabela_geral_vendas (JSON serializável)"""
+    with data.read_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute("""
+                SELECT * FROM vw_tabela_geral_vendas
+                ORDER BY data_venda DESC
+                LIMIT 1000
+            """)
+            
+            vendas = cursor.fetchall()
+            
+            # Converter para formato JSON serializável
+            result = []
+            for venda in vendas:
+                item = dict(venda)
+                # Converter datas e decimais para string
+                for key, value in item.items():
+                    if hasattr(value, 'isoformat'):
+                        item[key] = value.isoformat()
+                    elif hasattr(value, '__float__'):
+                        item[key] = float(value) if value is not None else 0
+                result.append(item)
+            
+            return {
+                'total': len(result),
+                'vendas': result
+            }
+
+def comparacao_anual_payload(data):
+    """Linhas da vw_vendas_ano_atual_vs_passado"""
+    with data.read_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute("SELECT * FROM vw_vendas_ano_atual_vs_passado ORDER BY ano DESC")
+            return [dict(row) for row in cursor.fetchall()]
+
+def painel_payload(data):
+    """KPIs e dados dos gráficos para atualizar uma página aberta sem recarregá-la"""
+    return {
+        'sync_status': data.get_sync_status(),
+        'kpis': _jsonable(data.get_kpis()),
+        'vendas_mensais': data.get_vendas_mensais_chart_data(),
+        'vso': data.get_vso_chart_data(),
+        'prosoluto': data.get_prosoluto_chart_data()
+    }
+
+# Conteúdo pré-renderizado a cada sincronização: nome -> (content type, gerador)
+SNAPSHOT_CONTENT = {
+    'api/kpis': ('application/json', lambda data: data.get_kpis()),
+    'api/vendas-mensais': ('application/json', lambda data: data.get_vendas_mensais_chart_data()),
+    'api/tabela-geral-vendas': ('application/json', tabela_geral_vendas_payload),
+    'api/comparacao-anual': ('application/json', comparacao_anual_payload),
+    'api/painel': ('application/json', painel_payload),
+    **{f'api/widgets/{name}': ('application/json', build) for name, (build, _) in WIDGETS.items()}
+}
+
+def publish_snapshot(generation, data=None, schema=None):
+    """Gera os payloads da API e dos widgets e grava em dashboard_snapshots
+    
+    Chamado pelo ETL ao fim de cada sincronização bem-sucedida. O conteúdo é
+    gravado já comprimido (gzip) e marcado com a geração; as rotas servem os
+    bytes diretamente enquanto essa for a geração atual. Um payload que caiu
+    no fallback de erro não é publicado (a rota calcula ao vivo). `schema`:
+    schema do tenant sincronizado.
+    """
+    data = data or DashboardData(columnar=False, schema=schema)
+    rows = []
+    with app.app_context():
+        for name, (content_type, build) in SNAPSHOT_CONTENT.items():
+            try:
+                content, ok = data.widget(build)
+            except Exception as e:
+                logging.warning(f"Snapshot de {name} não publicado: {e}")
+                continue
+            if not ok:
+                logging.warning(f"Snapshot de {name} não publicado (erro na consulta)")
+                continue
+            body = content if isinstance(content, str) else app.json.dumps(content)
+            rows.append((name, content_type, gzip.compress(body.encode('utf-8'))))
+    
+    with data.get_connection() as conn:
+        with conn.cursor() as cursor:
+            # Conteúdo que deixou de existir (ex: o antigo index.html renderizado)
+            cursor.execute("DELETE FROM dashboard_snapshots WHERE nome <> ALL(%s)", (list(SNAPSHOT_CONTENT),))
+            for name, content_type, body in rows:
+                cursor.execute("""
+                    INSERT INTO dashboard_snapshots (nome, geracao, content_type, corpo_gzip, publicado_em)
+                    VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP)
+                    ON CONFLICT (nome) DO UPDATE SET
+                        geracao = EXCLUDED.geracao,
+                        content_type = EXCLUDED.content_type,
+                        corpo_gzip = EXCLUDED.corpo_gzip,
+                        publicado_em = EXCLUDED.publicado_em
+                """, (name, generation, content_type, psycopg2.Binary(body)))
+        conn.commit()
+    
+    logging.info(f"Snapshot do dashboard publicado: geração {generation}, "
+                 f"{sum(len(body) for _, _, body in rows) // 1024} KB comprimidos")
+
+class SnapshotStore:
+    """Conteúdo publicado (dashboard_snapshots) em memória, servido sem renderizar
+    
+    Só vale o snapshot da geração atual: se uma sincronização terminou e a
+    publicação ainda não aconteceu (ou falhou), as rotas renderizam ao vivo.
+    """
+    
+    def __init__(self, data=None):
+        self._data = data
+        self.generation = None
+        self.entries = {}
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+    
+    def get(self, name):
+        """(content type, corpo gzip, geração) de `name`, ou None"""
+        try:
+            data = self._data or get_dashboard_data()
+        except Exception as e:
+            logging.warning(f"Snapshot publicado indisponível: {e}")
+            return None
+        if time.monotonic() - self._checked_at >= data.generation_check_interval:
+            with self._lock:
+                try:
+                    self._refresh(data)
+                except Exception as e:
+                    logging.warning(f"Snapshot publicado indisponível: {e}")
+                    self.generation, self.entries = None, {}
+                self._checked_at = time.monotonic()
+        entry = self.entries.get(name)
+        return (*entry, self.generation) if entry else None
+    
+    def _refresh(self, data):
+        generation = data.generation()
+        if generation == self.generation:
+            return
+        with data.read_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT nome, content_type, corpo_gzip FROM dashboard_snapshots WHERE geracao = %s
+                """, (generation,))
+                self.entries = {nome: (content_type, bytes(corpo)) for nome, content_type, corpo in cursor.fetchall()}
+        # Sem conteúdo para a geração atual: não fixa a geração, tenta de novo na próxima verificação
+        self.generation = generation if self.entries else None
+    
+    def response(self, name):
+        """Response pronta para `name` (gzip quando o cliente aceita, ETag por geração), ou None"""
+        entry = self.get(name)
+        if entry is None:
+            return None
+        content_type, body, generation = entry
+        return gzip_response(body, content_type, f'"{generation}-{name}"')
+
+def gzip_response(body, content_type, etag, cache_control='no-cache'):
+    """Response de um corpo já comprimido: 304 pelo ETag, gzip direto ou descomprimido"""
+    if etag in request.headers.get('If-None-Match', ''):
+        return Response(status=304, headers={'ETag': etag, 'Cache-Control': cache_control})
+    
+    headers = {'ETag': etag, 'Vary': 'Accept-Encoding', 'Cache-Control': cache_control}
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        headers['Content-Encoding'] = 'gzip'
+    else:
+        body = gzip.decompress(body)
+    return Response(body, content_type=content_type, headers=headers)
+
+snapshots = SnapshotStore()
+
+# O shell não depende dos dados: comprimido uma vez no import, ETag pelo conteúdo
+_SHELL_GZIP = gzip.compress(DASHBOARD_SHELL.encode('utf-8'))
+_SHELL_ETAG = f'"shell-{hashlib.sha1(_SHELL_GZIP).hexdigest()[:12]}"'
+
 @app.route('/')
 def dashboard():
-    """Dashboard principal focado em análises de vendas"""
+    """Dashboard principal focado em análises de vendas (shell estático; dados via /api/widgets)"""
+    return gzip_response(_SHELL_GZIP, 'text/html; charset=utf-8', _SHELL_ETAG, 'public, max-age=300')
+
+@app.route('/api/widgets/<nome>')
+def api_widget(nome):
+    """Dados de um widget do dashboard, com statement_timeout próprio"""
+    if nome not in WIDGETS:
+        return jsonify({"error": f"Widget desconhecido: {nome}"}), 404
+    published = snapshots.response(f'api/widgets/{nome}')
+    if published is not None:
+        return published
+    build, timeout_ms = WIDGETS[nome]
     try:
-        # Carregar todos os dados necessários
-        kpis = dashboard_data.get_kpis()
-        vendas_mensais_chart_data = dashboard_data.get_vendas_mensais_chart_data()
-        vso_chart_data = dashboard_data.get_vso_chart_data()
-        prosoluto_chart_data = dashboard_data.get_prosoluto_chart_data()
-        top_empreendimentos = dashboard_data.get_top_empreendimentos()
-        top_corretores = dashboard_data.get_top_corretores()
-        vendas_por_time = dashboard_data.get_vendas_por_time()
-        sync_status = dashboard_data.get_sync_status()
-        
-        return render_template_string(
-            DASHBOARD_TEMPLATE,
-            kpis=kpis,
-            vendas_mensais_chart_data=vendas_mensais_chart_data,
-            vso_chart_data=vso_chart_data,
-            prosoluto_chart_data=prosoluto_chart_data,
-            top_empreendimentos=top_empreendimentos,
-            top_corretores=top_corretores,
-            vendas_por_time=vendas_por_time,
-            sync_status=sync_status
-        )
+        content, ok = get_dashboard_data().widget(build, timeout_ms)
     except Exception as e:
-        logging.error(f"Erro no dashboard: {e}")
-        return f"Erro ao carregar dashboard de vendas: {e}", 500
+        logging.error(f"Erro no widget {nome}: {e}")
+        ok = False
+    if not ok:
+        return jsonify({"error": f"Widget {nome} indisponível"}), 503
+    return jsonify(content)
+
+def _circuit_states(cursor):
+    """Disjuntores da API por worker do ETL (etl_circuito), atualizados na última hora
+    
+    Um circuito aberto é regravado a cada tentativa de teste; linhas mais
+    antigas são de workers que já não existem.
+    """
+    cursor.execute("SELECT to_regclass('etl_circuito') IS NOT NULL")
+    if not cursor.fetchone()[0]:
+        return {}
+    cursor.execute("""
+        SELECT worker, estado FROM etl_circuito
+        WHERE atualizado_em > CURRENT_TIMESTAMP - INTERVAL '1 hour'
+        ORDER BY worker
+    """)
+    return {worker: state for worker, state in cursor.fetchall()}
 
 @app.route('/health')
 def health():
     """Health check para monitoring"""
     try:
-        with dashboard_data.get_connection() as conn:
+        data = get_dashboard_data()
+        with data.get_connection() as conn:
             with conn.cursor() as cursor:
                 cursor.execute("SELECT 1")
+                circuits = _circuit_states(cursor)
         
+        # API do CVCRM fora do ar não derruba o dashboard (dados já carregados): só "degraded"
+        api_down = any(
+            state['global']['estado'] != 'fechado'
+            or any(endpoint['estado'] != 'fechado' for endpoint in state['endpoints'].values())
+            for state in circuits.values()
+        )
         return jsonify({
-            "status": "healthy",
+            "status": "degraded" if api_down else "healthy",
             "timestamp": datetime.now().isoformat(),
-            "service": "cvcrm-etl-dashboard"
+            "service": "cvcrm-etl-dashboard",
+            "cvcrm_api": circuits,
+            # Réplica de leitura: em dia (atende o dashboard) ou atrasada/indisponível (primário)
+            "replica_leitura": (("em_dia" if data.replica_ready() else "primario") if data.read_url else None)
         }), 200
         
     except Exception as e:
@@ -818,8 +1544,11 @@ def health():
 @app.route('/api/kpis')
 def api_kpis():
     """API endpoint para KPIs"""
+    published = snapshots.response('api/kpis')
+    if published is not None:
+        return published
     try:
-        kpis = dashboard_data.get_kpis()
+        kpis = get_dashboard_data().get_kpis()
         return jsonify(kpis)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -827,8 +1556,11 @@ def api_kpis():
 @app.route('/api/vendas-mensais')
 def api_vendas_mensais():
     """API endpoint para dados de vendas mensais"""
+    published = snapshots.response('api/vendas-mensais')
+    if published is not None:
+        return published
     try:
-        data = dashboard_data.get_vendas_mensais_chart_data()
+        data = get_dashboard_data().get_vendas_mensais_chart_data()
         return jsonify(data)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -836,51 +1568,86 @@ def api_vendas_mensais():
 @app.route('/api/tabela-geral-vendas')
 def api_tabela_geral_vendas():
     """API endpoint para tabela geral de vendas"""
+    published = snapshots.response('api/tabela-geral-vendas')
+    if published is not None:
+        return published
     try:
-        with dashboard_data.get_connection() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-                cursor.execute("""
-                    SELECT * FROM vw_tabela_geral_vendas
-                    ORDER BY data_venda DESC
-                    LIMIT 1000
-                """)
-                
-                vendas = cursor.fetchall()
-                
-                # Converter para formato JSON serializável
-                result = []
-                for venda in vendas:
-                    item = dict(venda)
-                    # Converter datas e decimais para string
-                    for key, value in item.items():
-                        if hasattr(value, 'isoformat'):
-                            item[key] = value.isoformat()
-                        elif hasattr(value, '__float__'):
-                            item[key] = float(value) if value is not None else 0
-                    result.append(item)
-                
-                return jsonify({
-                    'total': len(result),
-                    'vendas': result
-                })
-                
+        return jsonify(tabela_geral_vendas_payload(get_dashboard_data()))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/comparacao-anual')
 def api_comparacao_anual():
     """API endpoint para comparação anual"""
+    published = snapshots.response('api/comparacao-anual')
+    if published is not None:
+        return published
     try:
-        with dashboard_data.get_connection() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-                cursor.execute("SELECT * FROM vw_vendas_ano_atual_vs_passado ORDER BY ano DESC")
-                data = cursor.fetchall()
-                
-                return jsonify([dict(row) for row in data])
-                
+        return jsonify(comparacao_anual_payload(get_dashboard_data()))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/painel')
+def api_painel():
+    """API endpoint com KPIs e gráficos do dashboard (mesmo conteúdo dos eventos)"""
+    published = snapshots.response('api/painel')
+    if published is not None:
+        return published
+    try:
+        return jsonify(painel_payload(get_dashboard_data()))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Cada conexão SSE ocupa uma thread do worker enquanto está aberta: o número de
+# conexões por worker é limitado (o excedente recebe 503 e a página passa a
+# consultar /api/painel) e cada conexão é encerrada após SSE_MAX_SECONDS (o
+# navegador reconecta sozinho, informando a última geração recebida)
+SSE_MAX_STREAMS = int(os.getenv('DASHBOARD_SSE_MAX_STREAMS', max(1, int(os.getenv('GUNICORN_THREADS', '8')) // 2)))
+SSE_MAX_SECONDS = float(os.getenv('DASHBOARD_SSE_MAX_SECONDS', '300'))
+SSE_PING_SECONDS = float(os.getenv('DASHBOARD_SSE_PING_SECONDS', '15'))
+_sse_slots = threading.BoundedSemaphore(SSE_MAX_STREAMS)
+
+def _painel_event_data():
+    """JSON do painel em uma linha: o publicado para a geração atual ou calculado na hora"""
+    entry = snapshots.get('api/painel')
+    if entry is not None:
+        return gzip.decompress(entry[1]).decode('utf-8')
+    return app.json.dumps(painel_payload(get_dashboard_data()))
+
+def _event_stream(last_generation):
+    """Eventos 'geracao' (id = geração) só quando uma sincronização nova conclui"""
+    try:
+        data = get_dashboard_data()
+        deadline = time.monotonic() + SSE_MAX_SECONDS
+        yield "retry: 5000\n\n"
+        while True:
+            generation = data.generation()
+            if generation is not None and str(generation) != last_generation:
+                payload = _painel_event_data()
+                yield f"id: {generation}\nevent: geracao\ndata: {payload}\n\n"
+                last_generation = str(generation)
+            if time.monotonic() >= deadline:
+                return
+            time.sleep(SSE_PING_SECONDS)
+            yield ": ping\n\n"
+    except Exception as e:
+        logging.warning(f"Stream de eventos encerrado: {e}")
+
+@app.route('/api/eventos')
+def api_eventos():
+    """Server-sent events: avisa as páginas abertas quando há uma sincronização nova"""
+    if not _sse_slots.acquire(blocking=False):
+        return Response("Limite de conexões de eventos atingido", status=503, mimetype='text/plain')
+    last_generation = request.headers.get('Last-Event-ID') or request.args.get('geracao')
+    response = Response(
+        _event_stream(last_generation),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # Libera a vaga quando o servidor fecha a resposta (fim do stream ou cliente desconectado)
+    response.call_on_close(_sse_slots.release)
+    return response
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     debug = os.environ.get('RAILWAY_ENVIRONMENT') != 'production'
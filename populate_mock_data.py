@@ -1,176 +1,336 @@
 #!/usr/bin/env python3
 """
-Popula banco com dados mock para testar estrutura das tabelas
-Usado temporariamente enquanto API CVDW tem problema 405
+Gerador de dados sintéticos para testes de carga e de planos de consulta
+
+Gera empreendimentos, unidades, vendas e prosoluto na escala pedida (de 10
+mil a 10 milhões de vendas) e grava com COPY, em lotes. As distribuições
+imitam as de produção:
+
+- poucos corretores e empreendimentos concentram a maior parte das vendas
+  (pesos de Zipf);
+- data_venda tem sazonalidade (meses fortes no fim do ano e em março,
+  quedas em janeiro e julho, pouco movimento no domingo) e tendência de
+  crescimento;
+- comissão e prosoluto são proporcionais ao valor da venda.
+
+A geração é determinística para a mesma semente, escala e lote. No fim o
+cubo de vendas é reconstruído, as tabelas são analisadas e a carga fica
+registrada em etl_sync_runs (modo 'mock'), para o dashboard trocar de geração.
+
+Uso: python populate_mock_data.py [--scale 100k] [--meses 36] [--semente 42]
+                                  [--lote 200000] [--limpar]
 """
-import os
-import psycopg2
-from datetime import datetime, timedelta
+import io
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
 from dotenv import load_dotenv
+from main import CloudDatabaseManager, _add_months
 
 load_dotenv()
 
-def get_connection():
-    return psycopg2.connect(os.getenv('DATABASE_URL'))
+PRIMEIROS_NOMES = ['Ana', 'Bruno', 'Carla', 'Daniel', 'Eduarda', 'Felipe', 'Gabriela', 'Henrique',
+                   'Isabela', 'João', 'Juliana', 'Lucas', 'Mariana', 'Nicolas', 'Patrícia', 'Rafael',
+                   'Sofia', 'Thiago', 'Vanessa', 'Vinícius']
+SOBRENOMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Rodrigues', 'Ferreira', 'Alves', 'Pereira',
+              'Lima', 'Gomes', 'Costa', 'Ribeiro', 'Martins', 'Carvalho', 'Almeida', 'Lopes']
+PREFIXOS = ['Residencial', 'Edifício', 'Condomínio', 'Park', 'Vila', 'Jardins']
+NOMES_EMPREENDIMENTOS = ['Sol Nascente', 'Vista Mar', 'Bosque Verde', 'Alto da Serra', 'Boa Vista',
+                         'Primavera', 'Porto Belo', 'Horizonte', 'Ipês', 'Águas Claras']
+CIDADES = [('São Paulo', 'SP'), ('Santos', 'SP'), ('Campinas', 'SP'), ('Curitiba', 'PR'),
+           ('Belo Horizonte', 'MG'), ('Rio de Janeiro', 'RJ'), ('Florianópolis', 'SC'), ('Goiânia', 'GO')]
+
+# Peso de cada mês do ano (janeiro a dezembro) e de cada dia da semana (segunda a domingo)
+SAZONALIDADE_MES = np.array([0.75, 0.9, 1.1, 1.05, 1.0, 0.95, 0.8, 0.95, 1.0, 1.05, 1.15, 1.25])
+SAZONALIDADE_SEMANA = np.array([1.0, 1.0, 1.0, 1.05, 1.1, 0.8, 0.35])
+
+CENTAVOS = np.array([f".{i:02d}" for i in range(100)], dtype=object)
+PERCENTUAIS_PROSOLUTO = np.array([f"{1 + i * 0.25:.2f}" for i in range(9)], dtype=object)
+
+# Colunas gravadas por tabela, na ordem dos lotes de MockDataGenerator.batch
+COLUNAS = {
+    'unidades': ['cvcrm_id', 'empreendimento_id', 'numero', 'bloco', 'andar', 'tipologia_id',
+                 'area_privativa', 'area_total', 'valor_tabela', 'valor_venda', 'status', 'created_at'],
+    'vendas': ['cvcrm_id', 'reserva_id', 'empreendimento', 'unidade_id', 'corretor', 'time_corretor',
+               'cliente', 'valor', 'data_venda', 'ativo', 'status', 'comissao_valor', 'comissao_percentual',
+               'valor_financiamento', 'valor_entrada', 'numero_parcelas', 'vgv', 'created_at'],
+    'prosoluto': ['cvcrm_id', 'venda_id', 'empreendimento_id', 'corretor_id', 'valor_prosoluto',
+                  'percentual_prosoluto', 'data_calculo', 'data_pagamento', 'status', 'created_at']
+}
+
+def escala(valor):
+    """Número de vendas: inteiro ou com sufixo k/M (ex: 250k, 10M)"""
+    texto = valor.strip().lower()
+    multiplicador = {'k': 1_000, 'm': 1_000_000}.get(texto[-1:], 1)
+    try:
+        numero = int(float(texto.rstrip('km')) * multiplicador)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"escala inválida: {valor}")
+    if numero < 1:
+        raise argparse.ArgumentTypeError("a escala precisa ser positiva")
+    return numero
+
+def zipf(n, expoente, rng):
+    """Pesos de Zipf (somam 1) em ordem embaralhada: o mais popular não é sempre o id 1"""
+    pesos = 1.0 / np.arange(1, n + 1) ** expoente
+    return rng.permutation(pesos / pesos.sum())
 
-def create_mock_data():
-    """Cria dados mock realistas para teste"""
+class MockDataGenerator:
+    """Dimensões (empreendimentos, corretores, dias) e lotes de vendas de uma escala"""
     
-    # Mock Empreendimentos
-    empreendimentos = [
-        {
-            'cvcrm_id': 1,
-            'nome': 'Residencial Sol Nascente',
-            'endereco': 'Rua das Flores, 123, Vila Olímpia',
-            'cidade': 'São Paulo',
-            'estado': 'SP', 
-            'cep': '04552-000',
-            'status': 'Lancamento',
-            'vgv': 45000000.00,
-            'data_lancamento': '2024-01-15',
-            'created_at': datetime.now()
-        },
-        {
-            'cvcrm_id': 2,
-            'nome': 'Edificio Vista Mar Premium',
-            'endereco': 'Av. Beira Mar, 456, Gonzaga',
-            'cidade': 'Santos',
-            'estado': 'SP',
-            'cep': '11055-100', 
-            'status': 'Obras',
-            'vgv': 78000000.00,
-            'data_lancamento': '2024-03-20',
-            'created_at': datetime.now()
-        },
-        {
-            'cvcrm_id': 3,
-            'nome': 'Condominio Park Residence',
-            'endereco': 'Rua dos Jardins, 789, Morumbi',
-            'cidade': 'São Paulo', 
-            'estado': 'SP',
-            'cep': '05650-000',
-            'status': 'Vendas',
-            'vgv': 62000000.00,
-            'data_lancamento': '2024-05-10',
-            'created_at': datetime.now()
-        }
-    ]
+    def __init__(self, scale, months=36, seed=42, today=None):
+        self.scale = scale
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        
+        # Empreendimentos: preço base lognormal (mediana ~R$ 450 mil) por praça
+        self.n_empreendimentos = int(np.clip(scale // 20_000, 5, 500))
+        self.pesos_empreendimentos = zipf(self.n_empreendimentos, 0.9, rng)
+        self.preco_base = np.round(rng.lognormal(np.log(450_000), 0.45, self.n_empreendimentos), -3)
+        self.preco_m2 = rng.uniform(6_000, 14_000, self.n_empreendimentos)
+        self.cidades = rng.integers(0, len(CIDADES), self.n_empreendimentos)
+        self.nomes_empreendimentos = np.array([
+            f"{PREFIXOS[i % len(PREFIXOS)]} {NOMES_EMPREENDIMENTOS[(i // len(PREFIXOS)) % len(NOMES_EMPREENDIMENTOS)]}"
+            + (f" {i // (len(PREFIXOS) * len(NOMES_EMPREENDIMENTOS)) + 1}"
+               if i >= len(PREFIXOS) * len(NOMES_EMPREENDIMENTOS) else '')
+            for i in range(self.n_empreendimentos)
+        ], dtype=object)
+        
+        # Corretores: mais concentrados que os empreendimentos; cada um num time e com seu percentual
+        self.n_corretores = int(np.clip(scale // 2_000, 20, 5_000))
+        self.pesos_corretores = zipf(self.n_corretores, 1.1, rng)
+        combinacoes = len(PRIMEIROS_NOMES) * len(SOBRENOMES)
+        self.nomes_corretores = np.array([
+            f"{PRIMEIROS_NOMES[i % len(PRIMEIROS_NOMES)]} {SOBRENOMES[(i // len(PRIMEIROS_NOMES)) % len(SOBRENOMES)]}"
+            + (f" {i // combinacoes + 1}" if i >= combinacoes else '')
+            for i in range(self.n_corretores)
+        ], dtype=object)
+        n_times = max(3, self.n_corretores // 15)
+        self.times = np.array([f"Time {i + 1}" for i in range(n_times)], dtype=object)[
+            rng.integers(0, n_times, self.n_corretores)]
+        self.percentual_comissao = np.round(rng.uniform(3.5, 6.0, self.n_corretores), 2)
+        self.percentual_texto = np.array([f"{p:.2f}" for p in self.percentual_comissao], dtype=object)
+        
+        # Dias: sazonalidade mensal e semanal com crescimento de ~50% no período
+        self.today = today or date.today()
+        self.start = _add_months(self.today.replace(day=1), -months + 1)
+        self.days = pd.date_range(self.start, self.today, freq='D')
+        tendencia = np.linspace(0.8, 1.2, len(self.days))
+        pesos = SAZONALIDADE_MES[self.days.month - 1] * SAZONALIDADE_SEMANA[self.days.dayofweek] * tendencia
+        self.pesos_dias = pesos / pesos.sum()
+        self.dias_texto = self.days.strftime('%Y-%m-%d').to_numpy(dtype=object)
     
-    # Mock Unidades
-    unidades = [
-        {'cvcrm_id': 101, 'empreendimento_id': 1, 'numero': '101', 'bloco': 'A', 'andar': 1, 'tipologia_id': 1, 'area_privativa': 65.50, 'area_total': 78.30, 'valor_tabela': 480000.00, 'valor_venda': 450000.00, 'status': 'Vendido', 'created_at': datetime.now()},
-        {'cvcrm_id': 102, 'empreendimento_id': 1, 'numero': '102', 'bloco': 'A', 'andar': 1, 'tipologia_id': 1, 'area_privativa': 67.20, 'area_total': 80.10, 'valor_tabela': 490000.00, 'valor_venda': 465000.00, 'status': 'Vendido', 'created_at': datetime.now()},
-        {'cvcrm_id': 201, 'empreendimento_id': 2, 'numero': '201', 'bloco': 'B', 'andar': 2, 'tipologia_id': 2, 'area_privativa': 95.20, 'area_total': 110.80, 'valor_tabela': 820000.00, 'valor_venda': 780000.00, 'status': 'Vendido', 'created_at': datetime.now()},
-        {'cvcrm_id': 202, 'empreendimento_id': 2, 'numero': '202', 'bloco': 'B', 'andar': 2, 'tipologia_id': 2, 'area_privativa': 98.50, 'area_total': 115.20, 'valor_tabela': 850000.00, 'valor_venda': 810000.00, 'status': 'Vendido', 'created_at': datetime.now()},
-        {'cvcrm_id': 301, 'empreendimento_id': 3, 'numero': '301', 'bloco': 'C', 'andar': 3, 'tipologia_id': 3, 'area_privativa': 120.00, 'area_total': 140.50, 'valor_tabela': 950000.00, 'valor_venda': 920000.00, 'status': 'Vendido', 'created_at': datetime.now()}
-    ]
+    def empreendimentos(self):
+        """Colunas dos empreendimentos (lançados antes da primeira venda)"""
+        ids = np.arange(1, self.n_empreendimentos + 1)
+        rng = np.random.default_rng([self.seed, 0])
+        lancamento = [self.start - timedelta(days=int(d)) for d in rng.integers(30, 720, self.n_empreendimentos)]
+        unidades = np.maximum(1, np.round(self.pesos_empreendimentos * self.scale * 1.25))
+        return {
+            'cvcrm_id': ids,
+            'nome': self.nomes_empreendimentos,
+            'endereco': np.array([f"Rua {SOBRENOMES[i % len(SOBRENOMES)]}, {100 + i}"
+                                  for i in range(self.n_empreendimentos)], dtype=object),
+            'cidade': np.array([CIDADES[c][0] for c in self.cidades], dtype=object),
+            'estado': np.array([CIDADES[c][1] for c in self.cidades], dtype=object),
+            'cep': np.array([f"{c}-000" for c in rng.integers(10_000, 99_999, self.n_empreendimentos)], dtype=object),
+            'status': np.full(self.n_empreendimentos, 'Vendas', dtype=object),
+            'vgv': (self.preco_base * unidades).astype(np.int64),
+            'data_lancamento': np.array([d.isoformat() for d in lancamento], dtype=object),
+            'created_at': np.array([d.isoformat() for d in lancamento], dtype=object)
+        }
     
-    # Mock Vendas (baseado em estrutura CVDW reservas) - distribuídas pelos últimos 6 meses
-    base_date = datetime.now() - timedelta(days=180)
-    vendas = [
-        {'cvcrm_id': 1, 'reserva_id': 1001, 'empreendimento': 'Residencial Sol Nascente', 'unidade_id': 101, 'corretor': 'João Silva Santos', 'time_corretor': 'Team Alpha', 'cliente': 'Maria Santos Oliveira', 'valor': 450000.00, 'data_venda': (base_date + timedelta(days=30)).date(), 'ativo': 'S', 'status': 'Vendido', 'comissao_valor': 22500.00, 'vgv': 450000.00, 'created_at': datetime.now()},
-        {'cvcrm_id': 2, 'reserva_id': 1002, 'empreendimento': 'Residencial Sol Nascente', 'unidade_id': 102, 'corretor': 'João Silva Santos', 'time_corretor': 'Team Alpha', 'cliente': 'Pedro Costa Lima', 'valor': 465000.00, 'data_venda': (base_date + timedelta(days=45)).date(), 'ativo': 'S', 'status': 'Vendido', 'comissao_valor': 23250.00, 'vgv': 465000.00, 'created_at': datetime.now()},
-        {'cvcrm_id': 3, 'reserva_id': 2001, 'empreendimento': 'Edificio Vista Mar Premium', 'unidade_id': 201, 'corretor': 'Ana Costa Ferreira', 'time_corretor': 'Team Beta', 'cliente': 'Ricardo Mendes', 'valor': 780000.00, 'data_venda': (base_date + timedelta(days=60)).date(), 'ativo': 'S', 'status': 'Vendido', 'comissao_valor': 39000.00, 'vgv': 780000.00, 'created_at': datetime.now()},
-        {'cvcrm_id': 4, 'reserva_id': 2002, 'empreendimento': 'Edificio Vista Mar Premium', 'unidade_id': 202, 'corretor': 'Carlos Rodrigues', 'time_corretor': 'Team Beta', 'cliente': 'Juliana Almeida', 'valor': 810000.00, 'data_venda': (base_date + timedelta(days=90)).date(), 'ativo': 'S', 'status': 'Vendido', 'comissao_valor': 40500.00, 'vgv': 810000.00, 'created_at': datetime.now()},
-        {'cvcrm_id': 5, 'reserva_id': 3001, 'empreendimento': 'Condominio Park Residence', 'unidade_id': 301, 'corretor': 'Fernanda Lima', 'time_corretor': 'Team Gamma', 'cliente': 'Roberto Nascimento', 'valor': 920000.00, 'data_venda': (base_date + timedelta(days=120)).date(), 'ativo': 'S', 'status': 'Vendido', 'comissao_valor': 46000.00, 'vgv': 920000.00, 'created_at': datetime.now()}
-    ]
+    def batch(self, start_id, size):
+        """(unidades, vendas, prosoluto) das vendas start_id .. start_id + size - 1
+        
+        Cada venda é de uma unidade própria (mesmo id); o prosoluto existe em
+        ~35% das vendas e usa o id da venda. Preços em reais inteiros (como os
+        de tabela); datas e valores com centavos já vêm como texto.
+        """
+        rng = np.random.default_rng([self.seed, start_id])
+        ids = np.arange(start_id, start_id + size)
+        emp = rng.choice(self.n_empreendimentos, size, p=self.pesos_empreendimentos)
+        corretor = rng.choice(self.n_corretores, size, p=self.pesos_corretores)
+        dia = rng.choice(len(self.days), size, p=self.pesos_dias)
+        
+        valor = np.round(self.preco_base[emp] * rng.lognormal(0, 0.15, size), -2).astype(np.int64)
+        distrato = rng.random(size) < 0.06
+        comissao = centavos(valor * self.percentual_comissao[corretor] / 100)
+        # Parte das comissões ainda não lançadas no CVCRM
+        comissao[rng.random(size) < 0.05] = None
+        entrada = np.round(valor * rng.uniform(0.1, 0.3, size), -2).astype(np.int64)
+        area = np.round(valor / self.preco_m2[emp], 1)
+        
+        unidades = {
+            'cvcrm_id': ids,
+            'empreendimento_id': emp + 1,
+            'numero': (ids % 4 + 1) + (ids // 4 % 20 + 1) * 100,
+            'bloco': np.array(list('ABCD'), dtype=object)[ids % 4],
+            'andar': ids // 4 % 20 + 1,
+            'tipologia_id': np.digitize(area, [55, 80, 110]) + 1,
+            'area_privativa': area,
+            'area_total': np.round(area * 1.18, 1),
+            'valor_tabela': np.round(valor * 1.05, -2).astype(np.int64),
+            'valor_venda': valor,
+            'status': np.where(distrato, 'Disponível', 'Vendido'),
+            'created_at': np.full(size, self.dias_texto[0], dtype=object)
+        }
+        vendas = {
+            'cvcrm_id': ids,
+            'reserva_id': ids + 1_000_000_000,
+            'empreendimento': self.nomes_empreendimentos[emp],
+            'unidade_id': ids,
+            'corretor': self.nomes_corretores[corretor],
+            'time_corretor': self.times[corretor],
+            'cliente': 'Cliente ' + ids.astype(str).astype(object),
+            'valor': valor,
+            'data_venda': self.dias_texto[dia],
+            'ativo': np.where(distrato, 'N', 'S'),
+            'status': np.where(distrato, 'Distratado', 'Vendido'),
+            'comissao_valor': comissao,
+            'comissao_percentual': self.percentual_texto[corretor],
+            'valor_financiamento': valor - entrada,
+            'valor_entrada': entrada,
+            'numero_parcelas': rng.choice([120, 180, 240, 300, 360, 420], size),
+            'vgv': valor,
+            'created_at': self.dias_texto[dia]
+        }
+        
+        tem_prosoluto = rng.random(size) < 0.35
+        n = int(tem_prosoluto.sum())
+        # Percentual em passos de 0,25 entre 1% e 3%
+        passo = rng.integers(0, 9, n)
+        calculo = np.minimum(dia[tem_prosoluto] + rng.integers(0, 31, n), len(self.days) - 1)
+        pago = calculo + 30 < len(self.days) - 1
+        prosoluto = {
+            'cvcrm_id': ids[tem_prosoluto],
+            'venda_id': ids[tem_prosoluto],
+            'empreendimento_id': emp[tem_prosoluto] + 1,
+            'corretor_id': corretor[tem_prosoluto] + 1,
+            'valor_prosoluto': centavos(valor[tem_prosoluto] * (1 + passo * 0.25) / 100),
+            'percentual_prosoluto': PERCENTUAIS_PROSOLUTO[passo],
+            'data_calculo': self.dias_texto[calculo],
+            'data_pagamento': np.where(pago, self.dias_texto[np.minimum(calculo + 30, len(self.days) - 1)], None),
+            'status': np.where(distrato[tem_prosoluto], 'cancelado', np.where(pago, 'Pago', 'Pendente')),
+            'created_at': self.dias_texto[calculo]
+        }
+        return unidades, vendas, prosoluto
     
-    # Mock Prosoluto
-    prosoluto = [
-        {'cvcrm_id': 1, 'venda_id': 1, 'empreendimento_id': 1, 'corretor_id': 1, 'valor_prosoluto': 9000.00, 'percentual_prosoluto': 2.0, 'data_calculo': (base_date + timedelta(days=60)).date(), 'data_pagamento': (base_date + timedelta(days=90)).date(), 'status': 'Pago', 'created_at': datetime.now()},
-        {'cvcrm_id': 2, 'venda_id': 2, 'empreendimento_id': 1, 'corretor_id': 1, 'valor_prosoluto': 9300.00, 'percentual_prosoluto': 2.0, 'data_calculo': (base_date + timedelta(days=75)).date(), 'data_pagamento': (base_date + timedelta(days=105)).date(), 'status': 'Pago', 'created_at': datetime.now()},
-        {'cvcrm_id': 3, 'venda_id': 3, 'empreendimento_id': 2, 'corretor_id': 2, 'valor_prosoluto': 15600.00, 'percentual_prosoluto': 2.0, 'data_calculo': (base_date + timedelta(days=90)).date(), 'data_pagamento': (base_date + timedelta(days=120)).date(), 'status': 'Pago', 'created_at': datetime.now()},
-        {'cvcrm_id': 4, 'venda_id': 4, 'empreendimento_id': 2, 'corretor_id': 3, 'valor_prosoluto': 16200.00, 'percentual_prosoluto': 2.0, 'data_calculo': (base_date + timedelta(days=120)).date(), 'data_pagamento': None, 'status': 'Pendente', 'created_at': datetime.now()},
-        {'cvcrm_id': 5, 'venda_id': 5, 'empreendimento_id': 3, 'corretor_id': 4, 'valor_prosoluto': 18400.00, 'percentual_prosoluto': 2.0, 'data_calculo': (base_date + timedelta(days=150)).date(), 'data_pagamento': None, 'status': 'Pendente', 'created_at': datetime.now()}
-    ]
+    def copy_batch(self, start_id, size):
+        """{tabela: (texto do COPY, linhas)} de um lote"""
+        return {table: (copy_text([columns[c] for c in COLUNAS[table]]), len(columns['cvcrm_id']))
+                for table, columns in zip(COLUNAS, self.batch(start_id, size))}
+
+def centavos(valores):
+    """Valores em reais como texto com 2 casas (object array), sem a formatação lenta de float"""
+    total = np.round(valores * 100).astype(np.int64)
+    return (total // 100).astype(str).astype(object) + CENTAVOS[total % 100]
+
+def copy_text(columns):
+    """Linhas no formato texto do COPY (tab entre colunas, \\N = NULL) a partir dos arrays das colunas
     
-    return {
-        'empreendimentos': empreendimentos,
-        'unidades': unidades,
-        'vendas': vendas,
-        'prosoluto': prosoluto
-    }
-
-def insert_mock_data():
-    """Insere dados mock no banco"""
+    Uma formatação `%` por linha sobre listas Python custa metade do to_csv
+    do pandas. Os textos gerados não têm tab, quebra de linha nem barra
+    invertida, então dispensam escape.
+    """
+    values = [(np.where(pd.isna(column), '\\N', column) if column.dtype == object else column).tolist()
+              for column in columns]
+    line = '\t'.join(['%s'] * len(values))
+    return '\n'.join([line % row for row in zip(*values)]) + '\n'
+
+def copy_rows(cursor, table, text, columns):
+    """Grava as linhas (formato texto) com COPY"""
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", io.StringIO(text))
+
+def insert_mock_data(scale, months=36, seed=42, batch_size=200_000, clean=False):
+    """Gera e grava os dados na escala pedida"""
     
-    print("=== INSERINDO DADOS MOCK NO BANCO ===")
+    print("=== GERANDO DADOS SINTÉTICOS ===")
     
-    mock_data = create_mock_data()
+    db = CloudDatabaseManager()
+    db.create_tables()
+    generator = MockDataGenerator(scale, months, seed)
+    print(f"{scale:,} vendas de {generator.start} a {generator.today}: "
+          f"{generator.n_empreendimentos} empreendimentos, {generator.n_corretores} corretores")
     
+    inicio = time.perf_counter()
+    conn = db.get_connection()
     try:
-        with get_connection() as conn:
-            with conn.cursor() as cursor:
-                
-                print("1. Inserindo empreendimentos...")
-                for emp in mock_data['empreendimentos']:
-                    cursor.execute("""
-                        INSERT INTO empreendimentos (cvcrm_id, nome, endereco, cidade, estado, cep, status, vgv, data_lancamento, created_at, updated_at)
-                        VALUES (%(cvcrm_id)s, %(nome)s, %(endereco)s, %(cidade)s, %(estado)s, %(cep)s, %(status)s, %(vgv)s, %(data_lancamento)s, %(created_at)s, CURRENT_TIMESTAMP)
-                        ON CONFLICT (cvcrm_id) DO UPDATE SET
-                            nome = EXCLUDED.nome,
-                            endereco = EXCLUDED.endereco,
-                            status = EXCLUDED.status,
-                            updated_at = CURRENT_TIMESTAMP
-                    """, emp)
-                
-                print("2. Inserindo unidades...")
-                for unidade in mock_data['unidades']:
-                    cursor.execute("""
-                        INSERT INTO unidades (cvcrm_id, empreendimento_id, numero, bloco, andar, tipologia_id, area_privativa, area_total, valor_tabela, valor_venda, status, created_at, updated_at)
-                        VALUES (%(cvcrm_id)s, %(empreendimento_id)s, %(numero)s, %(bloco)s, %(andar)s, %(tipologia_id)s, %(area_privativa)s, %(area_total)s, %(valor_tabela)s, %(valor_venda)s, %(status)s, %(created_at)s, CURRENT_TIMESTAMP)
-                        ON CONFLICT (cvcrm_id) DO UPDATE SET
-                            valor_venda = EXCLUDED.valor_venda,
-                            status = EXCLUDED.status,
-                            updated_at = CURRENT_TIMESTAMP
-                    """, unidade)
-                
-                print("3. Inserindo vendas (nova estrutura CVDW)...")
-                for venda in mock_data['vendas']:
-                    cursor.execute("""
-                        INSERT INTO vendas (cvcrm_id, reserva_id, empreendimento, unidade_id, corretor, time_corretor, cliente, valor, data_venda, ativo, status, comissao_valor, vgv, created_at, updated_at)
-                        VALUES (%(cvcrm_id)s, %(reserva_id)s, %(empreendimento)s, %(unidade_id)s, %(corretor)s, %(time_corretor)s, %(cliente)s, %(valor)s, %(data_venda)s, %(ativo)s, %(status)s, %(comissao_valor)s, %(vgv)s, %(created_at)s, CURRENT_TIMESTAMP)
-                        ON CONFLICT (cvcrm_id) DO UPDATE SET
-                            valor = EXCLUDED.valor,
-                            ativo = EXCLUDED.ativo,
-                            status = EXCLUDED.status,
-                            updated_at = CURRENT_TIMESTAMP
-                    """, venda)
-                
-                print("4. Inserindo dados de prosoluto...")
-                for prs in mock_data['prosoluto']:
-                    cursor.execute("""
-                        INSERT INTO prosoluto (cvcrm_id, venda_id, empreendimento_id, corretor_id, valor_prosoluto, percentual_prosoluto, data_calculo, data_pagamento, status, created_at, updated_at)
-                        VALUES (%(cvcrm_id)s, %(venda_id)s, %(empreendimento_id)s, %(corretor_id)s, %(valor_prosoluto)s, %(percentual_prosoluto)s, %(data_calculo)s, %(data_pagamento)s, %(status)s, %(created_at)s, CURRENT_TIMESTAMP)
-                        ON CONFLICT (cvcrm_id) DO UPDATE SET
-                            valor_prosoluto = EXCLUDED.valor_prosoluto,
-                            status = EXCLUDED.status,
-                            updated_at = CURRENT_TIMESTAMP
-                    """, prs)
-                
+        with conn.cursor() as cursor:
+            # Carga descartável: não espera o WAL ir para o disco a cada commit
+            cursor.execute("SET synchronous_commit = off")
+            cursor.execute("SELECT EXISTS (SELECT 1 FROM vendas) OR EXISTS (SELECT 1 FROM empreendimentos)")
+            if cursor.fetchone()[0]:
+                if not clean:
+                    raise SystemExit("O banco já tem dados: use --limpar para apagá-los (use um banco de teste)")
+                print("0. Apagando dados existentes...")
+                cursor.execute("TRUNCATE vendas, prosoluto, unidades, empreendimentos, vendas_cubo CASCADE")
+            
+            month = generator.start
+            while month <= generator.today:
+                db.ensure_partition(cursor, 'vendas', month)
+                month = _add_months(month, 1)
+            
+            print("1. Gravando empreendimentos...")
+            empreendimentos = generator.empreendimentos()
+            copy_rows(cursor, 'empreendimentos', copy_text(list(empreendimentos.values())), list(empreendimentos))
             conn.commit()
-            print("\nSUCESSO! Dados mock inseridos no banco")
             
-    except Exception as e:
-        print(f"ERRO ao inserir dados mock: {e}")
-        raise
+            print("2. Gravando unidades, vendas e prosoluto...")
+            totais = dict.fromkeys(COLUNAS, 0)
+            lotes = [(start_id, min(batch_size, scale - start_id + 1)) for start_id in range(1, scale + 1, batch_size)]
+            # O próximo lote é gerado em paralelo com o COPY do atual (o COPY espera o banco)
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                proximo = executor.submit(generator.copy_batch, *lotes[0])
+                for i in range(len(lotes)):
+                    lote = proximo.result()
+                    if i + 1 < len(lotes):
+                        proximo = executor.submit(generator.copy_batch, *lotes[i + 1])
+                    for table, (text, linhas) in lote.items():
+                        copy_rows(cursor, table, text, COLUNAS[table])
+                        totais[table] += linhas
+                    conn.commit()
+                    decorrido = time.perf_counter() - inicio
+                    print(f"   {totais['vendas']:,} vendas ({totais['vendas'] / decorrido:,.0f}/s)")
+            
+            print("3. Recalculando cubo de vendas e estatísticas...")
+            db.rebuild_cube(cursor)
+            conn.commit()
+        
+        # ANALYZE fora da transação do cubo: planos realistas já na primeira consulta
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute("ANALYZE empreendimentos, unidades, vendas, prosoluto, vendas_cubo")
+    finally:
+        conn.close()
+    
+    # Geração nova: o dashboard descarta snapshot e cache da carga anterior
+    run_id = db.start_sync_run('mock')
+    db.finish_sync_run(run_id, 'sucesso', {'empreendimentos': generator.n_empreendimentos, **totais})
+    print(f"\nSUCESSO! {sum(totais.values()) + generator.n_empreendimentos:,} registros "
+          f"em {time.perf_counter() - inicio:.1f}s (geração {run_id})")
 
 def verify_data():
-    """Verifica se os dados foram inseridos corretamente"""
+    """Confere contagens, views e as distribuições geradas"""
     
     print("\n=== VERIFICANDO DADOS INSERIDOS ===")
     
     try:
-        with get_connection() as conn:
+        db = CloudDatabaseManager()
+        with db.get_connection() as conn:
             with conn.cursor() as cursor:
                 
                 # Contar registros em cada tabela
-                tabelas = ['empreendimentos', 'unidades', 'vendas', 'prosoluto']
+                tabelas = ['empreendimentos', 'unidades', 'vendas', 'prosoluto', 'vendas_cubo']
                 
                 for tabela in tabelas:
                     cursor.execute(f"SELECT COUNT(*) FROM {tabela}")
                     count = cursor.fetchone()[0]
-                    print(f"{tabela}: {count} registros")
+                    print(f"{tabela}: {count:,} registros")
                 
                 print("\n=== TESTANDO VIEWS DE ANALISE ===")
                 
@@ -185,49 +345,86 @@ def verify_data():
                 for view_name, desc in views_teste:
                     try:
                         cursor.execute(f"SELECT COUNT(*) FROM {view_name}")
-                        count = cursor.fetchone()[0] 
-                        print(f"{desc}: {count} registros")
+                        count = cursor.fetchone()[0]
+                        print(f"{desc}: {count:,} registros")
                     except Exception as e:
                         print(f"{desc}: ERRO - {e}")
                 
+                print("\n=== DISTRIBUIÇÕES ===")
+                
+                # Concentração: fatia das vendas dos 10% maiores corretores / empreendimentos
+                for coluna in ('corretor', 'empreendimento'):
+                    cursor.execute(f"""
+                        SELECT SUM(quantidade) FILTER (WHERE posicao <= GREATEST(1, total / 10))::float
+                               / SUM(quantidade)
+                        FROM (
+                            SELECT COUNT(*) AS quantidade,
+                                   ROW_NUMBER() OVER (ORDER BY COUNT(*) DESC) AS posicao,
+                                   COUNT(*) OVER () AS total
+                            FROM vendas WHERE ativo = 'S'
+                            GROUP BY {coluna}
+                        ) t
+                    """)
+                    print(f"Top 10% por {coluna}: {cursor.fetchone()[0]:.0%} das vendas")
+                
+                cursor.execute("""
+                    SELECT EXTRACT(MONTH FROM data_venda)::int AS mes, COUNT(*)
+                    FROM vendas WHERE ativo = 'S'
+                    GROUP BY 1 ORDER BY 1
+                """)
+                print("Vendas por mês do ano: " + ", ".join(f"{mes}: {n:,}" for mes, n in cursor.fetchall()))
+                
                 print("\n=== RESUMO FINANCEIRO ===")
                 
                 # Dados financeiros principais
                 cursor.execute("""
-                    SELECT 
+                    SELECT
                         COUNT(*) as total_vendas,
                         SUM(valor) as valor_total,
                         AVG(valor) as ticket_medio,
-                        SUM(comissao_valor) as total_comissoes
-                    FROM vendas 
+                        SUM(comissao_valor) as total_comissoes,
+                        (SELECT SUM(valor_prosoluto) FROM prosoluto) as total_prosoluto
+                    FROM vendas
                     WHERE ativo = 'S' AND data_venda IS NOT NULL
                 """)
                 
                 resultado = cursor.fetchone()
-                if resultado:
-                    total_vendas, valor_total, ticket_medio, total_comissoes = resultado
-                    print(f"Total de Vendas: {total_vendas}")
+                if resultado and resultado[0]:
+                    total_vendas, valor_total, ticket_medio, total_comissoes, total_prosoluto = resultado
+                    print(f"Total de Vendas: {total_vendas:,}")
                     print(f"Valor Total: R$ {valor_total:,.2f}")
                     print(f"Ticket Médio: R$ {ticket_medio:,.2f}")
-                    print(f"Total Comissões: R$ {total_comissoes:,.2f}")
+                    print(f"Total Comissões: R$ {total_comissoes:,.2f} ({total_comissoes / valor_total:.1%} do valor)")
+                    print(f"Total Prosoluto: R$ {total_prosoluto or 0:,.2f}")
                 
                 print("\nSUCESSO! Views e dados funcionando perfeitamente")
-                
+    
     except Exception as e:
         print(f"ERRO ao verificar dados: {e}")
 
-if __name__ == "__main__":
-    print("CVCRM ETL - Populacao de Dados Mock")
-    print("====================================")
-    print("IMPORTANTE: Estes sao dados de TESTE")
-    print("Serao substituidos quando API CVDW funcionar")
+def main():
+    parser = argparse.ArgumentParser(description='Gera dados sintéticos em escala (COPY) para testes de carga')
+    parser.add_argument('--scale', '--escala', type=escala, default=10_000,
+                        help='número de vendas, ex: 10k, 500k, 10M (padrão 10k)')
+    parser.add_argument('--meses', type=int, default=36, help='meses de vendas até hoje')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--lote', type=int, default=200_000, help='vendas por COPY/commit')
+    parser.add_argument('--limpar', action='store_true',
+                        help='apaga vendas, unidades, prosoluto e empreendimentos (e o que depende deles) antes')
+    parser.add_argument('--sem-verificacao', action='store_true', help='não roda as consultas de conferência')
+    args = parser.parse_args()
+    
+    print("CVCRM ETL - Geração de Dados Sintéticos")
+    print("=======================================")
+    print("IMPORTANTE: Estes sao dados de TESTE (use um banco de teste)")
     print()
     
-    insert_mock_data()
-    verify_data()
+    insert_mock_data(args.scale, args.meses, args.semente, args.lote, args.limpar)
+    if not args.sem_verificacao:
+        verify_data()
     
-    print("\n🎉 DADOS MOCK INSERIDOS COM SUCESSO!")
-    print("👉 Dashboard agora tem dados para exibir")
-    print("👉 Execute: python monitoring.py")
+    print("\n👉 Execute: python monitoring.py")
     print("👉 Acesse: http://localhost:5000")
-    print("👉 Quando API CVDW funcionar, estes dados serão substituidos")
\ No newline at end of file
+
+if __name__ == "__main__":
+    main()
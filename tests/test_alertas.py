@@ -0,0 +1,139 @@
+"""AlertDispatcher contra um servidor SMTP local (stub em socketserver)"""
+import email
+import queue
+import socketserver
+import threading
+import time
+
+import pytest
+
+import main
+
+
+class SMTPStub(socketserver.ThreadingTCPServer):
+    """SMTP mínimo: aceita qualquer remetente/destinatário e guarda as mensagens"""
+    
+    allow_reuse_address = True
+    daemon_threads = True
+    
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.messages = []
+        self.received = threading.Condition()
+    
+    def wait_for(self, count, timeout=5):
+        with self.received:
+            self.received.wait_for(lambda: len(self.messages) >= count, timeout)
+        return self.messages
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+    
+    def handle(self):
+        self.reply('220 stub')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().upper()
+            if command.startswith(('EHLO', 'HELO')):
+                self.reply('250 stub')
+            elif command.startswith(('MAIL', 'RCPT', 'RSET', 'NOOP')):
+                self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 fim com <CRLF>.<CRLF>')
+                body = []
+                for data in iter(self.rfile.readline, b''):
+                    if data in (b'.\r\n', b'.\n'):
+                        break
+                    body.append(data.decode())
+                with self.server.received:
+                    self.server.messages.append(email.message_from_string(''.join(body)))
+                    self.server.received.notify_all()
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 tchau')
+                return
+            else:
+                self.reply('502 comando não implementado')
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    server = SMTPStub()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv('ALERT_SMTP_HOST', '127.0.0.1')
+    monkeypatch.setenv('ALERT_SMTP_PORT', str(server.server_address[1]))
+    monkeypatch.setenv('ALERT_SMTP_STARTTLS', 'false')
+    monkeypatch.setenv('ALERT_EMAIL_USER', 'etl@example.com')
+    monkeypatch.delenv('ALERT_EMAIL_PASSWORD', raising=False)
+    monkeypatch.delenv('ALERT_EMAIL_TO', raising=False)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def subjects(messages):
+    return [message['Subject'] for message in messages]
+
+
+def text(message):
+    return ''.join(part.get_payload(decode=True).decode() for part in message.walk()
+                   if part.get_content_type() == 'text/plain')
+
+
+def test_entrega_pelo_smtp(smtp):
+    alerts = main.AlertDispatcher(retry_delay=0)
+    assert alerts.submit('Falha no sync', 'detalhes')
+    assert alerts.flush(5)
+    assert subjects(smtp.wait_for(1)) == ['Falha no sync']
+    alerts.close(5)
+
+
+def test_resumo_das_ocorrencias_suprimidas_no_close(smtp):
+    alerts = main.AlertDispatcher(retry_delay=0)
+    assert alerts.submit('Erro X', 'primeira', coalesce_key='erro:x')
+    assert not alerts.submit('Erro X', 'repetida', coalesce_key='erro:x')
+    assert not alerts.submit('Erro X', 'repetida', coalesce_key='erro:x')
+    alerts.close(5)
+    messages = smtp.wait_for(2)
+    assert subjects(messages) == ['Erro X', 'Erro X (resumo)']
+    assert '2 ocorrências repetidas suprimidas' in text(messages[1])
+
+
+def test_resumo_quando_a_janela_fecha(smtp):
+    alerts = main.AlertDispatcher(retry_delay=0, coalesce_window=0.3)
+    alerts.submit('Erro Y', 'primeira', coalesce_key='erro:y')
+    alerts.submit('Erro Y', 'repetida', coalesce_key='erro:y')
+    # Sem nova ocorrência: o resumo sai pelo timer da thread de entrega
+    messages = smtp.wait_for(2)
+    assert subjects(messages) == ['Erro Y', 'Erro Y (resumo)']
+    alerts.close(5)
+
+
+def test_close_nao_bloqueia_com_fila_cheia_e_thread_parada(smtp):
+    alerts = main.AlertDispatcher(retry_delay=0)
+    alerts.queue = queue.Queue(maxsize=1)
+    alerts.queue.put(('pendente', 'x'))
+    alerts._thread = threading.Thread(target=lambda: None)
+    alerts._thread.start()
+    alerts._thread.join()
+    started = time.monotonic()
+    alerts.close(1)
+    assert time.monotonic() - started < 1
+
+
+def test_close_nao_bloqueia_com_thread_travada(smtp):
+    alerts = main.AlertDispatcher(retry_delay=0)
+    release = threading.Event()
+    alerts._deliver = lambda subject, message: release.wait(10)
+    alerts.queue = queue.Queue(maxsize=1)
+    alerts.submit('travado', 'x')
+    time.sleep(0.1)
+    alerts.queue.put_nowait(('cheia', 'x'))
+    started = time.monotonic()
+    alerts.close(0.5)
+    assert time.monotonic() - started < 2
+    release.set()
@@ -0,0 +1,110 @@
+"""Snapshot colunar contra as consultas do Postgres (precisa de TEST_DATABASE_URL)
+
+Os mesmos dados são lidos pelos dois caminhos do DashboardData e os
+resultados precisam bater, inclusive com registros marcados como excluídos
+pela conciliação (excluido_em).
+"""
+import os
+from datetime import date
+from decimal import Decimal
+
+import psycopg2
+import pytest
+
+import main
+import monitoring
+from dashboard_columnar import _months_ago
+
+DATABASE_URL = os.getenv('TEST_DATABASE_URL')
+SCHEMA = 'cvcrm_teste_colunar'
+
+pytestmark = pytest.mark.skipif(not DATABASE_URL, reason='TEST_DATABASE_URL não definida')
+
+
+def _day(months_ago, day=10):
+    return _months_ago(date.today().replace(day=1), months_ago).replace(day=day)
+
+
+@pytest.fixture
+def dados(monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', DATABASE_URL)
+    monkeypatch.setenv('DASHBOARD_CACHE_PATH', '')
+    monkeypatch.delenv('DATABASE_READ_URL', raising=False)
+    db = main.CloudDatabaseManager(schema=SCHEMA)
+    db.create_tables()
+    
+    with db.get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO empreendimentos (cvcrm_id, nome, excluido_em) VALUES (%s, %s, %s)",
+                [(1, 'Alfa', None), (2, 'Beta', None), (3, 'Gama', '2024-01-01')])
+            vendas = [
+                # cvcrm_id, empreendimento, corretor, time, valor, comissão, data, status, ativo, excluído
+                (1, 'Alfa', 'Ana', 'Norte', '100000.00', '5000.00', _day(0), 'ativo', 'S', None),
+                (2, 'Alfa', 'Bruno', 'Norte', '250000.00', None, _day(1), 'ativo', 'S', None),
+                (3, 'Beta', 'Ana', 'Norte', '175000.50', '8000.00', _day(1, 20), 'ativo', 'S', None),
+                (4, 'Beta', 'Carla', None, '90000.00', '4000.00', _day(3), 'distratado', 'S', None),
+                (5, 'Gama', 'Davi', 'Sul', '300000.00', '9000.00', _day(2), 'ativo', 'S', None),
+                (6, 'Beta', 'Eva', 'Sul', '400000.00', '12000.00', _day(1, 25), 'ativo', 'N', '2024-01-01'),
+                (7, 'Alfa', 'Ana', 'Norte', '120000.00', '6000.00', _day(14), 'ativo', 'S', None),
+                (8, 'Alfa', 'Fabio', 'Sul', '80000.00', None, _day(5), 'ativo', 'N', None),
+            ]
+            cursor.executemany("""
+                INSERT INTO vendas (cvcrm_id, empreendimento, corretor, time_corretor, valor, comissao_valor,
+                                    vgv, data_venda, status, ativo, excluido_em)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, [(i, e, c, t, v, cm, v, d, s, a, x) for i, e, c, t, v, cm, d, s, a, x in vendas])
+            cursor.executemany("""
+                INSERT INTO prosoluto (cvcrm_id, venda_id, valor_prosoluto, data_calculo, status, excluido_em)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, [(1, 1, '1000.00', _day(0), 'pago', None),
+                  (2, 3, '2500.00', _day(2), 'pendente', None),
+                  (3, 5, '7000.00', _day(1), 'pago', '2024-01-01'),
+                  (4, 2, '900.00', _day(4), 'cancelado', None)])
+            db.rebuild_cube(cursor)
+            cursor.execute("""
+                INSERT INTO etl_sync_runs (modo, status, finalizado_em)
+                VALUES ('teste', 'sucesso', CURRENT_TIMESTAMP)
+            """)
+    yield
+    
+    with psycopg2.connect(DATABASE_URL) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+    conn.close()
+
+
+def _normalize(value):
+    """Decimal/float/dict das views no mesmo formato do snapshot"""
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    if isinstance(value, (Decimal, float)):
+        return pytest.approx(float(value))
+    return value
+
+
+@pytest.mark.parametrize('method', [
+    'get_kpis', 'get_vendas_mensais_chart_data', 'get_vso_chart_data',
+    'get_top_empreendimentos', 'get_top_corretores', 'get_vendas_por_time'
+])
+def test_colunar_igual_ao_postgres(dados, method):
+    colunar = monitoring.DashboardData(columnar=True, schema=SCHEMA)
+    postgres = monitoring.DashboardData(columnar=False, schema=SCHEMA)
+    
+    assert colunar.get_snapshot() is not None
+    expected = getattr(postgres, method)()
+    assert getattr(colunar, method)() == _normalize(expected)
+
+
+def test_excluidos_ficam_de_fora(dados):
+    data = monitoring.DashboardData(columnar=True, schema=SCHEMA)
+    
+    kpis = data.get_kpis()
+    nomes = [row['empreendimento'] for row in data.get_top_empreendimentos()]
+    
+    assert 'Gama' not in nomes
+    assert 'Eva' not in [row['corretor'] for row in data.get_top_corretores()]
+    assert kpis['total_prosoluto'] == pytest.approx(3500.0)
+    assert kpis['total_empreendimentos'] == 2
@@ -0,0 +1,137 @@
+"""Escolha entre réplica e primário no DashboardData (conexões falsas, sem banco)"""
+from contextlib import contextmanager
+
+import psycopg2
+import pytest
+
+import monitoring
+
+PRIMARY = 'postgresql://primario/db'
+REPLICA = 'postgresql://replica/db'
+
+
+class FakeCursor:
+    def __init__(self, database):
+        self.database = database
+        self.row = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+    
+    def execute(self, sql, params=None):
+        self.database.queries.append(sql)
+        if 'finalizado_em' in sql:
+            self.row = (self.database.generation, None)
+        else:
+            self.row = (self.database.generation,)
+    
+    def fetchone(self):
+        return self.row
+
+
+class FakeDatabase:
+    """Banco com uma geração (MAX(id) de etl_sync_runs) e falha opcional de conexão"""
+    
+    def __init__(self, name, generation):
+        self.name = name
+        self.generation = generation
+        self.down = False
+        self.queries = []
+    
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self)
+
+
+@pytest.fixture
+def data(monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', PRIMARY)
+    monkeypatch.setenv('DATABASE_READ_URL', REPLICA)
+    monkeypatch.setenv('DASHBOARD_CACHE_PATH', '')
+    dashboard = monitoring.DashboardData(columnar=False)
+    databases = {PRIMARY: FakeDatabase('primario', 10), REPLICA: FakeDatabase('replica', 10)}
+    
+    @contextmanager
+    def get_connection(url=None):
+        database = databases[url or PRIMARY]
+        if database.down:
+            raise psycopg2.OperationalError(f"{database.name} fora do ar")
+        yield database
+    
+    monkeypatch.setattr(dashboard, 'get_connection', get_connection)
+    dashboard.databases = databases
+    return dashboard
+
+
+def _read_from(data):
+    with data.read_connection() as conn:
+        return conn.name
+
+
+def test_replica_em_dia_atende_as_leituras(data):
+    assert data.replica_ready()
+    assert _read_from(data) == 'replica'
+
+
+def test_replica_atrasada_le_do_primario(data):
+    data.databases[REPLICA].generation = 9
+    
+    assert not data.replica_ready()
+    assert _read_from(data) == 'primario'
+
+
+def test_replica_volta_quando_alcanca_o_primario(data):
+    data.generation_check_interval = 0
+    data.databases[REPLICA].generation = 9
+    assert _read_from(data) == 'primario'
+    
+    data.databases[REPLICA].generation = 10
+    
+    assert _read_from(data) == 'replica'
+
+
+def test_atraso_reconsultado_no_maximo_a_cada_intervalo(data):
+    data.generation_check_interval = 3600
+    data.databases[REPLICA].generation = 9
+    assert not data.replica_ready()
+    checks = len(data.databases[REPLICA].queries)
+    
+    data.databases[REPLICA].generation = 10
+    
+    assert not data.replica_ready()
+    assert len(data.databases[REPLICA].queries) == checks
+
+
+def test_nova_geracao_no_primario_reconsulta_a_replica(data):
+    data.generation_check_interval = 0
+    assert _read_from(data) == 'replica'
+    
+    data.databases[PRIMARY].generation = 11
+    assert _read_from(data) == 'primario'
+    
+    data.databases[REPLICA].generation = 11
+    assert _read_from(data) == 'replica'
+
+
+def test_replica_fora_do_ar_le_do_primario(data):
+    data.databases[REPLICA].down = True
+    
+    assert not data.replica_ready()
+    assert _read_from(data) == 'primario'
+
+
+def test_replica_cai_depois_de_conferida_le_do_primario(data):
+    assert data.replica_ready()
+    data.databases[REPLICA].down = True
+    
+    assert _read_from(data) == 'primario'
+    assert data._replica_generation is None
+
+
+def test_sem_replica_configurada_le_do_primario(data):
+    data.read_url = None
+    
+    assert not data.replica_ready()
+    assert _read_from(data) == 'primario'
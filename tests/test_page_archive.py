@@ -0,0 +1,59 @@
+"""PageArchive gravado por várias execuções e relido pelo ArchiveReplayClient"""
+import main
+
+ENDPOINT = 'empreendimentos'
+
+
+def _run(directory, records, size, seed=42, date_from=None, stop_after=None):
+    """Uma execução que lê o endpoint pela fonte sintética e arquiva as páginas"""
+    client = main.MockSourceClient(records=records, seed=seed)
+    client.archive = main.PageArchive(directory)
+    client.page_sizes = main.PageSizeController(initial=size, max_size=size)
+    pages = []
+    for records in client.iter_pages(ENDPOINT, date_from=date_from):
+        pages.append(records)
+        if len(pages) == stop_after:
+            break
+    return [record for records in pages for record in records]
+
+
+def _replay(directory):
+    client = main.ArchiveReplayClient(main.PageArchive(directory))
+    return [record for records in client.iter_pages(ENDPOINT) for record in records]
+
+
+def test_pagina_vazia_nao_e_arquivada(tmp_path):
+    _run(tmp_path, records=100, size=50)
+    
+    entries = main.PageArchive(tmp_path).entries(ENDPOINT)
+    
+    assert [entry.get('registros') for entry in entries] == [50, 50, None]
+    assert entries[-1]['completa']
+
+
+def test_reler_passada_interrompida_depois_de_uma_completa(tmp_path):
+    # Última página cheia (a página seguinte vem vazia) e depois uma execução que para na página 1
+    first = _run(tmp_path, records=100, size=50, seed=1)
+    second = _run(tmp_path, records=100, size=50, seed=2, stop_after=1)
+    
+    replayed = _replay(tmp_path)
+    
+    assert sorted({record['id'] for record in replayed}) == list(range(1, 101))
+    latest = {record['id']: record for record in replayed}
+    assert latest == {record['id']: record for record in first + second}
+
+
+def test_reler_so_a_ultima_passada_completa(tmp_path):
+    # Tamanhos de página diferentes em cada execução: mesmos registros em páginas diferentes
+    _run(tmp_path, records=100, size=50, seed=1)
+    last = _run(tmp_path, records=120, size=40, seed=2)
+    
+    assert _replay(tmp_path) == last
+
+
+def test_passada_com_data_depois_da_completa_tambem_e_relida(tmp_path):
+    full = _run(tmp_path, records=60, size=50, seed=1)
+    since = _run(tmp_path, records=30, size=50, seed=2, date_from='2025-01-01')
+    interrupted = _run(tmp_path, records=80, size=50, seed=3, date_from='2025-06-01', stop_after=1)
+    
+    assert _replay(tmp_path) == full + since + interrupted
@@ -0,0 +1,45 @@
+"""Paginação adaptativa do CVCRMAPIClient contra um servidor que limita o tamanho da página"""
+import main
+
+
+class LimitedSource(main.MockSourceClient):
+    """Servidor que atende no máximo `limit` registros e pagina pelo próprio limite"""
+    
+    def __init__(self, records, limit):
+        super().__init__(records=records)
+        self.limit = limit
+    
+    def make_request(self, endpoint, params=None, probe=False):
+        size = min(params['registros_por_pagina'], self.limit)
+        start = (params['pagina'] - 1) * size
+        return {'data': [self._record(endpoint, index) for index in range(start, min(start + size, self.records))]}
+
+
+def _ids(client, endpoint='empreendimentos'):
+    return [record['id'] for records in client.iter_pages(endpoint) for record in records]
+
+
+class GrowingSource(LimitedSource):
+    """Tamanho preferido sobe para 200 sem nenhum tamanho confirmado (ex: primeira execução)"""
+    
+    def make_request(self, endpoint, params=None, probe=False):
+        data = super().make_request(endpoint, params, probe)
+        state = self.page_sizes._state[endpoint]
+        if state['limit'] is None:
+            state['size'] = 200
+        return data
+
+
+def test_limite_do_servidor_sem_tamanho_confirmado():
+    client = GrowingSource(records=1000, limit=100)
+    client.page_sizes = main.PageSizeController(initial=100, max_size=500)
+    
+    assert _ids(client) == list(range(1, 1001))
+    assert client.page_sizes.snapshot()['empreendimentos'] == (100, 100)
+
+
+def test_paginacao_sem_limite_le_tudo_uma_vez():
+    client = LimitedSource(records=777, limit=1000)
+    client.page_sizes = main.PageSizeController(initial=50, max_size=400)
+    
+    assert _ids(client) == list(range(1, 778))
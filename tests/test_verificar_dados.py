@@ -0,0 +1,73 @@
+"""Hash "id|data|valor" do verificar_dados igual ao do Postgres, inclusive nos arredondamentos"""
+import hashlib
+import os
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import psycopg2
+import pytest
+
+import verificar_dados
+
+# Valor da API (Decimal do PageTransformer ou float) -> texto de numeric(15,2) no Postgres
+CASES = [
+    (Decimal('0.125'), '0.13'),
+    (Decimal('2.675'), '2.68'),
+    (2.675, '2.68'),
+    (0.125, '0.13'),
+    (Decimal('-0.125'), '-0.13'),
+    (Decimal('1.005'), '1.01'),
+    (Decimal('1234.5'), '1234.50'),
+    (Decimal('0.124999'), '0.12'),
+    (100, '100.00'),
+    (None, ''),
+    (float('nan'), ''),
+]
+
+
+@pytest.mark.parametrize('value, expected', CASES)
+def test_valor_com_duas_casas_como_o_postgres(value, expected):
+    assert verificar_dados.value_text(value) == expected
+
+
+def test_hash_do_registro():
+    days = [pd.Timestamp('2024-03-05'), pd.NaT]
+    hashes = verificar_dados.record_hashes(np.array([7, 8]), days, [Decimal('2.675'), None])
+    
+    expected = [int.from_bytes(hashlib.md5(text.encode()).digest()[:8], 'big')
+                for text in ('7|2024-03-05|2.68', '8||')]
+    assert hashes.tolist() == expected
+
+
+def test_data_muda_o_hash():
+    ids = np.array([7, 7])
+    
+    hashes = verificar_dados.record_hashes(ids, [date(2024, 3, 5), date(2024, 3, 6)], [100, 100])
+    
+    assert hashes[0] != hashes[1]
+
+
+@pytest.mark.skipif(not os.getenv('TEST_DATABASE_URL'), reason='TEST_DATABASE_URL não definida')
+def test_hash_igual_ao_hash_sql():
+    values = [value for value, _ in CASES if value is None or value == value]
+    ids = np.arange(1, len(values) + 1)
+    days = [None if i % 3 == 0 else date(2024, 1, i) for i in ids.tolist()]
+    rows = ', '.join(['(%s, %s::date, %s::numeric(15,2))'] * len(values))
+    params = [item for row in zip(ids.tolist(), days, [None if v is None else str(v) for v in values])
+              for item in row]
+    
+    with psycopg2.connect(os.getenv('TEST_DATABASE_URL')) as conn:
+        with conn.cursor() as cursor:
+            # Data no hash não depende do formato de saída da sessão
+            cursor.execute("SET DateStyle = 'SQL, DMY'")
+            cursor.execute(f"""
+                SELECT {verificar_dados.HASH_SQL.format(day='dia', value='valor')}
+                FROM (VALUES {rows}) t(cvcrm_id, dia, valor)
+                ORDER BY cvcrm_id
+            """, params)
+            expected = [row[0] for row in cursor.fetchall()]
+    conn.close()
+    
+    assert verificar_dados.record_hashes(ids, days, values).astype(np.int64).tolist() == expected
@@ -1,93 +1,341 @@
-import os
-import psycopg2
+#!/usr/bin/env python3
+"""
+Conferência do banco contra a API do CVCRM
+
+Para cada tabela, lê todos os registros da API (mesma transformação e mesmos
+filtros do ETL) e compara com o banco por mês: quantidade de registros e um
+checksum independente da ordem (soma, módulo 2^64, do md5 de "id|data|valor"
+de cada registro). O mesmo checksum é calculado em SQL, então o banco não
+devolve as linhas, só os totais por mês. Meses divergentes são abertos por
+dia, e dias divergentes por id: faltando no banco, sobrando no banco ou com
+data/valor diferente. A leitura da API e os totais do banco rodam em paralelo.
+
+Com --rapido não há leitura completa: o total informado pela API (uma
+requisição por endpoint) é comparado com a estimativa do catálogo do
+Postgres (reltuples, atualizada pelo ANALYZE/autovacuum), sem COUNT(*).
+
+Uso: python verificar_dados.py [--tabelas vendas,reservas] [--rapido] [--paralelo 4]
+                               [--max-ids 20] [--tolerancia 2] [--tenant bp]
+Sai com código 1 se encontrar divergência.
+"""
+import hashlib
+import argparse
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
 from dotenv import load_dotenv
+from main import (CVCRMAPIClient, CloudDatabaseManager, PageTransformer, ENDPOINT_TABLES,
+                  TOMBSTONE_TABLES, single_tenant, _add_months)
 
 load_dotenv()
 
-def verificar_dados():
-    print("=== VERIFICACAO DE DADOS APOS ETL ===")
+# Tabela -> (coluna de data dos baldes, coluna de valor do checksum ou None)
+CHECKS = {
+    'empreendimentos': ('data_lancamento', 'vgv'),
+    'unidades': ('created_at', 'valor_venda'),
+    'vendas': ('data_venda', 'valor'),
+    'reservas': ('data_reserva', None),
+    'atendimentos': ('data_atendimento', None),
+    'repasses': ('data_repasse', 'valor_repasse'),
+    'prosoluto': ('data_calculo', 'valor_prosoluto')
+}
+
+# Registros que o ETL grava: o mesmo filtro do PageTransformer para vendas; excluídos não contam
+DB_FILTERS = {'vendas': "ativo = 'S' AND data_venda IS NOT NULL AND excluido_em IS NULL"}
+
+# Hash de 64 bits de "id|data|valor" (data AAAA-MM-DD, valor com 2 casas), igual ao
+# calculado em Python por record_hashes; to_char não depende do DateStyle da sessão
+HASH_SQL = ("('x' || left(md5(cvcrm_id::text || '|' || COALESCE(to_char({day}::date, 'YYYY-MM-DD'), '')"
+            " || '|' || COALESCE({value}::text, '')), 16))::bit(64)::bigint")
+
+CENTS = Decimal('0.01')
+
+def value_text(value):
+    """Valor como o Postgres o grava e devolve em numeric(15,2)::text
     
-    database_url = os.getenv('DATABASE_URL')
+    Arredondamento para 2 casas com meio centavo para longe do zero (0.125 ->
+    0.13, 2.675 -> 2.68), como o cast para numeric. Floats passam pelo texto
+    (str), não pela representação binária; vazio para NULL/NaN.
+    """
+    if value is None or pd.isna(value):
+        return ''
+    try:
+        return str(Decimal(str(value)).quantize(CENTS, ROUND_HALF_UP))
+    except InvalidOperation:
+        return ''
+
+def day_text(day):
+    """Data como AAAA-MM-DD (o to_char do HASH_SQL); vazio para NULL/NaT"""
+    if day is None or pd.isna(day):
+        return ''
+    return f"{day:%Y-%m-%d}"
+
+def record_hashes(ids, days, values):
+    """Hash (uint64) de "id|data|valor" de cada registro, o mesmo de HASH_SQL"""
+    hashes = np.empty(len(ids), dtype=np.uint64)
+    for i, (record_id, day, value) in enumerate(zip(ids.tolist(), days, values)):
+        text = f"{record_id}|{day_text(day)}|{value_text(value)}"
+        hashes[i] = int.from_bytes(hashlib.md5(text.encode()).digest()[:8], 'big')
+    return hashes
+
+def summarize(frame, key):
+    """{balde: (quantidade, checksum)} de um DataFrame com colunas dia, id e hash
     
+    `key`: 'mes' ou 'dia'. O checksum soma as metades de 32 bits em int64 (sem
+    estouro) e junta no fim, módulo 2^64.
+    """
+    if frame.empty:
+        return {}
+    days = frame['dia']
+    buckets = days.dt.to_period('M').dt.start_time if key == 'mes' else days
+    parts = pd.DataFrame({
+        'balde': buckets.dt.date.astype(object).where(buckets.notna(), None),
+        'alto': (frame['hash'].to_numpy() >> np.uint64(32)).astype(np.int64),
+        'baixo': (frame['hash'].to_numpy() & np.uint64(0xFFFFFFFF)).astype(np.int64)
+    })
+    grouped = parts.groupby('balde', dropna=False).agg(n=('alto', 'size'), alto=('alto', 'sum'), baixo=('baixo', 'sum'))
+    return {(None if pd.isna(bucket) else bucket): (int(row.n), ((int(row.alto) << 32) + int(row.baixo)) % 2 ** 64)
+            for bucket, row in grouped.iterrows()}
+
+def api_records(client, job, tables):
+    """{tabela: DataFrame(dia, id, hash)} de todos os registros do endpoint `job`
+    
+    Uma única leitura alimenta as tabelas que vêm do mesmo endpoint (vendas e
+    reservas de /reservas); cada tabela passa pelo PageTransformer do ETL.
+    """
+    transformer = PageTransformer()
+    parts = {table: [] for table in tables}
+    for records in client.iter_pages(job):
+        for table in tables:
+            date_column, value_column = CHECKS[table]
+            df = transformer.frame(table, records)
+            values = df[value_column].tolist() if value_column else [None] * len(df)
+            ids = df['id'].astype('int64').to_numpy()
+            days = pd.to_datetime(df[date_column], errors='coerce').dt.normalize()
+            parts[table].append(pd.DataFrame({
+                'dia': days,
+                'id': ids,
+                'hash': record_hashes(ids, days.tolist(), values)
+            }))
+    return {table: (pd.concat(frames, ignore_index=True) if frames else
+                    pd.DataFrame({'dia': pd.Series(dtype='datetime64[ns]'), 'id': pd.Series(dtype='int64'),
+                                  'hash': pd.Series(dtype='uint64')}))
+            for table, frames in parts.items()}
+
+def db_summary(db, table, key, bucket=None):
+    """{balde: (quantidade, checksum)} do banco, por 'mes' ou por 'dia' (dentro do mês `bucket`)"""
+    date_column, value_column = CHECKS[table]
+    where = [DB_FILTERS.get(table, 'excluido_em IS NULL')]
+    params = []
+    if bucket is not None:
+        where.append(f"{date_column} >= %s AND {date_column} < %s")
+        params += [bucket, _add_months(bucket, 1)]
+    group = f"date_trunc('month', {date_column})::date" if key == 'mes' else f"{date_column}::date"
+    conn = db.get_connection()
     try:
-        conn = psycopg2.connect(database_url)
-        cursor = conn.cursor()
-        
-        # Tabelas principais para verificar
-        tabelas = [
-            'empreendimentos',
-            'vendas', 
-            'unidades',
-            'prosoluto',
-            'atendimentos',
-            'repasses',
-            'reservas'
-        ]
-        
-        print("\n--- Contagem de registros por tabela ---")
-        total_registros = 0
-        
-        for tabela in tabelas:
-            try:
-                cursor.execute(f"SELECT COUNT(*) FROM {tabela};")
-                count = cursor.fetchone()[0]
-                print(f"{tabela:15}: {count:6} registros")
-                total_registros += count
-            except Exception as e:
-                print(f"{tabela:15}: ERRO - {e}")
-        
-        print(f"{'TOTAL':15}: {total_registros:6} registros")
-        
-        # Verificar se há alguma tabela com dados para mostrar exemplo
-        print("\n--- Exemplos de dados (se existirem) ---")
-        for tabela in tabelas:
-            try:
-                cursor.execute(f"SELECT * FROM {tabela} LIMIT 3;")
-                rows = cursor.fetchall()
-                if rows:
-                    print(f"\n{tabela.upper()} (primeiros {len(rows)} registros):")
-                    for i, row in enumerate(rows, 1):
-                        print(f"  Registro {i}: {row[:5]}...")  # Mostrar só os primeiros 5 campos
-            except Exception as e:
-                pass  # Não mostrar erros aqui
+        with conn.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT {group}, COUNT(*), SUM({HASH_SQL.format(day=date_column, value=value_column or 'NULL')})
+                FROM {table}
+                WHERE {' AND '.join(where)}
+                GROUP BY 1
+            """, params)
+            return {bucket: (count, int(total) % 2 ** 64) for bucket, count, total in cursor.fetchall()}
+    finally:
+        conn.close()
+
+def db_hashes(db, table, day):
+    """{cvcrm_id: hash} do banco no dia `day` (None = registros sem data)"""
+    date_column, value_column = CHECKS[table]
+    where = DB_FILTERS.get(table, 'excluido_em IS NULL')
+    # Intervalo na própria coluna (sem cast) para o Postgres podar as partições
+    condition = f"{date_column} IS NULL" if day is None else f"{date_column} >= %s AND {date_column} < %s"
+    conn = db.get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT cvcrm_id, {HASH_SQL.format(day=date_column, value=value_column or 'NULL')}
+                FROM {table} WHERE {where} AND {condition}
+            """, [] if day is None else [day, day + timedelta(days=1)])
+            return {record_id: value % 2 ** 64 for record_id, value in cursor.fetchall()}
+    finally:
+        conn.close()
+
+def diverging(api, db):
+    """Baldes com quantidade ou checksum diferentes, em ordem (sem data por último)"""
+    return sorted((bucket for bucket in set(api) | set(db) if api.get(bucket) != db.get(bucket)),
+                  key=lambda bucket: (bucket is None, bucket or date.min))
+
+def drill_down(db, table, api_frame, months, max_ids):
+    """Linhas do relatório de uma tabela: meses -> dias -> ids divergentes"""
+    lines = []
+    api_months = summarize(api_frame, 'mes')
+    for month in months:
+        api_count = api_months.get(month, (0, 0))[0]
+        if month is None:
+            days = [None]
+            lines.append(f"  sem data: API {api_count}")
+        else:
+            in_month = api_frame[api_frame['dia'].dt.to_period('M').dt.start_time.dt.date == month]
+            db_days = db_summary(db, table, 'dia', month)
+            days = diverging(summarize(in_month, 'dia'), db_days)
+            lines.append(f"  {month:%Y-%m}: API {api_count}, banco {sum(n for n, _ in db_days.values())} "
+                         f"({len(days)} dias divergentes)")
         
-        # Verificar views também
-        print("\n--- Views analiticas ---")
-        views = [
-            'vw_vendas_mensais',
-            'vw_vendas_por_empreendimento', 
-            'vw_prosoluto_analise'
-        ]
+        for day in days:
+            in_day = api_frame[api_frame['dia'].isna()] if day is None else api_frame[api_frame['dia'].dt.date == day]
+            api_ids = dict(zip(in_day['id'].tolist(), in_day['hash'].tolist()))
+            db_ids = db_hashes(db, table, day)
+            missing = sorted(set(api_ids) - set(db_ids))
+            extra = sorted(set(db_ids) - set(api_ids))
+            changed = sorted(i for i in set(api_ids) & set(db_ids) if api_ids[i] != db_ids[i])
+            label = 'sem data' if day is None else f"{day:%Y-%m-%d}"
+            for name, ids in (('faltando no banco', missing), ('só no banco', extra), ('diferentes', changed)):
+                if ids:
+                    shown = ', '.join(map(str, ids[:max_ids])) + (' ...' if len(ids) > max_ids else '')
+                    lines.append(f"    {label}: {len(ids)} {name}: {shown}")
+    return lines
+
+def verificar_dados(tables, tenant=None, workers=4, max_ids=20):
+    """Conferência completa (API x banco); retorna o número de tabelas divergentes"""
+    print("=== CONFERÊNCIA API x BANCO ===")
+    tenant = single_tenant(tenant)
+    db = CloudDatabaseManager(schema=tenant.schema)
+    client = CVCRMAPIClient(tenant=tenant)
+    # Tamanhos de página aprendidos pelo ETL: menos requisições para ler tudo
+    try:
+        client.page_sizes.load(db.load_page_sizes())
+    except Exception as e:
+        print(f"Aviso: tamanhos de página salvos indisponíveis ({e})")
+    jobs = {job: [table for table in tables_ if table in tables] for job, tables_ in ENDPOINT_TABLES.items()}
+    jobs = {job: tables_ for job, tables_ in jobs.items() if tables_}
+    
+    # Leitura da API (uma por endpoint) e totais mensais do banco ao mesmo tempo;
+    # as requisições respeitam o rate limit do tenant, compartilhado entre as threads
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        api_futures = {job: executor.submit(api_records, client, job, tables_) for job, tables_ in jobs.items()}
+        db_futures = {table: executor.submit(db_summary, db, table, 'mes') for table in tables}
         
-        for view in views:
+        api, failed = {}, {}
+        for job, future in api_futures.items():
             try:
-                cursor.execute(f"SELECT COUNT(*) FROM {view};")
-                count = cursor.fetchone()[0]
-                print(f"{view:25}: {count:6} registros")
+                api.update(future.result())
             except Exception as e:
-                print(f"{view:25}: ERRO - {e}")
-        
-        cursor.close()
-        conn.close()
-        
-        if total_registros > 0:
-            print(f"\n=== SUCESSO ===")
-            print(f"Base de dados contem {total_registros} registros!")
-            print(f"ETL funcionou e trouxe dados reais!")
-        else:
-            print(f"\n=== ATENCAO ===") 
-            print(f"ETL executou mas nao trouxe dados.")
-            print(f"Possíveis causas:")
-            print(f"  - API sem dados no período")
-            print(f"  - Filtros muito restritivos")
-            print(f"  - Endpoints com restrições")
-            print(f"  - Rate limiting impediu requests")
-        
-        return total_registros
+                failed.update({table: e for table in jobs[job]})
+        db_months = {table: future.result() for table, future in db_futures.items()}
         
+        months = {table: diverging(summarize(api[table], 'mes'), db_months[table]) for table in api}
+        reports = {table: executor.submit(drill_down, db, table, api[table], months[table], max_ids)
+                   for table in api if months[table]}
+        reports = {table: future.result() for table, future in reports.items()}
+    
+    try:
+        db.add_requests_used(date.today(), client.rate_limiter.requests)
     except Exception as e:
-        print(f"\nErro ao verificar dados: {e}")
-        return 0
+        print(f"Aviso: requisições não somadas ao orçamento do dia ({e})")
+    
+    print(f"\n{'tabela':15} {'API':>10} {'banco':>10}  resultado")
+    for table in tables:
+        if table in failed:
+            print(f"{table:15} {'-':>10} {sum(n for n, _ in db_months[table].values()):>10}  ERRO na API: {failed[table]}")
+            continue
+        api_total = len(api[table])
+        db_total = sum(n for n, _ in db_months[table].values())
+        status = 'ok' if not months[table] else f"{len(months[table])} meses divergentes"
+        print(f"{table:15} {api_total:>10} {db_total:>10}  {status}")
+    
+    for table, lines in reports.items():
+        print(f"\n--- {table} ---")
+        print('\n'.join(lines))
+    
+    print(f"\n{client.rate_limiter.requests} requisições à API")
+    return len(reports) + len(failed)
+
+def catalog_estimates(db, tables):
+    """{tabela: linhas estimadas} pelo catálogo (nas particionadas, soma das partições; o pai também guarda estimativa desde o PG 14)"""
+    conn = db.get_connection()
+    try:
+        with conn.cursor() as cursor:
+            estimates = {}
+            for table in tables:
+                cursor.execute("""
+                    SELECT COALESCE(SUM(GREATEST(c.reltuples, 0)), 0)::bigint
+                    FROM pg_class c
+                    WHERE c.relkind <> 'p'
+                      AND (c.oid = to_regclass(%s)
+                           OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass(%s)))
+                """, (table, table))
+                estimates[table] = cursor.fetchone()[0]
+            return estimates
+    finally:
+        conn.close()
+
+def verificar_rapido(tables, tenant=None, workers=4, tolerance=2.0):
+    """Total informado pela API x estimativa do catálogo; retorna o número de tabelas fora da tolerância"""
+    print("=== CONFERÊNCIA RÁPIDA (estimativas) ===")
+    tenant = single_tenant(tenant)
+    db = CloudDatabaseManager(schema=tenant.schema)
+    client = CVCRMAPIClient(tenant=tenant)
+    jobs = [job for job, tables_ in ENDPOINT_TABLES.items() if any(table in tables for table in tables_)]
+    
+    def api_total(job):
+        data = client.make_request(job, {'pagina': 1, 'registros_por_pagina': 1}) or {}
+        return data.get('total_de_registros')
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        totals = {job: executor.submit(api_total, job) for job in jobs}
+        estimates = catalog_estimates(db, tables)
+        totals = {job: future.result() for job, future in totals.items()}
+    
+    failures = 0
+    print(f"\n{'tabela':15} {'API':>10} {'estimado':>10}  resultado")
+    for job in jobs:
+        for table in ENDPOINT_TABLES[job]:
+            if table not in tables:
+                continue
+            total = totals[job]
+            # vendas é um filtro de /reservas: a API não informa o total de vendas
+            if total is None or table == 'vendas':
+                print(f"{table:15} {'-':>10} {estimates[table]:>10}  sem total na API")
+                continue
+            total = int(total)
+            difference = abs(estimates[table] - total) / max(total, 1) * 100
+            ok = difference <= tolerance
+            failures += not ok
+            print(f"{table:15} {total:>10} {estimates[table]:>10}  "
+                  f"{'ok' if ok else 'divergente'} ({difference:.1f}%)")
+    
+    print("\nEstimativas do catálogo valem desde o último ANALYZE; na dúvida, rode sem --rapido")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description='Confere o banco contra a API do CVCRM (contagens e checksums)')
+    parser.add_argument('--tabelas', help='tabelas separadas por vírgula (padrão: todas com id)')
+    parser.add_argument('--rapido', action='store_true', help='só total da API x estimativa do catálogo')
+    parser.add_argument('--paralelo', type=int, default=4, help='leituras/consultas simultâneas')
+    parser.add_argument('--max-ids', type=int, default=20, help='ids listados por dia divergente')
+    parser.add_argument('--tolerancia', type=float, default=2.0,
+                        help='diferença aceita (%%) entre total da API e estimativa no modo rápido')
+    parser.add_argument('--tenant', help='tenant conferido (padrão: o único configurado)')
+    args = parser.parse_args()
+    
+    tables = [t.strip() for t in args.tabelas.split(',') if t.strip()] if args.tabelas else list(TOMBSTONE_TABLES)
+    unknown = [table for table in tables if table not in CHECKS]
+    if unknown:
+        parser.error(f"tabelas sem conferência: {', '.join(unknown)} (disponíveis: {', '.join(CHECKS)})")
+    
+    if args.rapido:
+        failures = verificar_rapido(tables, args.tenant, args.paralelo, args.tolerancia)
+    else:
+        failures = verificar_dados(tables, args.tenant, args.paralelo, args.max_ids)
+    
+    if failures:
+        print(f"\n❌ {failures} tabela(s) divergente(s)")
+        raise SystemExit(1)
+    print("\n✅ Banco confere com a API")
 
 if __name__ == "__main__":
-    verificar_dados()
\ No newline at end of file
+    main()